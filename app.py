@@ -1,3 +1,4 @@
+import os
 from flask import Flask
 from flask_jwt_extended import jwt_required, JWTManager, create_access_token, get_jwt
 from login_routes import login_bp
@@ -6,10 +7,90 @@ from fine_routes import fine_routes_bp
 from librarians_routes import librarians_routes_bp
 from membership_routes import membership_routes_bp
 from student_routes import student_routes_bp
+from bulk_routes import bulk_routes_bp
+from metrics_routes import metrics_routes_bp
+from profiler_routes import profiler_routes_bp
+from reports_routes import reports_routes_bp
+from events_routes import events_routes_bp
+import circulation
+import overdue_scheduler
+import storage
+import auth_cache
+import snapshot
+import journal
+import records
+import locks
+import metrics
+import profiler
+import ratelimit
+import fine_policy
 
 app = Flask(__name__)
 jwt = JWTManager(app)
 app.config["JWT_SECRET_KEY"] = "Mounika's_secret_key"
+app.config["STORAGE_URL"] = os.environ.get("LIBRARY_STORAGE", "memory")   # or sqlite:///library.db
+app.config["SNAPSHOT_PATH"] = os.environ.get("LIBRARY_SNAPSHOT")   # binary state snapshot (memory storage only, not with a journal)
+app.config["SNAPSHOT_INTERVAL"] = None         # seconds between background snapshots, None = off
+app.config["JOURNAL_PATH"] = os.environ.get("LIBRARY_JOURNAL")   # write-ahead journal (memory storage only)
+app.config["JOURNAL_COMMIT_DELAY"] = 0.0005    # seconds to batch journal fsyncs, None = fsync every request
+app.config["JOURNAL_COMPACT_BYTES"] = 64 * 2**20   # checkpoint and drop the log once it grows past this
+app.config["SHARED_STATE_DIR"] = os.environ.get("LIBRARY_SHARED")   # state shared by worker processes (memory storage only)
+app.config["AUTH_TOKEN_CACHE_SIZE"] = 0        # verified tokens to remember, 0 = verify every request
+app.config["OVERDUE_SWEEP_INTERVAL"] = None    # seconds between background overdue sweeps, None = manual /check_overdue only
+app.config["FINE_POLICY"] = {}                 # overrides of fine_policy.DEFAULTS, e.g. {"daily_fine": 10, "max_fine": 500}
+app.config["METRICS_ENABLED"] = True          # request histograms and counters for /metrics
+app.config["JSON_PROVIDER"] = os.environ.get("LIBRARY_JSON", records.DEFAULT_PROVIDER)   # "orjson" or "json" (records.PROVIDERS)
+# Per-client token buckets for the public and login routes, keyed by URL rule:
+# "rate" requests per second, bursts of "burst"; clients are told apart by IP,
+# or with "key": "subject" by JWT subject (IP when there is no token).
+# LIBRARY_RATE_LIMITS=off turns limiting and shedding off.
+app.config["RATE_LIMITS"] = {
+    "/login": {"rate": 5, "burst": 20},
+    "/book_enquiry/<book_id>": {"rate": 50, "burst": 100},
+    "/available_books": {"rate": 20, "burst": 50},
+    "/student": {"rate": 10, "burst": 30, "methods": ["POST", "PUT"], "key": "subject"},
+}
+app.config["SHED_CONCURRENCY"] = 32           # in-flight requests at which limited routes get 429, None = never
+if os.environ.get("LIBRARY_RATE_LIMITS") == "off":
+    app.config["RATE_LIMITS"], app.config["SHED_CONCURRENCY"] = {}, None
+app.json = records.PROVIDERS[app.config["JSON_PROVIDER"]](app)   # renders the compact db records as dicts
+
+
+# Request timing for /metrics. Registered before the other hooks so the
+# timing covers them (after_request hooks run in reverse order).
+@app.before_request
+def start_request_timer():
+    metrics.start_request()
+
+
+@app.after_request
+def record_request_metrics(response):
+    metrics.finish_request(response.status_code)
+    return response
+
+
+# Sampling profiler (admin switch on /profiler); a no-op while it is off
+@app.before_request
+def start_request_profile():
+    profiler.start_request()
+
+
+@app.teardown_request
+def finish_request_profile(exc):
+    profiler.finish_request()
+
+
+# Shared state: see the other workers' changes before handling the request
+@app.before_request
+def catch_up_shared_state():
+    journal.catch_up()
+
+
+# Hold each response until the journal entries it made are on disk
+@app.after_request
+def wait_for_journal(response):
+    journal.wait_for_request()
+    return response
 
 
 @jwt.unauthorized_loader
@@ -17,12 +98,51 @@ def authorizing(err):
     return {"message":"Token is missing"}
 
 
+auth_cache.configure(app.config["AUTH_TOKEN_CACHE_SIZE"])
+metrics.configure(app.config["METRICS_ENABLED"])
+fine_policy.configure(app.config["FINE_POLICY"])
+ratelimit.configure(app.config["RATE_LIMITS"], app.config["SHED_CONCURRENCY"])
+app.wsgi_app = ratelimit.admit(app.wsgi_app)   # refuses before Flask does any work
+
+# Load persisted state before any blueprint serves traffic
+storage.configure(app.config["STORAGE_URL"])
+shared_dir = app.config["SHARED_STATE_DIR"] if storage.backend.name == "memory" else None
+journal_path = app.config["JOURNAL_PATH"] if storage.backend.name == "memory" else None
+# With a journal, its checkpoints take the place of snapshots: the log would be
+# replayed from its start on top of a restored snapshot
+snapshot_path = None if shared_dir or journal_path else app.config["SNAPSHOT_PATH"]
+if app.config["SNAPSHOT_PATH"] and not snapshot_path:
+    app.logger.warning("SNAPSHOT_PATH is ignored with a journal or shared state")
+if snapshot_path and storage.backend.name == "memory" and os.path.exists(snapshot_path):
+    snapshot.restore(snapshot_path)
+else:
+    circulation.rebuild_indexes()
+# A journal checkpoint, when present, replaces the state loaded above
+if shared_dir:
+    # Every worker replays the shared log, then locks across processes
+    os.makedirs(shared_dir, exist_ok=True)
+    journal.start(os.path.join(shared_dir, "journal"), app.config["JOURNAL_COMMIT_DELAY"], shared=True)
+    locks.share(os.path.join(shared_dir, "locks"), journal.catch_up)
+elif journal_path:
+    journal.start(journal_path, app.config["JOURNAL_COMMIT_DELAY"], app.config["JOURNAL_COMPACT_BYTES"])
+if snapshot_path and app.config["SNAPSHOT_INTERVAL"]:
+    snapshot.start_periodic(snapshot_path, app.config["SNAPSHOT_INTERVAL"])
+
 app.register_blueprint(login_bp,url_prefix="")
 app.register_blueprint(book_management_bp,url_prefix="")
 app.register_blueprint(fine_routes_bp,url_prefix="")
 app.register_blueprint(librarians_routes_bp,url_prefix="")
 app.register_blueprint(membership_routes_bp,url_prefix="")
 app.register_blueprint(student_routes_bp,url_prefix="")
+app.register_blueprint(bulk_routes_bp,url_prefix="")
+app.register_blueprint(metrics_routes_bp,url_prefix="")
+app.register_blueprint(profiler_routes_bp,url_prefix="")
+app.register_blueprint(reports_routes_bp,url_prefix="")
+app.register_blueprint(events_routes_bp,url_prefix="")
+
+# Background overdue sweeper (optional)
+if app.config["OVERDUE_SWEEP_INTERVAL"]:
+    overdue_scheduler.start_sweeper(circulation.expire_loan, app.config["OVERDUE_SWEEP_INTERVAL"])
 
 # Main function
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Bounded LRU cache of verified access tokens.
+# Keyed by the SHA-256 digest of the raw token, so the tokens themselves are
+# not kept; each entry holds the claims the app needs and expires with the
+# token's own exp claim. Size 0 (the default) disables it.
+
+_entries = OrderedDict()    # digest -> (role, sub, exp)
+_lock = threading.Lock()
+_size = 0
+
+
+def configure(size):
+    global _size
+    with _lock:
+        _size = size or 0
+        _entries.clear()
+
+
+def enabled():
+    return _size > 0
+
+
+def digest(token):
+    return hashlib.sha256(token.encode()).digest()
+
+
+# (role, sub) for a cached, unexpired token, else None
+def lookup(token_digest):
+    with _lock:
+        entry = _entries.get(token_digest)
+        if entry is None:
+            return None
+        role, sub, exp = entry
+        if exp is not None and exp <= time.time():
+            del _entries[token_digest]
+            return None
+        _entries.move_to_end(token_digest)
+        return role, sub
+
+
+def store(token_digest, claims):
+    if not _size:
+        return
+    with _lock:
+        _entries[token_digest] = (claims.get("role"), claims.get("sub"), claims.get("exp"))
+        _entries.move_to_end(token_digest)
+        while len(_entries) > _size:
+            _entries.popitem(last=False)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+import auth_cache
+import ratelimit
+
+ratelimit.configure({})   # measure the routes, not the per-client limits
+
+# Per-request cost of authentication with the verified-token cache off and on.
+# Times a protected route and an unauthenticated one; the difference is the
+# auth overhead.
+#   python benchmarks/bench_auth.py [requests]
+
+
+def per_request(client, path, headers, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        client.get(path, headers=headers)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    client = app.test_client()
+    token = client.post("/login", json={"username": "staff", "password": "staff@123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    baseline = per_request(client, "/book_enquiry/B101", {}, count)
+    print(f"unauthenticated /book_enquiry: {baseline:7.1f} us/request")
+    for size in (0, 1024):
+        auth_cache.configure(size)
+        cost = per_request(client, "/fines/S001", headers, count)
+        label = "off" if size == 0 else f"on ({size})"
+        print(f"token cache {label:>9} /fines/S001: {cost:7.1f} us/request")
+    auth_cache.configure(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import students
+from records import Student
+import circulation
+import ratelimit
+
+ratelimit.configure({})   # measure the routes, not the per-client limits
+
+# Items per second through the single-item routes versus the bulk routes.
+#   python benchmarks/bench_bulk.py [items]
+
+
+def token(client, username, password):
+    response = client.post("/login", json={"username": username, "password": password})
+    return {"Authorization": "Bearer " + response.get_json()["access_token"]}
+
+
+def timed(action):
+    start = time.perf_counter()
+    action()
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    client = app.test_client()
+    admin = token(client, "admin", "admin@123")
+    staff = token(client, "staff", "staff@123")
+
+    # One book per item and one student per three items
+    for n in range(count // 3 + 1):
+        students[f"BS{n:06d}"] = Student(student_name=f"Bench {n}", in_time="2024-01-01 09:00:00",
+                                         out_time=None, borrowed_books=[], password="x",
+                                         role="student")
+    circulation.rebuild_indexes()
+    items = [{"student_id": f"BS{n // 3:06d}", "book_id": f"BB{n:06d}"} for n in range(count)]
+
+    def single_import():
+        for item in items:
+            client.post("/books", json={"book_id": item["book_id"], "book_name": f"Bench {item['book_id']}"},
+                        headers=admin)
+
+    def single_borrow():
+        for item in items:
+            client.post("/borrow_book", json={**item, "librarian_id": "L001"}, headers=staff)
+
+    def single_return():
+        for item in items:
+            client.put("/return_book", json=item, headers=staff)
+
+    csv_body = "book_id,book_name\n" + "".join(f"{item['book_id']}X,Bench {item['book_id']}\n" for item in items)
+    bulk_items = [{**item, "book_id": item["book_id"] + "X"} for item in items]
+
+    def bulk_import():
+        response = client.post("/books/import", data=csv_body, headers={**admin, "Content-Type": "text/csv"})
+        assert response.get_json()["added"] == count
+
+    def bulk_borrow():
+        response = client.post("/borrow_books", json={"librarian_id": "L001", "items": bulk_items}, headers=staff)
+        assert response.get_json()["issued"] == count
+
+    def bulk_return():
+        response = client.put("/return_books", json={"items": bulk_items}, headers=staff)
+        assert response.get_json()["returned"] == count
+
+    # Each item must go back before the bulk run can borrow it again
+    timings = {}
+    for name, action in [("single import", single_import), ("bulk import", bulk_import),
+                         ("single borrow", single_borrow), ("single return", single_return),
+                         ("bulk borrow", bulk_borrow), ("bulk return", bulk_return)]:
+        timings[name] = timed(action)
+
+    for name in ("import", "borrow", "return"):
+        single_rate = count / timings[f"single {name}"]
+        bulk_rate = count / timings[f"bulk {name}"]
+        print(f"{name:>6}: single {single_rate:9.0f} items/s   bulk {bulk_rate:9.0f} items/s   "
+              f"({bulk_rate / single_rate:.1f}x)")
+
+if __name__ == "__main__":
+    main()
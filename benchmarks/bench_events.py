@@ -0,0 +1,66 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import events
+
+# Cost of events.publish() (what borrow/return/missing pay for the /events
+# feed) with more and more subscribers, none of which ever read: their
+# queues fill to events.BUFFER and stay there, and publishing must not slow
+# down or wait for them. Filtered subscribers watch one book each, so an
+# event only touches the ones watching its book; unfiltered ones see all.
+# A reader thread draining one subscriber checks that it still gets every
+# event in order while the others are stalled.
+#   python benchmarks/bench_events.py [events]
+
+
+def publish_cost(count, book_ids):
+    start = time.perf_counter()
+    for n in range(count):
+        events.publish("borrowed", book_ids[n % len(book_ids)], "No")
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    book_ids = [f"B{n:05d}" for n in range(1000)]
+    print(f"{'subscribers':>12} {'filtered':>10} {'publish us':>11}")
+    for n_subscribers in (0, 10, 100, 1000):
+        for filtered in (True, False):
+            stalled = [events.subscribe([book_ids[n % len(book_ids)]] if filtered else None)
+                       for n in range(n_subscribers)]
+            publish_cost(events.BUFFER * 2, book_ids)   # fill the stalled queues first
+            cost = publish_cost(count, book_ids)
+            print(f"{n_subscribers:>12} {'yes' if filtered else 'no':>10} {cost:>11.2f}")
+            for subscriber in stalled:
+                events.unsubscribe(subscriber)
+
+    # One live reader among 1000 stalled subscribers
+    stalled = [events.subscribe(None) for _ in range(1000)]
+    reader = events.subscribe(None)
+    seen = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set() or reader.queue:
+            seen.extend(event["id"] for event in events.read(reader, 0.05))
+
+    thread = threading.Thread(target=read)
+    thread.start()
+    first = events.position(reader)
+    cost = publish_cost(count, book_ids)
+    done.set()
+    thread.join()
+    epoch, _, start = first.partition("-")
+    expected = [f"{epoch}-{seq}" for seq in range(int(start) + 1, int(start) + count + 1)]
+    print(f"live reader among 1000 stalled: publish {cost:.2f} us, "
+          f"reader got {len(seen)}/{count} events, in order: {seen == expected}")
+    for subscriber in stalled + [reader]:
+        events.unsubscribe(subscriber)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import gc
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import students
+import circulation
+import fine_ledger
+import fine_policy
+import loan_columns
+from benchmarks import datagen
+
+# Nightly fine recompute (fine_policy.recompute) over every loan, with the
+# numpy pass over loan_columns and with the per-loan loop it falls back to
+# without numpy.
+#   build    building the loan columns from students (first recompute only)
+#   track    what keeping the columns up to date adds to each loan change
+# Then for each policy:
+#   find     finding the loans whose fine changes: copying the columns and
+#            one vectorized pass, vs calling fine_policy.fine() per loan
+#   apply    the whole recompute with numpy, writing back the changed loans
+#   revert   back to the default policy with the loop engine
+# Both engines must pick the same loans, and the fine ledger must still
+# match the records afterwards.
+#   python benchmarks/bench_fines.py [students] [loans per student]
+
+
+def timed(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    loans_per_student = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    datagen.seed(n_students=n_students, n_books=n_students * 2, loans_per_student=loans_per_student)
+    gc.freeze()   # keep collections of the seeded data out of the timings
+    records, _ = fine_policy._loans()
+    today = date.today().toordinal()
+    print(f"{len(records)} loans, {n_students} students")
+    numpy_module = fine_policy.numpy
+    if numpy_module is None:
+        print("numpy not installed: only the per-loan loop runs")
+    else:
+        build_seconds, _ = timed(loan_columns.columns)
+        sid = next(iter(students))
+        record = next(students[sid].loans())
+        track_seconds, _ = timed(lambda: loan_columns.track(sid, record), 100000)
+        print(f"build   {build_seconds * 1000:8.1f} ms")
+        print(f"track   {track_seconds * 1e6:8.2f} us per loan change")
+
+    policies = (
+        ("unchanged", {}),
+        ("daily 10, grace 2, cap 300", {"daily_fine": 10, "grace_days": 2, "max_fine": 300}),
+        ("missing 800, returned 400", {"missing_fine": 800, "missing_return_fine": 400}),
+    )
+    for label, settings in policies:
+        fine_policy.configure(settings)
+        print(f"\n{label}")
+        loop_seconds, by_loop = timed(lambda: fine_policy._changed_loop(records, today))
+        if numpy_module is not None:
+            def find():
+                rows, _, *columns = loan_columns.columns()
+                return [rows[index] for index in fine_policy._changed_numpy(*columns, today)]
+            find_seconds, by_numpy = timed(find)
+            assert by_numpy == [records[index] for index in by_loop], "engines disagree"
+            print(f"  find    numpy {find_seconds * 1000:8.1f} ms   loop {loop_seconds * 1000:8.1f} ms"
+                  f"   ({loop_seconds / find_seconds:.0f}x)")
+        else:
+            print(f"  find    loop {loop_seconds * 1000:8.1f} ms")
+        print(f"  changed {len(by_loop)} loans")
+
+        apply_seconds, (_, changed) = timed(fine_policy.recompute)
+        print(f"  apply   {apply_seconds * 1000:8.1f} ms, {len(changed)} loans written back")
+        fine_policy.configure({})
+        fine_policy.numpy = None
+        try:
+            revert_seconds, (_, reverted) = timed(fine_policy.recompute)
+        finally:
+            fine_policy.numpy = numpy_module
+        print(f"  revert  {revert_seconds * 1000:8.1f} ms (loop engine), {len(reverted)} loans written back")
+        assert not fine_ledger.audit()
+
+    # The columns followed every write-back: built afresh they must be the same
+    if numpy_module is not None:
+        tracked = loan_columns.columns()
+        circulation.rebuild_indexes()
+        fresh = loan_columns.columns()
+        assert all((a == b).all() for a, b in zip(tracked[2:], fresh[2:])), "columns drifted"
+        print("\ncolumns match a fresh build")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import students, books
+from records import Student, Book, Loan, Status, day
+import circulation
+import ratelimit
+
+ratelimit.configure({})   # measure the routes, not the per-client limits
+
+# Borrow, mark-missing and return cost for students with longer and longer
+# loan histories. Active loans are looked up by book_id, so the numbers
+# should stay flat as the history grows.
+#   python benchmarks/bench_history.py [cycles] [history sizes...]
+
+
+def add_student(student_id, history):
+    student = Student(student_name=student_id, in_time="2024-01-01 09:00:00", out_time=None,
+                      borrowed_books=[], password="x", role="student")
+    issued_on = day(date.today().toordinal() - 30)
+    old_book = books["B101"]
+    for _ in range(history):
+        student.add_loan(Loan(old_book, "L001", issued_on, day(issued_on + 7), state=Status.RETURNED))
+    students[student_id] = student
+
+
+def per_cycle(client, headers, student_id, book_id, cycles):
+    borrow = {"student_id": student_id, "book_id": book_id, "librarian_id": "L001"}
+    target = {"student_id": student_id, "book_id": book_id}
+    start = time.perf_counter()
+    for _ in range(cycles):
+        client.post("/borrow_book", headers=headers, json=borrow)
+        client.put("/missing_book", headers=headers, json=target)
+        client.put("/return_book", headers=headers, json=target)
+    return (time.perf_counter() - start) / cycles * 1e6
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    sizes = [int(n) for n in sys.argv[2:]] or [0, 1000, 100000]
+
+    client = app.test_client()
+    token = client.post("/login", json={"username": "staff", "password": "staff@123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for size in sizes:
+        student_id = f"HIST{size}"
+        book_id = f"HB{size}"
+        add_student(student_id, size)
+        books[book_id] = Book(book_id, f"History Book {size}")
+        circulation.rebuild_indexes()
+        cost = per_cycle(client, headers, student_id, book_id, cycles)
+        print(f"history {size:7d} loans: {cost:8.1f} us per borrow+missing+return")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import journal
+
+# Durable-write throughput of the journal: fsync per request versus group
+# commit with a few latency budgets. Each thread plays a request that logs one
+# loan change and waits for it to reach disk.
+#   python benchmarks/bench_journal.py [--threads 1 8 32] [--writes 300]
+
+
+RECORD = {
+    "book_id": "B101", "book_name": "Python Basics", "issued_by": "L001",
+    "date_of_issuing": "2026-10-18", "date_of_returning": "2026-10-25",
+    "fine": 0, "status": "Borrowed",
+}
+
+
+def run(directory, commit_delay, threads, writes):
+    path = os.path.join(directory, f"bench-{commit_delay}-{threads}.journal")
+    log = journal.Journal(path, commit_delay, compact_bytes=2**40)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        mine = []
+        for i in range(writes):
+            start = time.perf_counter()
+            seq = log.append("loan", f"S{n:05d}", i, RECORD)
+            log.wait(seq)
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    log.close()
+
+    latencies.sort()
+    return {
+        "writes_per_s": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--writes", type=int, default=300, help="durable writes per thread")
+    parser.add_argument("--delays", type=float, nargs="+", default=[0.0005, 0.002], help="group commit budgets in seconds")
+    args = parser.parse_args()
+
+    modes = [("fsync per request", None)] + [(f"group commit {d * 1000:g} ms", d) for d in args.delays]
+    with tempfile.TemporaryDirectory(dir=os.getcwd()) as tmp:
+        for threads in args.threads:
+            for label, delay in modes:
+                result = run(tmp, delay, threads, args.writes)
+                print(f"{threads:3d} threads  {label:22s} {result['writes_per_s']:9.0f} writes/s"
+                      f"  p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import students, books
+import catalog_cache
+import fragments
+import ratelimit
+import records
+import versions
+from benchmarks import datagen
+
+ratelimit.configure({})   # measure the routes, not the per-client limits
+
+# Serialization throughput for each app.json provider (records.PROVIDERS).
+#   encode    a /books-style payload of plain dicts and a payload of loan
+#             records (rendered through the provider's default()), in MB/s
+#   listing   the /books, /members and /available_books bodies built by
+#             encoding a dict per entry (as before fragments.py) and from
+#             fragments.py; "changed" bumps the catalog version first, so the
+#             /books array is joined again from the per-book fragments
+#   route     the whole request through the test client; /available_books
+#             has its catalog version bumped every time, so it is rebuilt
+#             from the fragments instead of served from catalog_cache
+#   python benchmarks/bench_json.py [books] [students]
+
+
+def timed(fn, seconds=1.0):
+    fn()
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        count += 1
+    return (time.perf_counter() - start) / count
+
+
+def book_dicts():
+    return [{"book_id": bid, "book_name": info["book_name"], "available": info["available"]} for bid, info in books.items()]
+
+
+def member_dicts():
+    return [{"student_id": sid, "student_name": info["student_name"]} for sid, info in students.items()]
+
+
+def available_dicts():
+    return [{"book_id": bid, "book_name": info["book_name"]} for bid, info in books.items() if info["available"] == "Yes"]
+
+
+def main():
+    n_books = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_students = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    datagen.seed(n_students=n_students, n_books=n_books)
+    gc.freeze()   # keep collections of the seeded data out of the timings
+    client = app.test_client()
+    token = client.post("/login", json={"username": "admin", "password": "admin@123"}).get_json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    loans = [record for info in list(students.values())[:2000] for record in info["borrowed_books"]]
+    print(f"{n_books} books, {n_students} students, {len(loans)} loan records; "
+          f"providers: {', '.join(name for name in records.PROVIDERS if name != 'orjson' or records.orjson)}")
+
+    for name, provider_class in records.PROVIDERS.items():
+        if name == "orjson" and records.orjson is None:
+            print("orjson: not installed, skipped")
+            continue
+        app.json = provider_class(app)
+        print(f"\n{name}")
+        with app.test_request_context():
+            for label, payload in (("books", {"books": book_dicts()}), ("loans", {"loans": loans})):
+                size = len(app.json.response(payload).get_data())
+                seconds = timed(lambda: app.json.response(payload).get_data())
+                print(f"  encode {label:<8} {size / 1e6:6.2f} MB  {seconds * 1000:8.2f} ms  {size / seconds / 1e6:7.1f} MB/s")
+
+            listings = (
+                ("/books", lambda: {"books": book_dicts(), "requested_by": "admin", "role": "admin", "total_books": len(books)},
+                 lambda: fragments.body({"books": fragments.book_array()[1], "requested_by": "admin", "role": "admin",
+                                         "total_books": len(books)})),
+                ("/books changed", lambda: {"books": book_dicts(), "requested_by": "admin", "role": "admin",
+                                            "total_books": len(books)},
+                 lambda: catalog_cache.bump() or fragments.body({"books": fragments.book_array()[1], "requested_by": "admin",
+                                                                 "role": "admin", "total_books": len(books)})),
+                ("/members", lambda: {"members": member_dicts(), "total_members": len(students)},
+                 lambda: fragments.body({"members": fragments.member_array(versions.current())[1], "total_members": len(students)})),
+                ("/available_books", lambda: {"available_books": available_dicts()},
+                 lambda: fragments.body({"available_books": fragments.available_array()[1]})),
+            )
+            for path, payload, joined in listings:
+                assert app.json.response(payload()).get_data() == joined()
+                encoded = timed(lambda: app.json.response(payload()).get_data())
+                fragment = timed(joined)
+                print(f"  listing {path:<17} dicts {encoded * 1000:7.2f} ms  fragments {fragment * 1000:7.2f} ms"
+                      f"  ({encoded / fragment:4.1f}x)")
+
+        for path, bump in (("/books", False), ("/members", False), ("/available_books", True)):
+            def get():
+                if bump:
+                    catalog_cache.bump()
+                client.get(path, headers=headers)
+            print(f"  route   {path:<17} {timed(get) * 1000:7.2f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
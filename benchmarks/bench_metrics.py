@@ -0,0 +1,74 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+import metrics
+import ratelimit
+
+ratelimit.configure({})   # measure the routes, not the per-client limits
+
+# Cost of the /metrics instrumentation: a bare observe() from 1 and 8
+# threads, the two request hooks inside one request context, and whole
+# requests to a cheap route with the hooks on versus off.
+#   python benchmarks/bench_metrics.py [requests]
+
+
+def observe_cost(threads, calls):
+    key = ("book_management_bp", "/count/<student_id>", "GET", 200)
+
+    def worker():
+        for _ in range(calls):
+            metrics.observe(key, 0.0012)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return (time.perf_counter() - start) / (threads * calls) * 1e6
+
+
+def hooks_cost(n):
+    with app.test_request_context("/books/B101"):
+        app.preprocess_request()
+        start = time.perf_counter()
+        for _ in range(n):
+            metrics.start_request()
+            metrics.finish_request(200)
+        return (time.perf_counter() - start) / n * 1e6
+
+
+def request_cost(client, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get("/available_books")
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"observe(), 1 thread:  {observe_cost(1, n * 5):6.2f} us")
+    print(f"observe(), 8 threads: {observe_cost(8, n):6.2f} us")
+    print(f"request hooks:        {hooks_cost(n * 5):6.2f} us")
+
+    client = app.test_client()
+    request_cost(client, 1000)   # warm up
+    # Alternate so drift hits both sides equally; keep the best of each
+    on, off = [], []
+    for _ in range(10):
+        metrics.configure(False)
+        off.append(request_cost(client, n // 10))
+        metrics.configure(True)
+        on.append(request_cost(client, n // 10))
+    off, on = min(off), min(on)
+    print(f"GET /available_books, metrics off: {off:7.1f} us/request")
+    print(f"GET /available_books, metrics on:  {on:7.1f} us/request  (+{on - off:.1f} us, {(on - off) / off:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import students, books
+from records import Student, Book, Loan, Status, day
+import records
+import overdue_scheduler
+from benchmarks import datagen
+
+# Memory of the old dict records versus the compact records.py ones for the
+# same data, and the time to find overdue loans with each.
+#   python benchmarks/bench_records.py [students] [books] [loans per student]
+# The defaults give 1M loans.
+
+
+def rows():
+    book_rows = [(bid, info.book_name, info.available) for bid, info in books.items()]
+    student_rows = []
+    for sid, info in students.items():
+        loans = [(loan.book_id, loan.issued_by, int(loan.issued_on), int(loan.due_on),
+                  loan.fine, loan.status, loan.get("was_missing", False))
+                 for loan in info.borrowed_books]
+        student_rows.append((sid, info.student_name, info.in_time, info.password, loans))
+    return book_rows, student_rows
+
+
+# The representation before records.py: a dict per record, strftime'd dates
+def build_dicts(book_rows, student_rows):
+    all_books = {bid: {"book_name": name, "available": available} for bid, name, available in book_rows}
+    all_students = {}
+    for sid, name, in_time, password, loans in student_rows:
+        history = []
+        for book_id, issued_by, issued_on, due_on, fine, status, was_missing in loans:
+            record = {
+                "book_id": book_id,
+                "book_name": all_books[book_id]["book_name"],
+                "issued_by": issued_by,
+                "date_of_issuing": date.fromordinal(issued_on).strftime("%Y-%m-%d"),
+                "date_of_returning": date.fromordinal(due_on).strftime("%Y-%m-%d"),
+                "fine": fine,
+                "status": status,
+            }
+            if was_missing:
+                record["was_missing"] = True
+            history.append(record)
+        all_students[sid] = {"student_name": name, "in_time": in_time, "out_time": None,
+                             "borrowed_books": history, "password": password, "role": "student"}
+    return all_books, all_students
+
+
+def build_records(book_rows, student_rows):
+    all_books = {bid: Book(bid, name, available) for bid, name, available in book_rows}
+    all_students = {}
+    for sid, name, in_time, password, loans in student_rows:
+        history = [
+            Loan(all_books[book_id], issued_by, day(issued_on), day(due_on), fine, Status(status), was_missing)
+            for book_id, issued_by, issued_on, due_on, fine, status, was_missing in loans
+        ]
+        all_students[sid] = Student(student_name=name, in_time=in_time, out_time=None,
+                                    borrowed_books=history, password=password, role="student")
+    return all_books, all_students
+
+
+def measure(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    result = build(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def timed(action):
+    start = time.perf_counter()
+    result = action()
+    return time.perf_counter() - start, result
+
+
+def main():
+    n_students, n_books, loans = (int(arg) for arg in (sys.argv[1:4] + ["100000", "200000", "10"][len(sys.argv[1:4]):]))
+    datagen.seed(n_students, n_books, loans)
+    book_rows, student_rows = rows()
+    total_loans = sum(len(loans) for *_, loans in student_rows)
+    print(f"{n_students} students, {n_books} books, {total_loans} loans")
+
+    records._days.clear()
+    records._day_texts.clear()
+    (_, dict_students), dict_bytes = measure(build_dicts, book_rows, student_rows)
+    (_, record_students), record_bytes = measure(build_records, book_rows, student_rows)
+    print(f"dict records:     {dict_bytes / 2**20:8.1f} MiB  ({dict_bytes / total_loans:5.0f} B/loan)")
+    print(f"compact records:  {record_bytes / 2**20:8.1f} MiB  ({record_bytes / total_loans:5.0f} B/loan)")
+
+    today = date.today()
+    now = datetime.now()
+
+    # Full scans, the way check_overdue used to walk every loan
+    def scan_dicts():
+        return sum(
+            1 for info in dict_students.values() for record in info["borrowed_books"]
+            if record["status"] == "Borrowed"
+            and (now - datetime.strptime(record["date_of_issuing"], "%Y-%m-%d")).days > overdue_scheduler.OVERDUE_DAYS
+        )
+
+    expires = today.toordinal() - overdue_scheduler.OVERDUE_DAYS - 1
+
+    def scan_records():
+        return sum(
+            1 for info in record_students.values() for loan in info.borrowed_books
+            if loan.state is Status.BORROWED and loan.issued_on <= expires
+        )
+
+    seconds, overdue = timed(scan_dicts)
+    print(f"full scan, dicts:      {seconds * 1000:9.1f} ms  ({overdue} overdue)")
+    seconds, overdue = timed(scan_records)
+    print(f"full scan, compact:    {seconds * 1000:9.1f} ms  ({overdue} overdue)")
+
+    # What the app does: a due-date heap, rebuilt at startup, popped by check_overdue
+    seconds, _ = timed(overdue_scheduler.rebuild)
+    print(f"scheduler rebuild:     {seconds * 1000:9.1f} ms")
+    seconds, expired = timed(lambda: overdue_scheduler.pop_expired(today))
+    print(f"scheduler pop_expired: {seconds * 1000:9.1f} ms  ({len(expired)} overdue)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import students, books
+import loan_index
+from benchmarks import datagen
+import ratelimit
+
+ratelimit.configure({})   # measure the routes, not the per-client limits
+
+# Latency and peak memory for every route handler at a synthetic scale.
+# Seeds the db with benchmarks/datagen.py, drives each route through the
+# Flask test client and writes p50/p95/p99 latency (ms) and peak traced
+# memory (KiB) per route as JSON, for comparing runs between commits.
+#   python benchmarks/bench_routes.py --students 100000 --books 1000000 --loans 20 -o results.json
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def token(client, username, password):
+    response = client.post("/login", json={"username": username, "password": password})
+    return {"Authorization": "Bearer " + response.get_json()["access_token"]}
+
+
+# name -> callable(i) returning (method, path, json body, headers)
+def build_routes(client):
+    admin = token(client, "admin", "admin@123")
+    staff = token(client, "staff", "staff@123")
+
+    student_ids = list(students)
+    inside = [sid for sid in student_ids
+              if students[sid]["in_time"] and not any(b["status"] in ("Borrowed", "Missing")
+                                                     for b in students[sid]["borrowed_books"])]
+    free_books = [bid for bid, info in books.items() if info["available"] == "Yes"]
+    borrowed = [(sid, record["book_id"]) for sid, record in loan_index.loans("Borrowed")]
+    fined = [sid for sid, _ in loan_index.loans_with_fines()]
+    student_token = token(client, student_ids[0], students[student_ids[0]]["password"])
+
+    # Borrows take a fresh student/book each time, returns and missing marks
+    # consume the loans that were out when the run started.
+    borrow_pairs = list(zip(inside, free_books))
+    returns = borrowed[: len(borrowed) // 2]
+    missing = borrowed[len(borrowed) // 2:]
+
+    def pick(items, i):
+        return items[i % len(items)] if items else (None, None)
+
+    return {
+        "login": lambda i: ("POST", "/login", {"username": "staff", "password": "staff@123"}, {}),
+        "borrow_book": lambda i: ("POST", "/borrow_book",
+                                  {"student_id": pick(borrow_pairs, i)[0], "book_id": pick(borrow_pairs, i)[1],
+                                   "librarian_id": "L001"}, staff),
+        "count": lambda i: ("GET", f"/count/{student_ids[i % len(student_ids)]}", None, staff),
+        "return_book": lambda i: ("PUT", "/return_book",
+                                  {"student_id": pick(returns, i)[0], "book_id": pick(returns, i)[1]}, staff),
+        "book_enquiry": lambda i: ("GET", f"/book_enquiry/{free_books[i % len(free_books)]}", None, {}),
+        "students_books": lambda i: ("GET", "/students_books", None, staff),
+        "students_books_page": lambda i: ("GET", "/students_books?limit=100", None, staff),
+        "students_books_self": lambda i: ("GET", "/students_books", None, student_token),
+        "issued_books": lambda i: ("GET", "/issued_books", None, staff),
+        "available_books": lambda i: ("GET", "/available_books", None, {}),
+        "missing_book": lambda i: ("PUT", "/missing_book",
+                                   {"student_id": pick(missing, i)[0], "book_id": pick(missing, i)[1]}, staff),
+        "missed_books": lambda i: ("GET", "/missed_books", None, staff),
+        "check_overdue": lambda i: ("PUT", "/check_overdue", None, staff),
+        "books": lambda i: ("GET", "/books", None, admin),
+        "books_page": lambda i: ("GET", "/books?limit=100", None, admin),
+        "books_search": lambda i: ("GET", f"/books/search?q={datagen.WORDS[i % len(datagen.WORDS)][:3]}",
+                                   None, staff),
+        "fines": lambda i: ("GET", f"/fines/{fined[i % len(fined)] if fined else student_ids[0]}", None, staff),
+        "students_fines": lambda i: ("GET", "/students_fines", None, staff),
+        "pay_fine": lambda i: ("PUT", f"/pay_fine/{fined[i % len(fined)] if fined else student_ids[0]}",
+                               {"amount": 1}, staff),
+        "members": lambda i: ("GET", "/members", None, admin),
+        "members_page": lambda i: ("GET", "/members?limit=100", None, admin),
+        "librarians": lambda i: ("GET", "/librarians", None, admin),
+        "student_entry": lambda i: ("POST", "/student", {"student_id": student_ids[i % len(student_ids)]}, {}),
+        "student_list": lambda i: ("GET", "/student", None, staff),
+        "student_exit": lambda i: ("PUT", "/student", {"student_id": student_ids[i % len(student_ids)]}, {}),
+    }
+
+
+def call(client, request):
+    method, path, body, headers = request
+    return client.open(path, method=method, json=body, headers=headers)
+
+
+def measure(client, make_request, repeat, budget):
+    samples = []
+    statuses = {}
+    started = time.perf_counter()
+    for i in range(repeat):
+        request = make_request(i)
+        start = time.perf_counter()
+        response = call(client, request)
+        response.get_data()
+        samples.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if i >= 4 and time.perf_counter() - started > budget:
+            break
+
+    # Peak memory from a separate traced call so tracing does not skew latency
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    call(client, make_request(len(samples))).get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "samples": len(samples),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "peak_kib": round(peak / 1024, 1),
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-route latency and memory benchmark")
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--books", type=int, default=50000)
+    parser.add_argument("--loans", type=int, default=10, help="loan history per student")
+    parser.add_argument("--repeat", type=int, default=200, help="max requests per route")
+    parser.add_argument("--budget", type=float, default=10.0, help="max seconds per route")
+    parser.add_argument("--routes", nargs="*", help="only these routes")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    datagen.seed(args.students, args.books, args.loans, rng_seed=args.seed)
+    seed_seconds = time.perf_counter() - started
+
+    client = app.test_client()
+    routes = build_routes(client)
+    results = {}
+    for name, make_request in routes.items():
+        if args.routes and name not in args.routes:
+            continue
+        results[name] = measure(client, make_request, args.repeat, args.budget)
+        print(f"{name:>20}: p50 {results[name]['p50_ms']:9.3f} ms  p99 {results[name]['p99_ms']:9.3f} ms  "
+              f"peak {results[name]['peak_kib']:10.1f} KiB", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "students": args.students,
+            "books": args.books,
+            "loans_per_student": args.loans,
+            "seed": args.seed,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "routes": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
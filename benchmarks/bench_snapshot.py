@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import students
+import circulation
+import locks
+import snapshot
+import storage
+from benchmarks import datagen
+
+# Cold start (SQLite row-by-row load plus index rebuild) versus snapshot restore,
+# and how long a writer waits for its locks while a snapshot is taken: with
+# snapshot.save() (fork, pickle in the child) and with snapshot.dumps()
+# (pickled under locks.hold_all()).
+#   python benchmarks/bench_snapshot.py [students] [books] [loans per student]
+# The defaults give 1M loans.
+
+
+def timed(action):
+    start = time.perf_counter()
+    result = action()
+    return time.perf_counter() - start, result
+
+
+# Longest wait for one student's locks while action() runs
+def writer_stall(action):
+    stop = threading.Event()
+    waits = []
+
+    def writer():
+        while not stop.is_set():
+            start = time.perf_counter()
+            with locks.student("S001"):
+                waits.append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.05)
+    seconds, result = timed(action)
+    stop.set()
+    thread.join()
+    return seconds, max(waits), result
+
+
+def main():
+    n_students, n_books, loans = (int(arg) for arg in (sys.argv[1:4] + ["100000", "200000", "10"][len(sys.argv[1:4]):]))
+    datagen.seed(n_students, n_books, loans)
+    total_loans = sum(len(info["borrowed_books"]) for info in students.values())
+    print(f"{len(students)} students, {n_books} books, {total_loans} loans")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "state.snap")
+        seconds, stall, size = writer_stall(lambda: snapshot.save(snapshot_path))
+        print(f"snapshot save:      {seconds:7.2f} s  ({size / 2**20:.1f} MiB), writers waited {stall * 1000:.0f} ms")
+        seconds, stall, _ = writer_stall(snapshot.dumps)
+        print(f"dumps under locks:  {seconds:7.2f} s, writers waited {stall * 1000:.0f} ms")
+
+        seconds, _ = timed(lambda: storage.SQLiteStorage(os.path.join(tmp, "state.db")).close())
+        print(f"sqlite import:      {seconds:7.2f} s")
+
+        def cold_start():
+            backend = storage.SQLiteStorage(os.path.join(tmp, "state.db"))
+            backend.load()
+            circulation.rebuild_indexes()
+            backend.close()
+
+        seconds, _ = timed(cold_start)
+        print(f"cold start:         {seconds:7.2f} s  (sqlite load + index rebuild)")
+
+        seconds, _ = timed(lambda: snapshot.restore(snapshot_path))
+        print(f"snapshot restore:   {seconds:7.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import students, books
+from records import Book
+import circulation
+import storage
+
+# Borrow/return throughput with the in-memory and the SQLite backend.
+#   python benchmarks/bench_storage.py [cycles]
+
+
+def run(url, cycles):
+    storage.configure(url)
+    circulation.rebuild_indexes()
+
+    book_ids = [f"BENCH{n:05d}" for n in range(200)]
+    for book_id in book_ids:
+        books[book_id] = Book(book_id, f"Bench Book {book_id}")
+        storage.save_book(book_id)
+    student_ids = list(students)
+
+    start = time.perf_counter()
+    for n in range(cycles):
+        student_id = student_ids[n % len(student_ids)]
+        record = circulation.issue_book(student_id, book_ids[n % len(book_ids)], "L001")
+        circulation.return_loan(student_id, record)
+    elapsed = time.perf_counter() - start
+
+    storage.backend.close()
+    return cycles / elapsed
+
+
+def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        for url in ("memory", f"sqlite:///{os.path.join(tmp, 'bench.db')}"):
+            rate = run(url, cycles)
+            print(f"{url.split(':')[0]:>8}: {rate:10.0f} borrow+return cycles/s ({cycles} cycles)")
+
+
+if __name__ == "__main__":
+    main()
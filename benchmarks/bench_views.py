@@ -0,0 +1,160 @@
+import gc
+import os
+import sys
+import threading
+import time
+import weakref
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import students, books
+import circulation
+import loan_index
+import locks
+import versions
+from benchmarks import datagen
+
+# Checkout latency (borrow + return through circulation under the loan's
+# locks, like the routes) while report threads keep rebuilding the staff-wide
+# listings (students_books, students_fines, issued_books, missed_books,
+# members) and encoding them with app.json:
+#   none     no reports running
+#   views    reports from versions.current(), as the routes do
+#   locked   reports from the live dicts under locks.hold_all(), the way to
+#            get a consistent listing without views
+#   live     reports from the live dicts without locks (the old routes)
+# A report is torn when its students' Borrowed loans and its issued_books
+# listing disagree, and failed when walking the live dicts raised (they
+# changed size meanwhile). Last, a view held by a reader must be freed once
+# the reader lets go of it.
+#   python benchmarks/bench_views.py [students] [seconds per mode] [report threads]
+
+WRITERS = 2
+
+
+def report_from_view():
+    view = versions.current()
+    books_by_student = {sid: {"student_name": name, "borrowed_books": versions.loan_dicts(loans, marks)}
+                        for sid, name, loans, marks in view.students}
+    issued = [(sid, book.book_id) for sid, _, book, _ in view.loans("Borrowed")]
+    fines = [(sid, book.book_id, fine) for sid, _, book, (fine, _, _) in view.loans_with_fines()]
+    missing = [(sid, book.book_id, fine) for sid, _, book, (fine, _, _) in view.loans("Missing")]
+    members = [(row[0], row[1]) for row in view.students]
+    return books_by_student, issued, fines, missing, members
+
+
+def report_from_live():
+    books_by_student = {sid: {"student_name": info.student_name, "borrowed_books": info.borrowed_books}
+                        for sid, info in list(students.items())}
+    issued = [(sid, book.book_id) for sid, book in loan_index.loans("Borrowed")]
+    fines = [(sid, book.book_id, book.fine) for sid, book in loan_index.loans_with_fines()]
+    missing = [(sid, book.book_id, book.fine) for sid, book in loan_index.loans("Missing")]
+    members = [(sid, info.student_name) for sid, info in list(students.items())]
+    return books_by_student, issued, fines, missing, members
+
+
+# Encoded and checked under the locks too: the records must not change meanwhile
+def report_locked():
+    with locks.hold_all():
+        report = report_from_live()
+        app.json.dumps(report[0])
+        return torn(report)
+
+
+def torn(report):
+    books_by_student, issued = report[0], report[1]
+    borrowed = {(sid, book["book_id"]) for sid, entry in books_by_student.items()
+                for book in entry["borrowed_books"] if book["status"] == "Borrowed"}
+    return borrowed != set(issued)
+
+
+# Appends "ok", "torn" or "failed" per report
+def run_reports(mode, stop, results):
+    build = {"views": report_from_view, "live": report_from_live}.get(mode)
+    while not stop.is_set():
+        if build is None:
+            results.append("torn" if report_locked() else "ok")
+            continue
+        try:
+            report = build()
+            app.json.dumps(report[0])
+            results.append("torn" if torn(report) else "ok")
+        except RuntimeError:
+            results.append("failed")
+
+
+def run_checkouts(student_ids, book_ids, stop, latencies):
+    n = 0
+    while not stop.is_set():
+        sid, book_id = student_ids[n % len(student_ids)], book_ids[n % len(book_ids)]
+        n += 1
+        start = time.perf_counter()
+        with locks.loan(sid, book_id):
+            record = circulation.issue_book(sid, book_id, "L001")
+        with locks.loan(sid, book_id):
+            circulation.return_loan(sid, record)
+        latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(mode, seconds, n_reporters, lanes):
+    stop = threading.Event()
+    latencies = [[] for _ in lanes]
+    reports = []
+    threads = [threading.Thread(target=run_checkouts, args=(sids, bids, stop, out))
+               for (sids, bids), out in zip(lanes, latencies)]
+    if mode != "none":
+        threads += [threading.Thread(target=run_reports, args=(mode, stop, reports)) for _ in range(n_reporters)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    done = sorted(latency for lane in latencies for latency in lane)
+    print(f"{mode:>7} {len(done) / seconds:>11.0f} {percentile(done, 0.5) * 1000:>8.2f} "
+          f"{percentile(done, 0.99) * 1000:>8.2f} {done[-1] * 1000:>8.1f} {len(reports):>8} "
+          f"{reports.count('torn'):>6} {reports.count('failed'):>7}")
+
+
+def main():
+    n_students = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    n_reporters = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    datagen.seed(n_students=n_students, n_books=n_students * 2, loans_per_student=5)
+    gc.freeze()   # keep collections of the seeded data out of the timings
+
+    # Each writer cycles over its own idle students and free books
+    idle = [sid for sid, info in students.items() if not info.active]
+    free = [book_id for book_id, book in books.items() if book.available == "Yes"]
+    lanes = [(idle[n::WRITERS][:200], free[n::WRITERS][:200]) for n in range(WRITERS)]
+
+    timings = []
+    for build in (report_from_view, report_from_live):
+        start = time.perf_counter()
+        app.json.dumps(build()[0])
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{n_students} students, one report built and encoded: {timings[0]:.0f} ms from a view, "
+          f"{timings[1]:.0f} ms from the live dicts")
+    print(f"{WRITERS} checkout threads, {n_reporters} report threads, {seconds:g} s per mode")
+    print(f"{'reports':>7} {'checkouts/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'reports':>8} "
+          f"{'torn':>6} {'failed':>7}")
+    for mode in ("none", "views", "locked", "live"):
+        run(mode, seconds, n_reporters, lanes)
+
+    held = versions.current()
+    ref = weakref.ref(held)
+    sid, book_id = lanes[0][0][0], lanes[0][1][0]
+    with locks.loan(sid, book_id):
+        circulation.return_loan(sid, circulation.issue_book(sid, book_id, "L001"))
+    assert ref() is not None and versions.current() is not held
+    del held
+    print(f"\nold view freed once its reader let go: {ref() is None}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import students, books, librarians
+from records import Student, Book, Loan
+import circulation
+
+# Seeded synthetic data for the db structures.
+# Replaces the contents of students/books (librarians and users are kept) with
+#   n_students students, ~30% of them inside the library
+#   n_books books with titles built from a small vocabulary
+#   loans_per_student historical loans each, of which up to 3 are active
+#     (Borrowed or Missing, each on a distinct book) and some carry fines
+# then rebuilds the derived indexes.
+
+WORDS = ["python", "flask", "data", "science", "machine", "learning", "deep", "algorithms",
+         "networking", "database", "design", "operating", "systems", "electronics", "basics",
+         "advanced", "introduction", "modern", "practical", "theory", "web", "cloud", "security",
+         "statistics", "graphics", "compilers", "distributed", "mobile", "embedded", "robotics"]
+
+
+def seed(n_students=1000, n_books=5000, loans_per_student=5, active_ratio=0.3, rng_seed=42, today=None):
+    rng = random.Random(rng_seed)
+    today = today or date.today()
+    librarian_ids = list(librarians)
+
+    books.clear()
+    book_ids = [f"B{n:08d}" for n in range(n_books)]
+    for book_id in book_ids:
+        title = " ".join(rng.sample(WORDS, rng.randint(2, 4))).title()
+        books[book_id] = Book(book_id, title)
+
+    students.clear()
+    free_books = book_ids[:]
+    rng.shuffle(free_books)
+    for n in range(n_students):
+        student_id = f"S{n:07d}"
+        inside = rng.random() < 0.3
+        history = []
+        for _ in range(loans_per_student):
+            issued = today - timedelta(days=rng.randint(20, 700))
+            fine = 0
+            was_missing = rng.random() < 0.05
+            if was_missing:
+                fine = rng.choice([0, 0, 100, 250])
+            record = {
+                "book_id": rng.choice(book_ids),
+                "issued_by": rng.choice(librarian_ids),
+                "date_of_issuing": issued.strftime("%Y-%m-%d"),
+                "date_of_returning": (issued + timedelta(days=7)).strftime("%Y-%m-%d"),
+                "fine": fine,
+                "status": "Returned"
+            }
+            if was_missing:
+                record["was_missing"] = True
+            history.append(record)
+        history.sort(key=lambda r: r["date_of_issuing"])
+
+        # The newest loans may still be out
+        active = min(3, len(history), len(free_books)) if rng.random() < active_ratio else 0
+        for record in history[len(history) - rng.randint(0, active):]:
+            book_id = free_books.pop()
+            issued = today - timedelta(days=rng.randint(0, 25))
+            missing = rng.random() < 0.1
+            record.update({
+                "book_id": book_id,
+                "date_of_issuing": issued.strftime("%Y-%m-%d"),
+                "date_of_returning": (issued + timedelta(days=7)).strftime("%Y-%m-%d"),
+                "fine": 500 if missing else 0,
+                "status": "Missing" if missing else "Borrowed"
+            })
+            record.pop("was_missing", None)
+            books[book_id]["available"] = "No"
+
+        for record in history:
+            record["book_name"] = books[record["book_id"]]["book_name"]
+
+        students[student_id] = Student(
+            student_name=f"Student {n}",
+            in_time=f"{today} 09:00:00" if inside else None,
+            out_time=None,
+            borrowed_books=[Loan.from_dict(record, books) for record in history],
+            password=f"pw{n}",
+            role="student"
+        )
+
+    circulation.rebuild_indexes()
+
+
+if __name__ == "__main__":
+    seed(*(int(arg) for arg in sys.argv[1:4]))
+    print(f"{len(students)} students, {len(books)} books, "
+          f"{sum(len(s['borrowed_books']) for s in students.values())} loans")
@@ -0,0 +1,194 @@
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Throughput of serve.py with 1, 2, 4 and 8 prefork workers sharing state,
+# and a check that borrows and returns stayed atomic across the processes.
+# Client processes send a mix of borrows, returns, missing marks and reads
+# (a new connection per request, so requests spread over the workers). After
+# each run every loan is read back and checked: no book lent twice, no
+# student over the limit, availability matching the loans. A race phase has
+# every client borrow the same book at once; exactly one may succeed.
+#   python benchmarks/load_workers.py [--workers 1 2 4 8] [--clients 16] [--seconds 10]
+
+N_STUDENTS = 200
+N_BOOKS = 100
+
+
+def request(port, method, path, body=None, token=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        conn.request(method, path, body=None if body is None else json.dumps(body), headers=headers)
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+
+def login(port, username, password):
+    return request(port, "POST", "/login", {"username": username, "password": password})[1]["access_token"]
+
+
+def wait_until_up(port, seconds=60):
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def setup(port, admin):
+    for n in range(N_STUDENTS):
+        request(port, "POST", "/members", {"student_id": f"LS{n:04d}", "student_name": f"Load {n}",
+                                           "password": "x"}, admin)
+        request(port, "POST", "/student", {"student_id": f"LS{n:04d}"})
+    for n in range(N_BOOKS):
+        request(port, "POST", "/books", {"book_id": f"LB{n:04d}", "book_name": f"Load Book {n}"}, admin)
+
+
+def client(port, token, seed, seconds, start, results):
+    rng = random.Random(seed)
+    done = errors = 0
+    start.wait()
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        student_id = f"LS{rng.randrange(N_STUDENTS):04d}"
+        book_id = f"LB{rng.randrange(N_BOOKS):04d}"
+        body = {"student_id": student_id, "book_id": book_id}
+        roll = rng.random()
+        if roll < 0.3:
+            body["librarian_id"] = "L001"
+            status, _ = request(port, "POST", "/borrow_book", body, token)
+        elif roll < 0.55:
+            status, _ = request(port, "PUT", "/return_book", body, token)
+        elif roll < 0.6:
+            status, _ = request(port, "PUT", "/missing_book", body, token)
+        elif roll < 0.8:
+            status, _ = request(port, "GET", f"/count/{student_id}", None, token)
+        else:
+            status, _ = request(port, "GET", f"/fines/{student_id}", None, token)
+        done += 1
+        errors += status >= 500
+    results.put((done, errors))
+
+
+def racer(port, token, student_id, book_id, start, results):
+    start.wait()
+    body = {"student_id": student_id, "book_id": book_id, "librarian_id": "L001"}
+    results.put(request(port, "POST", "/borrow_book", body, token)[0])
+
+
+def check(port, token):
+    problems = []
+    _, listing = request(port, "GET", "/students_books", None, token)
+    _, catalog = request(port, "GET", "/books", None, token)
+    holders = {}
+    for student_id, info in listing["students_books"].items():
+        active = [r["book_id"] for r in info["borrowed_books"] if r["status"] in ("Borrowed", "Missing")]
+        if len(active) > 3:
+            problems.append(f"{student_id} holds {len(active)} books")
+        for book_id in active:
+            holders.setdefault(book_id, []).append(student_id)
+    for book in catalog["books"]:
+        held_by = holders.get(book["book_id"], [])
+        if len(held_by) > 1:
+            problems.append(f"{book['book_id']} lent to {held_by}")
+        if book["available"] != ("No" if held_by else "Yes"):
+            problems.append(f"{book['book_id']} available={book['available']} with holders {held_by}")
+    return problems, json.dumps(listing, sort_keys=True)
+
+
+def run(workers, clients, seconds, races):
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, LIBRARY_SHARED=os.path.join(tmp, "state"), LIBRARY_RATE_LIMITS="off")
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", str(workers), "--port", str(port)],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port)
+            admin = login(port, "admin", "admin@123")
+            staff = login(port, "staff", "staff@123")
+            setup(port, admin)
+
+            start = multiprocessing.Barrier(clients + 1)
+            results = multiprocessing.Queue()
+            pool = [multiprocessing.Process(target=client, args=(port, staff, n, seconds, start, results))
+                    for n in range(clients)]
+            for process in pool:
+                process.start()
+            start.wait()
+            began = time.perf_counter()
+            totals = [results.get() for _ in pool]
+            elapsed = time.perf_counter() - began
+            for process in pool:
+                process.join()
+            done = sum(d for d, _ in totals)
+            errors = sum(e for _, e in totals)
+
+            # Everyone borrows LB0000 at once, then it goes back
+            race_problems = []
+            for round_ in range(races):
+                for n in range(N_STUDENTS):
+                    request(port, "PUT", "/return_book", {"student_id": f"LS{n:04d}", "book_id": "LB0000"}, staff)
+                start = multiprocessing.Barrier(clients)
+                pool = [multiprocessing.Process(target=racer, args=(port, staff, f"LS{n:04d}", "LB0000", start, results))
+                        for n in range(clients)]
+                for process in pool:
+                    process.start()
+                statuses = [results.get() for _ in pool]
+                for process in pool:
+                    process.join()
+                if statuses.count(200) > 1:
+                    race_problems.append(f"race {round_}: {statuses.count(200)} borrows of LB0000 succeeded")
+
+            # Read the state back through several connections: every worker must agree
+            problems, first = check(port, staff)
+            for _ in range(workers * 4):
+                if check(port, staff)[1] != first:
+                    problems.append("workers disagree on the loans")
+                    break
+            return done / elapsed, errors, problems + race_problems
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=16, help="client processes")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--races", type=int, default=20, help="rounds of the same-book borrow race")
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} client processes, {args.seconds:g} s per run")
+    for workers in args.workers:
+        throughput, errors, problems = run(workers, args.clients, args.seconds, args.races)
+        print(f"{workers} worker(s): {throughput:8.0f} req/s  5xx: {errors}  problems: {problems or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from db import students, books
+from records import Book
+import fine_ledger
+import loan_index
+import rollups
+import ratelimit
+
+ratelimit.configure({})   # measure the routes, not the per-client limits
+
+# Multi-threaded borrow/return/missing stress run against the Flask handlers.
+# Checks the circulation invariants after each run and reports throughput.
+#   python benchmarks/stress_circulation.py [ops per run] [thread counts...]
+
+BOOK_IDS = [f"STRESS{n:03d}" for n in range(30)]
+
+
+def token(client, username, password):
+    response = client.post("/login", json={"username": username, "password": password})
+    return {"Authorization": "Bearer " + response.get_json()["access_token"]}
+
+
+def worker(ops, seed, headers, errors):
+    client = app.test_client()
+    rng = random.Random(seed)
+    student_ids = list(students)
+    for _ in range(ops):
+        body = {"student_id": rng.choice(student_ids), "book_id": rng.choice(BOOK_IDS)}
+        roll = rng.random()
+        if roll < 0.5:
+            body["librarian_id"] = "L001"
+            response = client.post("/borrow_book", json=body, headers=headers)
+        elif roll < 0.9:
+            response = client.put("/return_book", json=body, headers=headers)
+        else:
+            response = client.put("/missing_book", json=body, headers=headers)
+        if response.status_code >= 500:
+            errors.append(response.status_code)
+
+
+def check_invariants():
+    problems = []
+    active_by_book = {}
+    for sid, info in students.items():
+        active = [r for r in info["borrowed_books"] if r["status"] in ("Borrowed", "Missing")]
+        if len(active) > 3:
+            problems.append(f"{sid} holds {len(active)} books")
+        for record in active:
+            active_by_book.setdefault(record["book_id"], []).append(sid)
+
+    for book_id in BOOK_IDS:
+        holders = active_by_book.get(book_id, [])
+        if len(holders) > 1:
+            problems.append(f"{book_id} issued to {holders}")
+        expected = "No" if holders else "Yes"
+        if books[book_id]["available"] != expected:
+            problems.append(f"{book_id} available={books[book_id]['available']} with holders {holders}")
+
+    problems += loan_index.check_consistency()
+    problems += fine_ledger.audit()
+    problems += rollups.rebuild()
+    return problems
+
+
+def run(threads, ops, headers):
+    errors = []
+    pool = [
+        threading.Thread(target=worker, args=(ops // threads, n, headers, errors))
+        for n in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return (ops // threads) * threads / elapsed, errors
+
+
+def main():
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+    thread_counts = [int(n) for n in sys.argv[2:]] or [1, 2, 4, 8]
+
+    for book_id in BOOK_IDS:
+        books[book_id] = Book(book_id, f"Stress Book {book_id}")
+
+    client = app.test_client()
+    headers = token(client, "staff", "staff@123")
+    for sid in list(students):
+        client.post("/student", json={"student_id": sid})
+
+    failed = False
+    for threads in thread_counts:
+        rate, errors = run(threads, ops, headers)
+        problems = check_invariants()
+        print(f"{threads:>2} threads: {rate:8.0f} req/s, {len(errors)} server errors, "
+              f"{len(problems)} invariant violations")
+        for problem in problems[:10]:
+            print("   ", problem)
+        failed = failed or bool(errors or problems)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,23 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime,timedelta
 from db import students, books,librarians
-from flask_jwt_extended import jwt_required
-from login_routes import get_current_user   
+from records import Book
+from login_routes import get_current_user, auth_required, admin_denied
+import circulation
+import storage
+import pagination
+import locks
+import occupancy
+import search_index
+import catalog_cache
+import fragments
+import events
+import versions
 
 book_management_bp = Blueprint("book_management_bp", __name__)
 
 #  Borrowing Book   
 @book_management_bp.post("/borrow_book")
-@jwt_required()
+@auth_required()
 def borrow_book():
     role, username = get_current_user()
 
@@ -21,52 +30,39 @@ def borrow_book():
     if role not in ["staff", "admin"]:
         return {"error": "Access denied"}, 403      #  Forbidden Error
 
-    if student_id not in students:
-        return {"message": "Student not found"}, 404
+    # Checks and the checkout happen under the student's and the book's locks
+    with locks.loan(student_id, book_id):
+        if student_id not in students:
+            return {"message": "Student not found"}, 404
     
-    if not students[student_id].get("in_time") or students[student_id].get("out_time"):
-        return {"message": "Student must be inside the library to borrow a book"}, 403
-
-    if book_id not in books or books[book_id]["available"] == "No":
-        return {"message": "Book not available"}, 400       #  Bad Request
-    if librarian_id not in librarians:
-        return {"message": "Librarian not found"}, 404
-
-    # Check borrowing limit
-    active_books = [
-        b for b in students[student_id]["borrowed_books"]
-        if b["status"] in ["Borrowed", "Missing"]
-    ]
-    if len(active_books) >= 3:
-        return {"message": "Borrowing limit reached (max 3 books allowed)"}, 403
-
-    # Create borrowing record
-    date_of_issuing = datetime.now()
-    date_of_returning = date_of_issuing + timedelta(days=7)
-
-    record = {
-        "book_id": book_id,
-        "book_name": books[book_id]["book_name"],
-        "issued_by": librarian_id,
-        "date_of_issuing": date_of_issuing.strftime("%Y-%m-%d"),
-        "date_of_returning": date_of_returning.strftime("%Y-%m-%d"),
-        "fine": 0,
-        "status": "Borrowed"
-    }
-
-    students[student_id]["borrowed_books"].append(record)
-    books[book_id]["available"] = "No"
-
-    return {
-        "student_id": student_id,
-        "student_name": students[student_id]["student_name"],
-        "borrowed_books_count": len(active_books) + 1,
-        "borrowed_book": record
-    }   
+        if not occupancy.is_inside(student_id):
+            return {"message": "Student must be inside the library to borrow a book"}, 403
+
+        if book_id not in books or books[book_id]["available"] == "No":
+            return {"message": "Book not available"}, 400       #  Bad Request
+        if librarian_id not in librarians:
+            return {"message": "Librarian not found"}, 404
+
+        # Check borrowing limit
+        active_books = students[student_id].active
+        if len(active_books) >= 3:
+            return {"message": "Borrowing limit reached (max 3 books allowed)"}, 403
+        # Still holds a loan for this book ID (e.g. the book went missing and was re-added)
+        if book_id in active_books:
+            return {"message": "Student already has an active loan for this book"}, 400
+
+        record = circulation.issue_book(student_id, book_id, librarian_id)
+
+        return {
+            "student_id": student_id,
+            "student_name": students[student_id]["student_name"],
+            "borrowed_books_count": len(active_books),
+            "borrowed_book": record
+        }   
 
 #  Book Count Each Member 
 @book_management_bp.route("/count/<student_id>", methods=["GET"])
-@jwt_required()
+@auth_required()
 def get_book_count(student_id):
     role, username = get_current_user()
 
@@ -77,18 +73,17 @@ def get_book_count(student_id):
         return jsonify({"error": "Student ID not found"}), 404
 
     student = students[student_id]
-    book_count = len(student["borrowed_books"])  
 
     return jsonify({
         "student_id": student_id,
         "student_name": student["student_name"],
-        "book_count": book_count,
+        "book_count": student.loan_count(),
         "borrowed_books": student["borrowed_books"]
     })
 
 # Returning Book
 @book_management_bp.put("/return_book")
-@jwt_required()
+@auth_required()
 def return_book():
     role, username = get_current_user()
 
@@ -99,61 +94,64 @@ def return_book():
     if role not in ["staff", "admin"] and username != student_id:
         return {"error": "Access denied"}, 403
 
-    if student_id not in students:
-        return {"message": "Student not found"}, 404
-
-    borrowed_books = students[student_id]["borrowed_books"]
-    for book in borrowed_books:
-        if book["book_id"] == book_id:
-            # Normal return
-            if book["status"] == "Borrowed":
-                book["status"] = "Returned"
-                book["fine"] = 0
-                books[book_id]["available"] = "Yes"
-                return {"message": "Book returned successfully"}, 200
-
-            # Returning a missing book
-            elif book["status"] == "Missing":
-                already_paid = 500 - book["fine"]
-                book["fine"] = max(250 - already_paid, 0)
-                book["status"] = "Returned"
-                book["was_missing"] = True
-                books[book_id]["available"] = "Yes"
-                return {
-                    "message": "Missing book returned with reduced fine",
-                    "student_id": student_id,
-                    "book_id": book_id,
-                    "remaining_fine": book["fine"]
-                }, 200
-
-            else:
-                return {"message": "Book already returned"}, 400
+    with locks.loan(student_id, book_id):
+        if student_id not in students:
+            return {"message": "Student not found"}, 404
 
-    return {"message": "Book not found in student's borrowed list"}, 404
+        student = students[student_id]
+        book = student.active.get(book_id)
+        if book is None:
+            # Only misses look through the history
+            if any(old["book_id"] == book_id for old in student.history):
+                return {"message": "Book already returned"}, 400
+            return {"message": "Book not found in student's borrowed list"}, 404
+
+        # Normal return
+        if book["status"] == "Borrowed":
+            circulation.return_loan(student_id, book)
+            return {"message": "Book returned successfully"}, 200
+
+        # Returning a missing book
+        circulation.return_loan(student_id, book)
+        return {
+            "message": "Missing book returned with reduced fine",
+            "student_id": student_id,
+            "book_id": book_id,
+            "remaining_fine": book["fine"]
+        }, 200
 
 # Enquiry Books (Public) -
 @book_management_bp.get("/book_enquiry/<book_id>")
 def book_enquiry(book_id):
-    if book_id not in books:
+    return catalog_cache.respond(("book_enquiry", book_id), lambda: _book_enquiry(book_id), book_id)
+
+
+def _book_enquiry(book_id):
+    info = books.get(book_id)
+    if info is None:
         return {"message": "Book not found"}, 404
-    if books[book_id]["available"] == "Yes":
-        return {"message": f"Book {book_id} - {books[book_id]['book_name']} is available"}
+    if info["available"] == "Yes":
+        return {"message": f"Book {book_id} - {info['book_name']} is available"}, 200
     else:
-        return {"message": f"Book {book_id} - {books[book_id]['book_name']} is NOT available"}
+        return {"message": f"Book {book_id} - {info['book_name']} is NOT available"}, 200
 
 # Books and Student Details 
 @book_management_bp.route("/students_books", methods=["GET"])
-@jwt_required()
+@auth_required()
 def students_books():
     role, username = get_current_user()
 
     if role in ["staff", "admin"]:
+        if pagination.requested():
+            return _students_books_page()
+
+        # One versions.py view: consistent, and never waits on writers
         all_students_books = {
             sid: {
-                "student_name": info["student_name"],
-                "borrowed_books": info.get("borrowed_books", [])
+                "student_name": name,
+                "borrowed_books": versions.loan_dicts(loans, marks)
             }
-            for sid, info in students.items()
+            for sid, name, loans, marks in versions.current().students
         }
         return jsonify({"students_books": all_students_books}), 200
 
@@ -168,24 +166,55 @@ def students_books():
 
     return jsonify({"error": "Unauthorized"}), 403
 
+def _student_books(row):
+    if row is None:
+        return None
+    sid, name, loans, marks = row
+    return {
+        "student_id": sid,
+        "student_name": name,
+        "borrowed_books": versions.loan_dicts(loans, marks)
+    }
+
+
+def _students_books_page():
+    error = pagination.invalid()
+    if error:
+        return jsonify({"error": error}), 400
+
+    view = versions.current()
+    page, next_cursor = pagination.page(view.student_ids())
+    rows = view.rows(page)
+    if pagination.wants_ndjson():
+        return pagination.ndjson(page, lambda sid: _student_books(rows.get(sid)), next_cursor)
+
+    students_books_page = {}
+    for sid in page:
+        entry = _student_books(rows.get(sid))
+        if entry:
+            students_books_page[sid] = {
+                "student_name": entry["student_name"],
+                "borrowed_books": entry["borrowed_books"]
+            }
+    return jsonify({"students_books": students_books_page, "next_cursor": next_cursor}), 200
+
 # Issued Books 
 @book_management_bp.route("/issued_books", methods=["GET"])
-@jwt_required()
+@auth_required()
 def get_issued_books():
     role, username = get_current_user()   
     if role not in ["staff", "admin"]:
         return jsonify({"error": "Access denied"}), 403
 
-    issued_books_list = []
-    for sid, info in students.items():
-        for book in info.get("borrowed_books", []):
-            if book["status"] == "Borrowed":
-                issued_books_list.append({
-                    "book_id": book["book_id"],
-                    "book_name": book["book_name"],
-                    "borrowed_by_id": sid,
-                    "borrowed_by_name": info["student_name"]
-                })
+    issued_books_list = [
+        {
+            "book_id": book["book_id"],
+            "book_name": book["book_name"],
+            "borrowed_by_id": sid,
+            "borrowed_by_name": name
+        }
+        for sid, name, book, _ in versions.current().loans("Borrowed")
+    ]
 
     return jsonify({
         "requested_by": username,
@@ -196,19 +225,20 @@ def get_issued_books():
 # Available Books
 @book_management_bp.route("/available_books", methods=["GET"])
 def get_available_books():
-    available_books_list = [
-        {"book_id": bid, "book_name": info["book_name"]}
-        for bid, info in books.items() if info["available"] == "Yes"
-    ]
+    return catalog_cache.respond("available_books", _available_books)
+
 
-    if not available_books_list:
-        return jsonify({"message": "No books are currently available"}), 200
+def _available_books():
+    count, available_books_list = fragments.available_array()
 
-    return jsonify({"available_books": available_books_list}), 200
+    if not count:
+        return {"message": "No books are currently available"}, 200
+
+    return {"available_books": available_books_list}, 200
 
 #  Mark Missing Book 
 @book_management_bp.put("/missing_book")
-@jwt_required()
+@auth_required()
 def missing_book():
     role, username = get_current_user()
 
@@ -219,43 +249,40 @@ def missing_book():
     student_id = data.get("student_id")
     book_id = data.get("book_id")
 
-    if student_id not in students:
-        return {"message": "Student not found"}, 404
-
-    borrowed_books = students[student_id]["borrowed_books"]
-    for book in borrowed_books:
-        if book["book_id"] == book_id and book["status"] == "Borrowed":
-            book["fine"] = 500
-            book["status"] = "Missing"
-            books[book_id]["available"] = "No"
+    with locks.loan(student_id, book_id):
+        if student_id not in students:
+            return {"message": "Student not found"}, 404
+
+        book = students[student_id].active.get(book_id)
+        if book is not None and book["status"] == "Borrowed":
+            circulation.mark_missing(student_id, book)
             return jsonify({
                 "requested_by": username,
                 "role": role,
                 "updated_book": book
             }), 200
 
-    return {"message": "Book not found in student's borrowed list"}, 404
+        return {"message": "Book not found in student's borrowed list"}, 404
 
 # List Missing Books 
 @book_management_bp.get("/missed_books")
-@jwt_required()
+@auth_required()
 def get_missing_books():
     role, username = get_current_user()
 
     if role not in ["staff", "admin"]:
         return jsonify({"error": "Access denied"}), 403
 
-    missing_books = []
-    for student_id, student_info in students.items():
-        for book in student_info.get("borrowed_books", []):
-            if book.get("status") == "Missing":
-                missing_books.append({
-                    "student_id": student_id,
-                    "student_name": student_info["student_name"],
-                    "book_id": book["book_id"],
-                    "fine": book.get("fine", 0),
-                    "due_date": book.get("date_of_returning"),
-                })
+    missing_books = [
+        {
+            "student_id": student_id,
+            "student_name": name,
+            "book_id": book["book_id"],
+            "fine": fine,
+            "due_date": book.get("date_of_returning"),
+        }
+        for student_id, name, book, (fine, _, _) in versions.current().loans("Missing")
+    ]
 
     return jsonify({
         "requested_by": username,
@@ -265,35 +292,25 @@ def get_missing_books():
 
 # Check Overdue Books 
 @book_management_bp.put("/check_overdue")
-@jwt_required()
+@auth_required()
 def check_overdue():
     role, username = get_current_user()
 
     if role not in ["staff"]:
         return jsonify({"error": "Access denied"}), 403
 
-    today = datetime.now()
-    updated_books = []
-
-    for sid, student in students.items():
-        for book in student.get("borrowed_books", []):
-            if book["status"] == "Borrowed":
-                borrow_date = datetime.strptime(book["date_of_issuing"], "%Y-%m-%d")
-                days_borrowed = (today - borrow_date).days
-
-                if days_borrowed > 15:
-                    book["status"] = "Missing"
-                    book["fine"] = 500
-                    books[book["book_id"]]["available"] = "No"
-
-                    updated_books.append({
-                        "student_id": sid,
-                        "student_name": student["student_name"],
-                        "book_id": book["book_id"],
-                        "book_name": book["book_name"],
-                        "status": "Missing",
-                        "fine": book["fine"]
-                    })
+    # Only loans whose due date has passed are popped from the scheduler
+    updated_books = [
+        {
+            "student_id": sid,
+            "student_name": students[sid]["student_name"],
+            "book_id": book["book_id"],
+            "book_name": book["book_name"],
+            "status": "Missing",
+            "fine": book["fine"]
+        }
+        for sid, book in circulation.sweep_overdue()
+    ]
 
     return jsonify({
         "requested_by": username,
@@ -301,28 +318,50 @@ def check_overdue():
         "updated_books": updated_books or []
     }), 200
 
+def _book_entry(bid):
+    info = books.get(bid)
+    if info is None:
+        return None
+    return {"book_id": bid, "book_name": info["book_name"], "available": info["available"]}
+
 #  Book Management 
 @book_management_bp.route("/books", methods=["GET", "POST", "DELETE"])
-@jwt_required()
+@auth_required()
 def manage_books():
     role, username = get_current_user()
 
     # GET all books 
     if request.method == "GET":
-        result = [
-            {"book_id": bid, "book_name": info["book_name"], "available": info["available"]}
-            for bid, info in books.items()
-        ]
-        return jsonify({
+        if pagination.requested():
+            error = pagination.invalid()
+            if error:
+                return jsonify({"error": error}), 400
+
+            page, next_cursor = pagination.page(books.keys())
+            if pagination.wants_ndjson():
+                return pagination.ndjson(page, _book_entry, next_cursor)
+
+            _, result = fragments.book_array(page)
+            return fragments.response({
+                "requested_by": username,
+                "role": role,
+                "total_books": len(books),
+                "books": result,
+                "next_cursor": next_cursor
+            })
+
+        total, result = fragments.book_array()
+        return fragments.response({
             "requested_by": username,
             "role": role,
-            "total_books": len(result),
+            "total_books": total,
             "books": result
-        }), 200
+        })
 
     # Only admin can add/delete books
-    if role != "admin":
-        return jsonify({"error": "Admin privilege required"}), 403
+    denied = admin_denied()
+    if denied:
+        return denied
 
     if request.method == "POST":
         data = request.json
@@ -331,10 +370,15 @@ def manage_books():
 
         if not book_id or not book_name:
             return jsonify({"error": "book_id and book_name are required"}), 400
-        if book_id in books:
-            return jsonify({"error": "Book ID already exists"}), 400
-
-        books[book_id] = {"book_name": book_name, "available": "Yes"}
+        with locks.book(book_id):
+            if book_id in books:
+                return jsonify({"error": "Book ID already exists"}), 400
+
+            books[book_id] = Book(book_id, book_name)
+            search_index.add(book_id, book_name)
+            catalog_cache.bump(book_id)
+            storage.save_book(book_id)
+            events.publish("added", book_id, "Yes")
         return jsonify({
             "message": f"Book {book_name} added successfully",
             "requested_by": username
@@ -346,12 +390,53 @@ def manage_books():
 
         if not book_id:
             return jsonify({"error": "book_id is required"}), 400
-        if book_id not in books:
-            return jsonify({"error": "Book not found"}), 404
-
-        deleted = books.pop(book_id)
+        with locks.book(book_id):
+            if book_id not in books:
+                return jsonify({"error": "Book not found"}), 404
+
+            deleted = books.pop(book_id)
+            search_index.remove(book_id)
+            fragments.drop_book(book_id)
+            catalog_cache.drop(book_id)
+            storage.delete_book(book_id)
+            events.publish("removed", book_id)
         return jsonify({
             "message": f"Book {book_id} deleted successfully",
             "deleted": deleted,
             "requested_by": username
         }), 200
+
+# Search Books 
+@book_management_bp.get("/books/search")
+@auth_required()
+def search_books():
+    role, username = get_current_user()
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+
+    limit = request.args.get("limit", "20")
+    if not limit.isdigit() or not 0 < int(limit) <= 100:
+        return jsonify({"error": "limit must be between 1 and 100"}), 400
+
+    available_only = request.args.get("available", "").lower() in ["yes", "true", "1"]
+    prefix = request.args.get("prefix", "yes").lower() not in ["no", "false", "0"]
+
+    results = []
+    for book_id, exact_matches in search_index.search(query, int(limit), available_only, prefix):
+        info = books.get(book_id)
+        if info:
+            results.append({
+                "book_id": book_id,
+                "book_name": info["book_name"],
+                "available": info["available"],
+                "exact_matches": exact_matches
+            })
+
+    return jsonify({
+        "requested_by": username,
+        "role": role,
+        "query": query,
+        "results": results
+    }), 200
@@ -0,0 +1,228 @@
+import csv
+import io
+import json
+from flask import Blueprint, request, jsonify
+from db import students, books, librarians
+from records import Book
+from login_routes import get_current_user, auth_required
+import circulation
+import search_index
+import catalog_cache
+import storage
+import locks
+import occupancy
+import events
+
+bulk_routes_bp = Blueprint("bulk_routes_bp", __name__)
+
+MAX_BATCH = 10000
+
+
+def _parse_catalog(stream, content_type):
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    if "csv" in content_type:
+        for line, row in enumerate(csv.DictReader(text), start=2):
+            yield line, row
+    else:
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError:
+                yield line, None
+                continue
+            yield line, row if isinstance(row, dict) else None
+
+
+# String ID fields of an import row or batch item, anything else reads as missing
+def _field(item, key, default=None):
+    value = item.get(key, default) if isinstance(item, dict) else default
+    return value if isinstance(value, str) else None
+
+
+#  Bulk Catalog Import (CSV with a book_id,book_name header, or JSON lines)
+@bulk_routes_bp.post("/books/import")
+@auth_required()
+def import_books():
+    role, username = get_current_user()
+
+    if role != "admin":
+        return jsonify({"error": "Admin privilege required"}), 403
+
+    # Validation pass over the streamed body. Results look like the batch
+    # borrow/return ones: the status and message the single route would give.
+    results = []
+    pending = {}
+    try:
+        for line, row in _parse_catalog(request.stream, request.content_type or ""):
+            if row is None:
+                results.append({"line": line, "status": 400, "message": "Unreadable row"})
+                continue
+            book_id = (_field(row, "book_id") or "").strip()
+            book_name = (_field(row, "book_name") or "").strip()
+            if not book_id or not book_name:
+                results.append({"line": line, "book_id": book_id or None, "status": 400,
+                                "message": "book_id and book_name are required as text"})
+            elif book_id in pending:
+                results.append({"line": line, "book_id": book_id, "status": 400,
+                                "message": "Duplicate book_id in import"})
+            else:
+                pending[book_id] = book_name
+                results.append({"line": line, "book_id": book_id, "status": 201,
+                                "message": f"Book {book_name} added successfully"})
+            if len(results) > MAX_BATCH:
+                return jsonify({"error": f"At most {MAX_BATCH} rows per import"}), 413
+    except UnicodeDecodeError:
+        return jsonify({"error": "Import must be UTF-8 text"}), 400
+    except csv.Error as exc:
+        return jsonify({"error": f"Unreadable CSV: {exc}"}), 400
+
+    # Apply everything under one acquisition of the affected book locks
+    with locks.hold(book_ids=pending), storage.transaction():
+        for result in results:
+            if result["status"] != 201:
+                continue
+            book_id = result["book_id"]
+            if book_id in books:
+                result.update(status=400, message="Book ID already exists")
+                continue
+            books[book_id] = Book(book_id, pending[book_id])
+            search_index.add(book_id, pending[book_id])
+            catalog_cache.bump(book_id)
+            storage.save_book(book_id)
+            events.publish("added", book_id, "Yes")
+
+    added = sum(1 for result in results if result["status"] == 201)
+    return jsonify({
+        "requested_by": username,
+        "added": added,
+        "failed": len(results) - added,
+        "results": results
+    }), 200
+
+
+def _items():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return None, data
+    return items, data
+
+
+#  Batch Borrow
+@bulk_routes_bp.post("/borrow_books")
+@auth_required()
+def borrow_books():
+    role, username = get_current_user()
+
+    if role not in ["staff", "admin"]:
+        return {"error": "Access denied"}, 403
+
+    items, data = _items()
+    if items is None:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH:
+        return jsonify({"error": f"At most {MAX_BATCH} items per batch"}), 413
+
+    default_librarian = data.get("librarian_id")
+    student_ids = {_field(item, "student_id") for item in items} - {None}
+    book_ids = {_field(item, "book_id") for item in items} - {None}
+
+    results = []
+    with locks.hold(student_ids, book_ids), storage.transaction():
+        active = {}
+        claimed = set()
+        for index, item in enumerate(items):
+            student_id = _field(item, "student_id")
+            book_id = _field(item, "book_id")
+            librarian_id = _field(item, "librarian_id", default_librarian)
+            result = {"index": index, "student_id": student_id, "book_id": book_id}
+            results.append(result)
+
+            if student_id not in students:
+                result.update(status=404, message="Student not found")
+                continue
+            student = students[student_id]
+            if not occupancy.is_inside(student_id):
+                result.update(status=403, message="Student must be inside the library to borrow a book")
+                continue
+            if book_id not in books or books[book_id]["available"] == "No" or book_id in claimed:
+                result.update(status=400, message="Book not available")
+                continue
+            if librarian_id not in librarians:
+                result.update(status=404, message="Librarian not found")
+                continue
+            if student_id not in active:
+                active[student_id] = len(student.active)
+            if active[student_id] >= 3:
+                result.update(status=403, message="Borrowing limit reached (max 3 books allowed)")
+                continue
+            if book_id in student.active:
+                result.update(status=400, message="Student already has an active loan for this book")
+                continue
+
+            record = circulation.issue_book(student_id, book_id, librarian_id)
+            active[student_id] += 1
+            claimed.add(book_id)
+            result.update(status=200, borrowed_books_count=active[student_id], borrowed_book=record)
+
+    return jsonify({
+        "requested_by": username,
+        "issued": sum(1 for result in results if result["status"] == 200),
+        "results": results
+    }), 200
+
+
+#  Batch Return
+@bulk_routes_bp.put("/return_books")
+@auth_required()
+def return_books():
+    role, username = get_current_user()
+
+    items, data = _items()
+    if items is None:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH:
+        return jsonify({"error": f"At most {MAX_BATCH} items per batch"}), 413
+
+    student_ids = {_field(item, "student_id") for item in items} - {None}
+    book_ids = {_field(item, "book_id") for item in items} - {None}
+
+    if role not in ["staff", "admin"] and student_ids != {username}:
+        return {"error": "Access denied"}, 403
+
+    results = []
+    with locks.hold(student_ids, book_ids), storage.transaction():
+        for index, item in enumerate(items):
+            student_id = _field(item, "student_id")
+            book_id = _field(item, "book_id")
+            result = {"index": index, "student_id": student_id, "book_id": book_id}
+            results.append(result)
+
+            if student_id not in students:
+                result.update(status=404, message="Student not found")
+                continue
+
+            student = students[student_id]
+            loan = student.active.get(book_id)
+            if loan is None:
+                if any(old["book_id"] == book_id for old in student.history):
+                    result.update(status=400, message="Book already returned")
+                else:
+                    result.update(status=404, message="Book not found in student's borrowed list")
+            elif loan["status"] == "Borrowed":
+                circulation.return_loan(student_id, loan)
+                result.update(status=200, message="Book returned successfully")
+            else:
+                circulation.return_loan(student_id, loan)
+                result.update(status=200, message="Missing book returned with reduced fine",
+                              remaining_fine=loan["fine"])
+
+    return jsonify({
+        "requested_by": username,
+        "returned": sum(1 for result in results if result["status"] == 200),
+        "results": results
+    }), 200
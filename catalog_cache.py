@@ -0,0 +1,91 @@
+import hashlib
+import itertools
+import threading
+from flask import request, Response
+import fragments
+
+# Versioned cache for the public catalog endpoints.
+# The catalog version goes up on every availability change, book added or
+# book removed. Response bodies are serialized once per version and served
+# with a strong ETag, so an unchanged catalog costs a dict lookup and, for
+# clients sending If-None-Match, a 304 with no body. Only 200 responses are
+# kept, at most MAX_RESPONSES of them (the oldest go first), and a deleted
+# book's responses go with it.
+
+MAX_RESPONSES = 10000
+
+_counter = itertools.count(1)
+_version = 0
+_book_versions = {} # book_id -> catalog version of that book's last change
+_responses = {}     # key -> (version, etag, body, status, book_id), oldest first
+_book_keys = {}     # book_id -> keys of the cached responses about that book
+_lock = threading.Lock()   # held while adding or dropping responses
+
+
+def version():
+    return _version
+
+
+# Call after the catalog changed; book_id names the book that changed
+def bump(book_id=None):
+    global _version
+    _version = next(_counter)
+    if book_id is not None:
+        _book_versions[book_id] = _version
+
+
+# Call after a book was deleted. Its version stays behind (one int), so a
+# response built before the delete can never be stored as current.
+def drop(book_id):
+    bump(book_id)
+    with _lock:
+        for key in _book_keys.pop(book_id, ()):
+            _responses.pop(key, None)
+
+
+def _store(key, entry, book_id):
+    with _lock:
+        if entry[0] != (_version if book_id is None else _book_versions.get(book_id, 0)):
+            return   # changed while it was built
+        if key not in _responses and len(_responses) >= MAX_RESPONSES:
+            oldest = next(iter(_responses))
+            evicted = _responses.pop(oldest)[4]
+            keys = _book_keys.get(evicted)
+            if keys is not None:
+                keys.discard(oldest)
+                if not keys:
+                    del _book_keys[evicted]
+        _responses[key] = entry
+        if book_id is not None:
+            _book_keys.setdefault(book_id, set()).add(key)
+
+
+# Serve build() -> (payload, status) from the cache for the current version.
+# Responses about a single book pass its book_id and only expire when it changes.
+def respond(key, build, book_id=None):
+    current = _version if book_id is None else _book_versions.get(book_id, 0)
+    entry = _responses.get(key)
+    if entry is None or entry[0] != current:
+        payload, status = build()
+        body = fragments.body(payload)
+        etag = hashlib.sha1(body).hexdigest()
+        entry = (current, etag, body, status, book_id)
+        if status == 200:
+            _store(key, entry, book_id)
+
+    _, etag, body, status, _ = entry
+    response = Response(body, status=status, mimetype="application/json")
+    response.set_etag(etag)
+    if status == 200 and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+    return response
+
+
+def clear():
+    with _lock:
+        _responses.clear()
+        _book_keys.clear()
+        _book_versions.clear()
+    fragments.clear()
+    bump()
@@ -0,0 +1,130 @@
+from datetime import date
+from db import students, books
+from records import Loan, day
+import loan_index
+import fine_ledger
+import search_index
+import catalog_cache
+import overdue_scheduler
+import storage
+import locks
+import metrics
+import rollups
+import occupancy
+import events
+import fine_policy
+import versions
+
+# Loan state changes shared by the book routes and the overdue sweeper.
+# Callers validate the request and hold the locks for the student and book
+# involved (see locks.py); these only apply the change and keep the
+# loan index, due-date scheduler, fine ledger and storage backend in step
+# with the records.
+
+LOAN_DAYS = 7       # date_of_returning is this many days after issue
+
+
+def set_available(book_id, available):
+    books[book_id]["available"] = "Yes" if available else "No"
+    search_index.set_available(book_id, available)
+    catalog_cache.bump(book_id)
+
+
+def issue_book(student_id, book_id, librarian_id):
+    issued_on = date.today().toordinal()
+    record = Loan(books[book_id], librarian_id, day(issued_on), day(issued_on + LOAN_DAYS))
+
+    students[student_id].add_loan(record)
+    set_available(book_id, False)
+    loan_index.track(student_id, record)
+    overdue_scheduler.schedule(student_id, record)
+    storage.add_loan(student_id, record)
+    rollups.loan_issued(record)
+    metrics.inc("library_borrows_total")
+    events.publish("borrowed", book_id, "No")
+    return record
+
+
+def return_loan(student_id, record):
+    if record["status"] == "Borrowed":
+        # Keeps whatever the policy charged while it was overdue
+        record["fine"] = fine_policy.fine(record)
+        record["status"] = "Returned"
+    else:
+        # Returning a missing book costs the reduced fine, minus anything already paid
+        record.paid = fine_policy.paid(record)
+        record["status"] = "Returned"
+        record["was_missing"] = True
+        record["fine"] = fine_policy.fine(record)
+
+    students[student_id].close_loan(record)
+    set_available(record["book_id"], True)
+    loan_index.track(student_id, record)
+    fine_ledger.track(student_id, record)
+    overdue_scheduler.cancel(record)
+    storage.save_loan(student_id, record)
+    rollups.loan_returned(record)
+    metrics.inc("library_returns_total")
+    events.publish("returned", record["book_id"], "Yes")
+    return record
+
+
+def mark_missing(student_id, record):
+    record.paid = fine_policy.paid(record)
+    record["status"] = "Missing"
+    record["fine"] = fine_policy.fine(record)
+    set_available(record["book_id"], False)
+    loan_index.track(student_id, record)
+    fine_ledger.track(student_id, record)
+    overdue_scheduler.cancel(record)
+    storage.save_loan(student_id, record)
+    rollups.loan_missing(record)
+    metrics.inc("library_missing_marks_total")
+    events.publish("missing", record["book_id"], "No")
+    return record
+
+
+# Deduct a payment from the student's fines, returns the remaining balance
+def pay_fine(student_id, amount):
+    owed = fine_ledger.balance(student_id)
+    with storage.transaction():   # readers see the payment on every loan at once
+        for record in fine_ledger.fine_loans(student_id):
+            record.paid = fine_policy.paid(record)
+        for record in fine_ledger.pay(student_id, amount):
+            loan_index.track(student_id, record)
+            storage.save_loan(student_id, record)
+    remaining = fine_ledger.balance(student_id)
+    rollups.fine_paid(owed - remaining)
+    metrics.inc("library_fine_payments_total")
+    metrics.inc("library_fines_paid_total", owed - remaining)
+    return remaining
+
+
+# Rebuild derived structures after the db dicts were replaced (e.g. by storage.load)
+def rebuild_indexes():
+    loan_index.rebuild()
+    fine_ledger.rebuild()
+    search_index.rebuild()
+    catalog_cache.clear()
+    overdue_scheduler.rebuild()
+    rollups.rebuild()
+    occupancy.rebuild()
+    versions.rebuild()
+
+
+# Mark one loan popped from the scheduler as missing, unless it was
+# returned or marked missing while we waited for its locks
+def expire_loan(student_id, record):
+    with locks.loan(student_id, record["book_id"]):
+        if record["status"] != "Borrowed":
+            return None
+        return mark_missing(student_id, record)
+
+
+# Move every loan past the overdue threshold to Missing
+def sweep_overdue(today=None):
+    expired = []
+    for sid, record in overdue_scheduler.pop_expired(today):
+        if expire_loan(sid, record) is not None:
+            expired.append((sid, record))
+    return expired
@@ -1,3 +1,5 @@
+from records import Student, Book
+
 # Preloaded data
 students = {
     "S001": {"student_name": "Mounika", "in_time": None, "out_time": None,
@@ -47,3 +49,8 @@ users = {
     "staff": {"password": "staff@123", "role": "staff"}
 }
 
+# Held as compact records (see records.py); they read like the dicts above
+for student_id, info in students.items():
+    students[student_id] = Student(**info)
+for book_id, info in books.items():
+    books[book_id] = Book(book_id, **info)
@@ -0,0 +1,149 @@
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+# In-process change feed behind /events (events_routes.py).
+# circulation.py publishes borrowed / returned / missing (including the
+# overdue sweep), manage_books and the bulk import publish added / removed,
+# and journal replay publishes the changes other workers made. Each event:
+#   {"id": token, "type": ..., "book_id": ..., "available": "Yes"/"No", "time": ...}
+# No student ids: the feed is public like /available_books.
+#
+# Writers never wait on readers: publish() appends to the recent-events ring
+# and to the queues of the subscribers watching that book (indexed by
+# book_id), then wakes them. A subscriber queue holds at most BUFFER events;
+# a subscriber that falls further behind is marked and, on its next read,
+# catches up from the ring instead. The ring keeps the last RETAIN events,
+# which is also what a resume token can reach back to; an older token, or one
+# from another process (tokens carry a per-process epoch), gets a "reset"
+# event telling the client to reload the state it tracks.
+
+RETAIN = 4096
+BUFFER = 256
+
+_lock = threading.Lock()
+_epoch = os.urandom(4).hex()
+_seq = 0
+_recent = deque(maxlen=RETAIN)   # (seq, event)
+_watchers = {}         # book_id -> subscribers filtering on it
+_everything = set()    # subscribers without a filter
+_subscribers = set()
+
+
+class Subscriber:
+    def __init__(self, book_ids):
+        self.book_ids = book_ids     # frozenset, or None for every book
+        self.queue = deque()         # (seq, event)
+        self.last_seq = 0            # last seq handed to the reader
+        self.behind = False          # queue overflowed; read from the ring next
+        self.wakeup = threading.Event()
+
+
+def _token(seq):
+    return f"{_epoch}-{seq}"
+
+
+# Resume token for the last event handed to the subscriber
+def position(subscriber):
+    return _token(subscriber.last_seq)
+
+
+def publish(kind, book_id, available=None):
+    global _seq
+    with _lock:
+        _seq += 1
+        event = {"id": _token(_seq), "type": kind, "book_id": book_id,
+                 "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        if available is not None:
+            event["available"] = available
+        _recent.append((_seq, event))
+        watchers = _watchers.get(book_id)
+        for group in (_everything, watchers) if watchers else (_everything,):
+            for subscriber in group:
+                if not subscriber.behind:
+                    if len(subscriber.queue) < BUFFER:
+                        subscriber.queue.append((_seq, event))
+                    else:
+                        subscriber.behind = True
+                        subscriber.queue.clear()
+                if not subscriber.wakeup.is_set():
+                    subscriber.wakeup.set()
+
+
+def _parse(token):
+    epoch, _, seq = (token or "").partition("-")
+    if epoch != _epoch or not seq.isdigit():
+        return None
+    return int(seq)
+
+
+def _matches(subscriber, event):
+    return subscriber.book_ids is None or event["book_id"] in subscriber.book_ids
+
+
+# Events after last_seq still in the ring, or None when some have already
+# been dropped from it. Call with _lock held.
+def _from_ring(subscriber, last_seq):
+    oldest = _recent[0][0] if _recent else _seq + 1
+    if last_seq > _seq or last_seq < oldest - 1:
+        return None
+    return [(seq, event) for seq, event in _recent if seq > last_seq and _matches(subscriber, event)]
+
+
+def _reset():
+    return (_seq, {"id": _token(_seq), "type": "reset"})
+
+
+# Start listening. since: a resume token (the id of the last event the client
+# saw); without one the feed starts from now.
+def subscribe(book_ids=None, since=None):
+    subscriber = Subscriber(frozenset(book_ids) if book_ids else None)
+    with _lock:
+        subscriber.last_seq = _seq
+        if since is not None:
+            last_seq = _parse(since)
+            backlog = _from_ring(subscriber, last_seq) if last_seq is not None else None
+            subscriber.queue.extend(backlog if backlog is not None else [_reset()])
+        _subscribers.add(subscriber)
+        if subscriber.book_ids is None:
+            _everything.add(subscriber)
+        else:
+            for book_id in subscriber.book_ids:
+                _watchers.setdefault(book_id, set()).add(subscriber)
+    return subscriber
+
+
+def unsubscribe(subscriber):
+    with _lock:
+        _subscribers.discard(subscriber)
+        _everything.discard(subscriber)
+        for book_id in subscriber.book_ids or ():
+            watchers = _watchers.get(book_id)
+            if watchers is not None:
+                watchers.discard(subscriber)
+                if not watchers:
+                    del _watchers[book_id]
+
+
+# The subscriber's pending events, waiting up to timeout seconds for one
+def read(subscriber, timeout):
+    if not subscriber.queue and not subscriber.behind:
+        subscriber.wakeup.wait(timeout)
+    with _lock:
+        subscriber.wakeup.clear()
+        if subscriber.behind:
+            subscriber.behind = False
+            pending = _from_ring(subscriber, subscriber.last_seq)
+            if pending is None:
+                pending = [_reset()]
+        else:
+            pending = list(subscriber.queue)
+        subscriber.queue.clear()
+        if pending:
+            subscriber.last_seq = pending[-1][0]
+    return [event for _, event in pending]
+
+
+def subscribers():
+    return len(_subscribers)
@@ -0,0 +1,76 @@
+import json
+from flask import Blueprint, request, jsonify, Response
+import events
+import journal
+
+events_routes_bp = Blueprint("events_routes_bp", __name__)
+
+MAX_SUBSCRIBERS = 500     # open streams and waiting polls per process
+MAX_WAIT = 30             # longest long-poll wait, seconds
+HEARTBEAT = 15            # seconds between keep-alive comments on idle streams
+TICK = 1.0                # waiting subscribers wake this often to pick up other workers' changes (shared mode)
+
+
+def _book_ids():
+    book_ids = []
+    for value in request.args.getlist("book_id"):
+        book_ids.extend(part for part in value.split(",") if part)
+    return book_ids
+
+
+def _sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+# Change feed for kiosks and desk apps, instead of polling the catalog (no token,
+# like /available_books)
+#   GET /events                     server-sent events; reconnects resume from Last-Event-ID
+#   GET /events?format=json         long-poll: waits up to ?wait= seconds (default 25) for
+#                                   events after ?since=<id>, returns them and the next since
+#   ?book_id=B101&book_id=B102      only those books (or ?book_id=B101,B102)
+@events_routes_bp.get("/events")
+def event_feed():
+    if events.subscribers() >= MAX_SUBSCRIBERS:
+        return jsonify({"error": "Too many event subscribers, retry later"}), 503
+    book_ids = _book_ids()
+
+    if request.args.get("format") == "json":
+        wait = request.args.get("wait", "25")
+        if not wait.isdigit() or int(wait) > MAX_WAIT:
+            return jsonify({"error": f"wait must be between 0 and {MAX_WAIT} seconds"}), 400
+
+        subscriber = events.subscribe(book_ids, request.args.get("since"))
+        try:
+            batch = events.read(subscriber, 0)
+            for _ in range(int(int(wait) / TICK)):
+                if batch:
+                    break
+                journal.catch_up()
+                batch = events.read(subscriber, TICK)
+        finally:
+            events.unsubscribe(subscriber)
+        return jsonify({"events": batch, "next": events.position(subscriber)}), 200
+
+    since = request.headers.get("Last-Event-ID") or request.args.get("since")
+
+    def stream():
+        subscriber = events.subscribe(book_ids, since)
+        try:
+            yield f"retry: 3000\n: from {events.position(subscriber)}\n\n"
+            idle = 0
+            while True:
+                journal.catch_up()
+                batch = events.read(subscriber, TICK)
+                if batch:
+                    idle = 0
+                    yield "".join(map(_sse, batch))
+                else:
+                    idle += TICK
+                    if idle >= HEARTBEAT:
+                        idle = 0
+                        yield ": keep-alive\n\n"
+        finally:
+            events.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
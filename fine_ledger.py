@@ -0,0 +1,108 @@
+from db import students
+
+# Fine ledger: a running outstanding balance per student and the loans that
+# currently carry a fine, so fine lookups and payments never re-sum the whole
+# loan history.
+
+_balances = {}      # student_id -> outstanding fine
+_fine_loans = {}    # student_id -> {id(record): record} with fine > 0, in the order the fines arose
+_recorded = {}      # id(record) -> fine the ledger last saw on it
+
+
+# Call after a loan's fine may have changed
+def track(student_id, record):
+    key = id(record)
+    fine = record.fine
+    old = _recorded.get(key, 0)
+    if fine == old:
+        return
+
+    _balances[student_id] = _balances.get(student_id, 0) + fine - old
+    loans = _fine_loans.setdefault(student_id, {})
+    if fine > 0:
+        _recorded[key] = fine
+        loans[key] = record
+    else:
+        _recorded.pop(key, None)
+        loans.pop(key, None)
+
+
+def balance(student_id):
+    return _balances.get(student_id, 0)
+
+
+def fine_loans(student_id):
+    return list(_fine_loans.get(student_id, {}).values())
+
+
+# Deduct a payment from the student's fines, oldest fine first, and add it
+# to what each loan has been paid (unless that is not known, see fine_policy.py).
+# Returns the records whose fine changed.
+def pay(student_id, amount):
+    changed = []
+    remaining = amount
+    for record in fine_loans(student_id):
+        if remaining <= 0:
+            break
+        deducted = min(remaining, record["fine"])
+        record["fine"] -= deducted
+        remaining -= deducted
+        if record.paid is not None:
+            record.paid += deducted
+        track(student_id, record)
+        changed.append(record)
+    return changed
+
+
+def forget_student(student_id):
+    for key in _fine_loans.pop(student_id, {}):
+        _recorded.pop(key, None)
+    _balances.pop(student_id, None)
+
+
+def rebuild():
+    _balances.clear()
+    _fine_loans.clear()
+    _recorded.clear()
+    for sid, info in students.items():
+        for record in info.loans():
+            track(sid, record)
+
+
+# Ledger contents for snapshot.py; records are the same objects as in students
+def export_state():
+    return {
+        "balances": dict(_balances),
+        "fine_loans": {sid: list(loans.values()) for sid, loans in _fine_loans.items()},
+    }
+
+
+def import_state(state):
+    _balances.clear()
+    _balances.update(state["balances"])
+    _fine_loans.clear()
+    _recorded.clear()
+    for sid, records in state["fine_loans"].items():
+        _fine_loans[sid] = {id(record): record for record in records}
+        for record in records:
+            _recorded[id(record)] = record.get("fine", 0)
+
+
+# Check the ledger against the raw records.
+# Returns a list of problems; an empty list means the ledger is consistent.
+def audit():
+    problems = []
+    for sid, info in students.items():
+        records = [r for r in info.borrowed_books if r.fine > 0]
+        expected = sum(r["fine"] for r in records)
+        if balance(sid) != expected:
+            problems.append(f"{sid}: balance {balance(sid)}, records sum to {expected}")
+        if {id(r) for r in records} != set(_fine_loans.get(sid, {})):
+            problems.append(f"{sid}: fine-bearing loans differ from records")
+    for sid in _balances:
+        if sid not in students and _balances[sid]:
+            problems.append(f"{sid}: balance {_balances[sid]} for unknown student")
+    return problems
+
+
+rebuild()
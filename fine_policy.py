@@ -0,0 +1,152 @@
+from datetime import date
+from db import students
+from loan_columns import BORROWED, MISSING, RETURNED, RETURNED_MISSING, code
+import loan_columns
+import loan_index
+import fine_ledger
+import storage
+import locks
+import metrics
+
+try:
+    import numpy
+except ImportError:   # optional: without it recompute() checks the loans one by one
+    numpy = None
+
+# Fine rules for circulation.py and the batch recompute (PUT /recompute_fines).
+#   missing_fine         charged when a loan is marked missing
+#   missing_return_fine  what a missing loan costs once it is returned
+#   daily_fine           charged per day a Borrowed loan is past its due date
+#   grace_days           days past the due date before daily fines start
+#   max_fine             cap on what one loan is charged, None = no cap
+# A loan's fine is what the policy charges it minus what has been paid on
+# it (Loan.paid), never below 0, so a policy change keeps every payment made
+# under the old one. Returned loans that never went missing keep the fine they
+# were returned with: loans keep no return date to charge days up to.
+#
+# Loan.paid is None for loans that predate payment tracking or were imported
+# from their dict form; they are taken to have been fined under DEFAULTS (the
+# rules before policies were configurable), so what they paid is the default
+# charge minus the fine they still carry.
+
+DEFAULTS = {
+    "missing_fine": 500,
+    "missing_return_fine": 250,
+    "daily_fine": 0,
+    "grace_days": 0,
+    "max_fine": None,
+}
+
+BATCH = 1000        # changed loans written back per lock hold and transaction
+
+policy = dict(DEFAULTS)
+
+
+def configure(settings):
+    global policy
+    unknown = set(settings) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown fine policy settings: {', '.join(sorted(unknown))}")
+    policy = {**DEFAULTS, **settings}
+
+
+# What the policy (default: the configured one) charges a loan as of today,
+# a date ordinal, or None for returned loans it leaves alone
+def charge(record, today=None, rules=None):
+    rules = rules or policy
+    kind = code(record)
+    if kind == BORROWED:
+        today = today or date.today().toordinal()
+        amount = max(today - record.due_on - rules["grace_days"], 0) * rules["daily_fine"]
+    elif kind == MISSING:
+        amount = rules["missing_fine"]
+    elif kind == RETURNED_MISSING:
+        amount = rules["missing_return_fine"]
+    else:
+        return None
+    cap = rules["max_fine"]
+    return amount if cap is None else min(amount, cap)
+
+
+# What has been paid on the loan (see above for loans that do not know)
+def paid(record, today=None):
+    if record.paid is not None:
+        return record.paid
+    return max((charge(record, today, DEFAULTS) or 0) - record.fine, 0)
+
+
+# The fine the policy puts on a loan now
+def fine(record, today=None):
+    amount = charge(record, today)
+    if amount is None:
+        return record.fine
+    return max(amount - paid(record, today), 0)
+
+
+# Every loan and its student, for the loop when numpy is not installed
+def _loans():
+    records, owners = [], []
+    for sid, info in list(students.items()):
+        count = len(records)
+        records.extend(info.history)
+        records.extend(info.active.values())
+        owners.extend([sid] * (len(records) - count))
+    return records, owners
+
+
+# charge() over the columns (0 for returned loans)
+def _charged_numpy(codes, due, today, rules):
+    overdue = numpy.maximum(today - due - rules["grace_days"], 0)
+    charged = numpy.select(
+        [codes == BORROWED, codes == MISSING, codes == RETURNED_MISSING],
+        [overdue * rules["daily_fine"], rules["missing_fine"], rules["missing_return_fine"]],
+    )
+    if rules["max_fine"] is not None:
+        charged = numpy.minimum(charged, rules["max_fine"])
+    return charged
+
+
+# Rows whose fine the policy changes, in one pass over the loan columns
+def _changed_numpy(codes, due, fines, payments, today):
+    charged = _charged_numpy(codes, due, today, policy)
+    inferred = numpy.maximum(_charged_numpy(codes, due, today, DEFAULTS) - fines, 0)
+    paid_so_far = numpy.where(payments >= 0, payments, inferred)
+    new_fines = numpy.maximum(charged - paid_so_far, 0)
+    changed = (new_fines != fines) & (codes != RETURNED)
+    return numpy.flatnonzero(changed).tolist()
+
+
+def _changed_loop(records, today):
+    return [index for index, record in enumerate(records) if fine(record, today) != record.fine]
+
+
+# Apply the policy to every loan; only loans whose fine changes are locked,
+# updated and saved. Each is checked again under its locks, so a loan
+# returned or paid in the meantime gets the fine it has now.
+# Returns the number of loans checked and the (student_id, record) pairs changed.
+def recompute(today=None):
+    today = (today or date.today()).toordinal()
+    if numpy is not None:
+        records, owners, *columns = loan_columns.columns()
+        candidates = _changed_numpy(*columns, today)
+    else:
+        records, owners = _loans()
+        candidates = _changed_loop(records, today)
+
+    changed = []
+    for start in range(0, len(candidates), BATCH):
+        batch = [(owners[index], records[index]) for index in candidates[start:start + BATCH]]
+        with locks.hold({sid for sid, _ in batch}, {record.book_id for _, record in batch}), storage.transaction():
+            for sid, record in batch:
+                new_fine = fine(record, today)
+                student = students.get(sid)
+                if new_fine == record.fine or student is None or student.loan(record.serial) is not record:
+                    continue
+                record.paid = paid(record, today)
+                record.fine = new_fine
+                loan_index.track(sid, record)
+                fine_ledger.track(sid, record)
+                storage.save_loan(sid, record)
+                changed.append((sid, record))
+    metrics.inc("library_fines_recomputed_total", len(changed))
+    return len(records), changed
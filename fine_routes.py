@@ -1,13 +1,18 @@
 from flask import Blueprint, request, jsonify
 from db import students
-from flask_jwt_extended import jwt_required
-from login_routes import get_current_user   
+from login_routes import get_current_user, auth_required
+import fine_ledger
+import circulation
+import pagination
+import locks
+import fine_policy
+import versions
 
 fine_routes_bp = Blueprint("fine_routes_bp", __name__)
 
 # Checking Fines 
 @fine_routes_bp.get("/fines/<student_id>")
-@jwt_required()
+@auth_required()
 def get_student_fines(student_id):
     role, username = get_current_user()
 
@@ -21,17 +26,16 @@ def get_student_fines(student_id):
     student = students[student_id]
     fines_list = []
 
-    for book in student["borrowed_books"]:
-        if book.get("fine", 0) > 0 and book.get("status") in ["Returned", "Missing"]:
-            fines_list.append({
-                "student_id": student_id,
-                "student_name": student["student_name"],
-                "book_id": book["book_id"],
-                "book_name": book["book_name"],
-                "status": book["status"],
-                "fine": book["fine"],
-                "was_missing": book.get("was_missing", False)
-            })
+    for book in fine_ledger.fine_loans(student_id):
+        fines_list.append({
+            "student_id": student_id,
+            "student_name": student["student_name"],
+            "book_id": book["book_id"],
+            "book_name": book["book_name"],
+            "status": book["status"],
+            "fine": book["fine"],
+            "was_missing": book.get("was_missing", False)
+        })
 
     if not fines_list:
         return {"message": f"No fines pending for student {student_id}"}, 200
@@ -40,80 +44,118 @@ def get_student_fines(student_id):
 
 # View All Students with Fines 
 @fine_routes_bp.route("/students_fines", methods=["GET"])
-@jwt_required()
+@auth_required()
 def students_fines():
     role, username = get_current_user()
 
     if role not in ["admin", "staff"]:
         return jsonify({"error": "Only librarians (staff/admin) can view fines"}), 403
 
+    # One versions.py view: consistent, and never waits on writers
+    view = versions.current()
+
+    if pagination.requested():
+        error = pagination.invalid()
+        if error:
+            return jsonify({"error": error}), 400
+
+        # Entries are built only for the page (one at a time when streaming)
+        page, next_cursor = pagination.page(view.fined_student_ids())
+        rows = view.rows(page)
+        if pagination.wants_ndjson():
+            return pagination.ndjson(page, lambda sid: {"student_id": sid, **_fines_entry(rows[sid])}, next_cursor)
+        return jsonify({
+            "students_with_fines": {sid: _fines_entry(rows[sid]) for sid in page},
+            "next_cursor": next_cursor
+        }), 200
+
     students_with_fines = {}
-    for sid, info in students.items():
-        fines = []
-        for book in info.get("borrowed_books", []):
-            if book.get("fine", 0) > 0 and book.get("status") in ["Returned", "Missing"]:
-                fines.append({
-                    "book_id": book["book_id"],
-                    "book_name": book["book_name"],
-                    "fine": book["fine"],
-                    "status": book["status"],
-                    "was_missing": book.get("was_missing", False)
-                })
-        if fines:
+    for sid, name, book, mark in view.loans_with_fines():
+        if sid not in students_with_fines:
             students_with_fines[sid] = {
-                "student_name": info["student_name"],
-                "fines": fines
+                "student_name": name,
+                "fines": []
             }
+        students_with_fines[sid]["fines"].append(_fine(book, mark))
 
     if not students_with_fines:
         return jsonify({"message": "No fines pending"}), 200
 
     return jsonify({"students_with_fines": students_with_fines}), 200
 
+
+def _fine(book, mark):
+    fine, state, went_missing = mark
+    return {
+        "book_id": book["book_id"],
+        "book_name": book["book_name"],
+        "fine": fine,
+        "status": state.value,
+        "was_missing": went_missing
+    }
+
+
+def _fines_entry(row):
+    return {"student_name": row[1], "fines": [_fine(book, mark) for book, mark in versions.row_fines(row)]}
+
 # Paying Fine 
 @fine_routes_bp.put("/pay_fine/<student_id>")
-@jwt_required()
+@auth_required()
 def pay_fine(student_id):
     role, username = get_current_user()
 
     if role not in ["admin", "staff"]:
         return jsonify({"error": "Only librarians (staff/admin) can process fines"}), 403
 
-    if student_id not in students:
-        return jsonify({"error": "Student not found"}), 404
+    with locks.student(student_id):
+        if student_id not in students:
+            return jsonify({"error": "Student not found"}), 404
 
-    student = students[student_id]
-    total_fine = sum(book.get("fine", 0) for book in student["borrowed_books"])
+        student = students[student_id]
+        total_fine = fine_ledger.balance(student_id)
+
+        if total_fine == 0:
+            return jsonify({"message": "No fine pending"}), 200
+
+        data = request.json
+        amount = data.get("amount")
 
-    if total_fine == 0:
-        return jsonify({"message": "No fine pending"}), 200
+        if not amount or amount <= 0:
+            return jsonify({"error": "Please provide a valid payment amount"}), 400
 
-    data = request.json
-    amount = data.get("amount")
+        if amount > total_fine:
+            return jsonify({"error": f"Payment exceeds pending fine. Pending fine is {total_fine}"}), 400
 
-    if not amount or amount <= 0:
-        return jsonify({"error": "Please provide a valid payment amount"}), 400
+        # Deduct amount from fines
+        new_total_fine = circulation.pay_fine(student_id, amount)
 
-    if amount > total_fine:
-        return jsonify({"error": f"Payment exceeds pending fine. Pending fine is {total_fine}"}), 400
+        return jsonify({
+            "message": f"Payment successful. Paid {amount}.",
+            "student_id": student_id,
+            "student_name": student["student_name"],
+            "paid_amount": amount,
+            "remaining_fine": new_total_fine
+        }), 200
 
-    # Deduct amount from fines
-    remaining = amount
-    for book in student["borrowed_books"]:
-        if book.get("fine", 0) > 0 and remaining > 0:
-            if remaining >= book["fine"]:
-                remaining -= book["fine"]
-                book["fine"] = 0
-            else:
-                book["fine"] -= remaining
-                remaining = 0
+# Recompute Fines (nightly, or after the fine policy changed)
+# Applies fine_policy to every loan and saves only the loans whose fine changed
+@fine_routes_bp.put("/recompute_fines")
+@auth_required()
+def recompute_fines():
+    role, username = get_current_user()
+
+    if role not in ["admin", "staff"]:
+        return jsonify({"error": "Only librarians (staff/admin) can recompute fines"}), 403
 
-    new_total_fine = sum(book.get("fine", 0) for book in student["borrowed_books"])
+    checked, changed = fine_policy.recompute()
 
     return jsonify({
-        "message": f"Payment successful. Paid {amount}.",
-        "student_id": student_id,
-        "student_name": student["student_name"],
-        "paid_amount": amount,
-        "remaining_fine": new_total_fine
+        "requested_by": username,
+        "role": role,
+        "policy": fine_policy.policy,
+        "loans_checked": checked,
+        "fines_changed": [
+            {"student_id": sid, "book_id": record["book_id"], "status": record["status"], "fine": record["fine"]}
+            for sid, record in changed
+        ]
     }), 200
@@ -0,0 +1,153 @@
+from flask import current_app
+from db import books
+import catalog_cache
+
+# Pre-encoded JSON for the large listings (/books, /available_books, /members).
+# Each book and student entry is encoded once with app.json and kept as
+# bytes; a listing joins the bytes instead of encoding a dict per entry.
+# A fragment remembers the values it was encoded from and is re-encoded when
+# they differ. The whole /books array is kept for the current catalog version
+# (catalog_cache, bumped by manage_books and every availability change) and
+# the whole /members array for the current roster of versions.py views
+# (students added, removed or renamed), so an unchanged listing is one join
+# of cached bytes; after a change only the changed entries are encoded again.
+# Output is byte for byte what app.json writes for the same dict.
+
+_provider = None       # app.json the fragments were encoded with
+_books = {}            # book_id -> (book_name, available, /books entry, /available_books entry)
+_students = {}         # student_id -> (student_name, /members entry)
+_books_array = None    # (catalog version, count, bytes)
+_members_array = None  # (view roster, count, bytes)
+
+
+# Bytes already encoded as JSON, placed as-is by body()
+class Raw(bytes):
+    pass
+
+
+def _encoder():
+    global _provider
+    provider = current_app.json
+    if provider is not _provider:
+        clear()
+        _provider = provider
+    return provider.encode
+
+
+# Encode (or re-encode) a book's fragments. Callers check the cached entry
+# inline, reading record attributes directly: listings visit every entry.
+def _book(book_id, info, encode):
+    name, available = info.book_name, info.available
+    entry = _books[book_id] = (
+        name, available,
+        encode({"book_id": book_id, "book_name": name, "available": available}),
+        encode({"book_id": book_id, "book_name": name}),
+    )
+    return entry
+
+
+def _array(parts):
+    return Raw(b"[" + b",".join(parts) + b"]")
+
+
+# (count, array) of /books entries for the given book ids, or the whole catalog
+def book_array(book_ids=None):
+    global _books_array
+    encode = _encoder()
+    if book_ids is None:
+        version = catalog_cache.version()
+        cached = _books_array
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        pairs = list(books.items())
+    else:
+        pairs = [(book_id, books.get(book_id)) for book_id in book_ids]
+    parts = []
+    for book_id, info in pairs:
+        if info is None:
+            continue
+        entry = _books.get(book_id)
+        if entry is None or entry[0] != info.book_name or entry[1] != info.available:
+            entry = _book(book_id, info, encode)
+        parts.append(entry[2])
+    array = _array(parts)
+    if book_ids is None:
+        _books_array = (version, len(parts), array)
+    return len(parts), array
+
+
+# (count, array) of /available_books entries
+def available_array():
+    encode = _encoder()
+    parts = []
+    for book_id, info in list(books.items()):
+        if info.available != "Yes":
+            continue
+        entry = _books.get(book_id)
+        if entry is None or entry[0] != info.book_name or entry[1] != "Yes":
+            entry = _book(book_id, info, encode)
+        parts.append(entry[3])
+    return len(parts), _array(parts)
+
+
+# (count, array) of /members entries from a versions.View, for the given
+# student ids or everyone
+def member_array(view, student_ids=None):
+    global _members_array
+    encode = _encoder()
+    if student_ids is None:
+        cached = _members_array
+        if cached is not None and cached[0] == view.roster:
+            return cached[1], cached[2]
+        pairs = [(row[0], row[1]) for row in view.students]
+    else:
+        names = {sid: row[1] for sid, row in view.rows(student_ids).items()}
+        pairs = [(student_id, names.get(student_id)) for student_id in student_ids]
+    parts = []
+    for student_id, name in pairs:
+        if name is None:
+            continue
+        entry = _students.get(student_id)
+        if entry is None or entry[0] != name:
+            entry = _students[student_id] = (name, encode({"student_id": student_id, "student_name": name}))
+        parts.append(entry[1])
+    array = _array(parts)
+    if student_ids is None:
+        _members_array = (view.roster, len(parts), array)
+    return len(parts), array
+
+
+def drop_book(book_id):
+    _books.pop(book_id, None)
+
+
+# Call after a student was added, removed or renamed
+def student_changed(student_id):
+    _students.pop(student_id, None)
+
+
+# Everything may have changed (restores, rebuilds, another provider)
+def clear():
+    global _books_array, _members_array
+    _books.clear()
+    _students.clear()
+    _books_array = _members_array = None
+
+
+# Response body for obj (a dict whose values may be Raw), with the newline
+# app.json.response() ends with
+def body(obj):
+    provider = current_app.json
+    encode = _encoder()
+    if not isinstance(obj, dict):
+        return provider.response(obj).get_data()
+    if provider.pretty():
+        plain = {key: provider.loads(bytes(value)) if isinstance(value, Raw) else value for key, value in obj.items()}
+        return provider.response(plain).get_data()
+    keys = sorted(obj) if provider.sort_keys else obj
+    members = [encode(key) + b":" + (obj[key] if isinstance(obj[key], Raw) else encode(obj[key])) for key in keys]
+    return b"{" + b",".join(members) + b"}\n"
+
+
+def response(obj, status=200):
+    return current_app.response_class(body(obj), status=status, mimetype=current_app.json.mimetype)
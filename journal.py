@@ -0,0 +1,498 @@
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from flask import g, has_request_context
+from db import students, books, librarians
+from records import Student, Book, Loan
+import loan_index
+import fine_ledger
+import overdue_scheduler
+import search_index
+import catalog_cache
+import snapshot
+import locks
+import rollups
+import occupancy
+import fragments
+import events
+import fine_policy
+import versions
+
+# Append-only operation journal (write-ahead log) for the memory backend.
+# Every change storage.py is told about is also appended here as one JSON
+# line holding the new state of the changed row, e.g.
+#   [42,"loan","S001",3,{"book_id":"B101",...,"status":"Returned"}]
+# (loans are identified by their serial, their position in borrowed_books).
+# Entries are written to the file as they are appended; a flusher thread
+# group-commits the fsyncs: after the first unsynced entry it waits up to
+# commit_delay seconds for more, then fsyncs them together.
+# Requests wait for their entries to be durable before the response goes out
+# (app.py after_request); with commit_delay=None each request fsyncs itself.
+#
+# Files: <path>.000001, <path>.000002, ... are log segments; <path>.checkpoint
+# is a snapshot.py image tagged with the last sequence number it contains.
+# Once the current segment passes compact_bytes a new checkpoint is written
+# and older segments are deleted. Startup restores the checkpoint and replays
+# later entries; a torn last line from a crash is dropped.
+#
+# Shared mode (start(..., shared=True)) lets several worker processes on one
+# host serve the same state. All of them append to the single segment
+# <path>.000001 under an flock, numbering each entry by its byte offset, and
+# each applies the entries the others wrote (catch_up) before serving a
+# request and after taking stripe locks. locks.share() makes the stripe locks
+# cross-process, so a worker holding a student's or book's stripe has seen
+# every earlier change to it. Shared logs are not compacted.
+
+CHECKPOINT_MAGIC = b"LIBJRNL1"
+_SEQ = struct.Struct(">Q")
+
+log = logging.getLogger(__name__)
+
+
+def _segment_path(path, number):
+    return f"{path}.{number:06d}"
+
+
+def _segments(path):
+    directory = os.path.dirname(os.path.abspath(path))
+    prefix = os.path.basename(path) + "."
+    numbers = []
+    for name in os.listdir(directory):
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and suffix.isdigit():
+            numbers.append(int(suffix))
+    return sorted(numbers)
+
+
+class Journal:
+    def __init__(self, path, commit_delay=0.0005, compact_bytes=64 * 2**20, last_seq=0, segment=1,
+                 shared=False, read_offset=0):
+        self.path = path
+        self.commit_delay = commit_delay
+        self.compact_bytes = compact_bytes
+        self.shared = shared
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()   # fsyncs and segment switches; taken after any stripe locks, before _cond
+        self._apply_lock = threading.Lock()   # shared mode: one catch_up at a time
+        self._last_seq = last_seq      # last entry written
+        self._durable_seq = last_seq   # last entry fsynced
+        self._own = set()              # shared mode: our entries catch_up has not passed yet
+        self._read_offset = read_offset
+        self._error = None
+        self._closed = False
+        self._compacting = False
+        self._open_segment(segment)
+        self._flusher = None
+        if commit_delay is not None:
+            self._flusher = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+            self._flusher.start()
+
+    def _open_segment(self, number):
+        self._segment = number
+        self._fd = os.open(_segment_path(self.path, number), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = os.fstat(self._fd).st_size
+
+    # Write an entry, returns its sequence number. Callers hold the locks of
+    # the entities involved, so entries for one entity keep their order.
+    def append(self, op, *args):
+        body = json.dumps([op, *args], separators=(",", ":"))[1:]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("journal is closed")
+            if self.shared:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                try:
+                    seq = os.fstat(self._fd).st_size
+                    data = f"[{seq},{body}\n".encode()
+                    self._own.add(seq)
+                    _write_all(self._fd, data)
+                finally:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                seq = self._last_seq + 1
+                data = f"[{seq},{body}\n".encode()
+                _write_all(self._fd, data)
+            self._last_seq = seq
+            self._size += len(data)
+            self._cond.notify_all()
+        return seq
+
+    # Block until entry seq is on disk
+    def wait(self, seq):
+        if self.commit_delay is None:
+            self.flush()
+        with self._cond:
+            while self._durable_seq < seq:
+                if self._error is not None:
+                    raise OSError("journal write failed") from self._error
+                self._cond.wait()
+
+    def flush(self):
+        with self._io_lock:
+            self._sync()
+        if not self.shared and self._size >= self.compact_bytes:
+            self._start_compaction()
+
+    def _sync(self):
+        with self._cond:
+            upto = self._last_seq
+        try:
+            if upto > self._durable_seq:
+                os.fsync(self._fd)
+        except OSError as exc:
+            with self._cond:
+                self._error = exc
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self._durable_seq = max(self._durable_seq, upto)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._durable_seq >= self._last_seq and not self._closed:
+                    self._cond.wait()
+                if self._closed and self._durable_seq >= self._last_seq:
+                    return
+            # Latency budget: let concurrent requests join this fsync
+            time.sleep(self.commit_delay)
+            try:
+                self.flush()
+            except OSError as exc:
+                # No more fsyncs: every waiter, now or later, gets the error
+                log.exception("journal write to %s failed", self.path)
+                with self._cond:
+                    self._error = self._error or exc
+                    self._cond.notify_all()
+                return
+
+    def _start_compaction(self):
+        with self._cond:
+            if self._compacting:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="journal-compact", daemon=True).start()
+
+    # Write a checkpoint of the current state and drop the segments it covers.
+    # Writers pause only while a snapshot.py writer is forked, not while it
+    # pickles the state and writes it.
+    def compact(self):
+        try:
+            with locks.hold_all():
+                with self._io_lock:
+                    self._sync()
+                    covered_seq = self._durable_seq
+                    covered_segment = self._segment
+                    with self._cond:
+                        os.close(self._fd)
+                        self._open_segment(covered_segment + 1)
+                checkpoint = self.path + ".checkpoint"
+                pid = snapshot.fork_writer(checkpoint, CHECKPOINT_MAGIC + _SEQ.pack(covered_seq))
+            snapshot.wait(pid, checkpoint)
+            for number in _segments(self.path):
+                if number <= covered_segment:
+                    os.remove(_segment_path(self.path, number))
+        finally:
+            with self._cond:
+                self._compacting = False
+
+    # Shared mode: apply the entries other processes wrote since the last call
+    def catch_up(self):
+        if os.fstat(self._fd).st_size == self._read_offset:
+            return
+        with self._apply_lock:
+            size = os.fstat(self._fd).st_size
+            data = os.pread(self._fd, size - self._read_offset, self._read_offset)
+            # A writer may be halfway through its line; it is read next time
+            for line in data[:data.rfind(b"\n") + 1].splitlines(keepends=True):
+                seq, op, *args = json.loads(line)
+                try:
+                    if seq in self._own:
+                        self._own.discard(seq)
+                    else:
+                        _REPLAY[op](*args)
+                finally:
+                    # Only once applied: the unlocked size check above lets
+                    # other threads through as soon as the offsets match
+                    self._read_offset += len(line)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._io_lock:
+            self._sync()
+            os.close(self._fd)
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+# Replay
+# Student rows are logged with borrowed_books=None; loans have their own entries
+def _replay_student(student_id, row):
+    del row["borrowed_books"]
+    info = students.get(student_id)
+    if info is None:
+        students[student_id] = Student(**row)
+        fragments.student_changed(student_id)
+        versions.student_changed(student_id)
+    else:
+        renamed = row.get("student_name", info["student_name"]) != info["student_name"]
+        for key, value in row.items():
+            info[key] = value
+        if renamed:
+            fragments.student_changed(student_id)
+            versions.student_changed(student_id)
+    occupancy.sync(student_id)
+
+
+def _replay_delete_student(student_id):
+    info = students.pop(student_id, None)
+    for record in info.loans() if info is not None else ():
+        loan_index.forget(record)
+        overdue_scheduler.cancel(record)
+    if info is not None:
+        rollups.member_removed(info)
+    fine_ledger.forget_student(student_id)
+    occupancy.forget(student_id)
+    fragments.student_changed(student_id)
+    versions.student_changed(student_id)
+
+
+def _replay_book(book_id, row):
+    books[book_id] = Book(book_id, **row)
+    search_index.add(book_id, row["book_name"], row["available"] == "Yes")
+    catalog_cache.bump(book_id)
+    events.publish("added", book_id, row["available"])
+
+
+def _replay_delete_book(book_id):
+    books.pop(book_id, None)
+    search_index.remove(book_id)
+    catalog_cache.drop(book_id)
+    events.publish("removed", book_id)
+
+
+def _replay_librarian(librarian_id, row):
+    librarians[librarian_id] = dict(row)
+
+
+def _replay_delete_librarian(librarian_id):
+    librarians.pop(librarian_id, None)
+
+
+# paid: the loan's Loan.paid (entries written before loans tracked payments have none)
+def _replay_loan(student_id, serial, fields, paid=None):
+    student = students[student_id]
+    record = student.loan(serial)
+    if record is not None:
+        old_status, old_fine, old_paid = record["status"], record["fine"], fine_policy.paid(record)
+        record.assign(fields, books)
+        record.paid = paid
+        if old_status != "Returned" and record["status"] == "Returned":
+            student.close_loan(record)
+            rollups.loan_returned(record)
+        elif old_status != "Missing" and record["status"] == "Missing":
+            rollups.loan_missing(record)
+        elif old_status == record["status"]:
+            # Fine policy recomputes change fines without a payment
+            rollups.fine_paid(old_fine - record["fine"] if paid is None else paid - old_paid)
+    else:
+        record = Loan.from_dict(fields, books)
+        record.paid = paid
+        old_status = None
+        student.add_loan(record)
+        rollups.loan_issued(record)
+
+    # Availability follows status changes only: a later fine payment on a
+    # returned loan must not free a book someone else has borrowed since
+    book_id = record["book_id"]
+    if record["status"] != old_status and book_id in books:
+        available = record["status"] == "Returned"
+        books[book_id]["available"] = "Yes" if available else "No"
+        search_index.set_available(book_id, available)
+        catalog_cache.bump(book_id)
+        events.publish(_EVENTS[record["status"]], book_id, books[book_id]["available"])
+
+    loan_index.track(student_id, record)
+    fine_ledger.track(student_id, record)
+    if record["status"] == "Borrowed":
+        if old_status != "Borrowed":
+            overdue_scheduler.schedule(student_id, record)
+    else:
+        overdue_scheduler.cancel(record)
+
+
+_EVENTS = {"Borrowed": "borrowed", "Returned": "returned", "Missing": "missing"}
+
+_REPLAY = {
+    "student": _replay_student,
+    "-student": _replay_delete_student,
+    "book": _replay_book,
+    "-book": _replay_delete_book,
+    "librarian": _replay_librarian,
+    "-librarian": _replay_delete_librarian,
+    "loan": _replay_loan,
+}
+
+
+# Apply the entries of one segment file that come after covered_seq.
+# Returns (bytes of whole entries, last sequence number applied, entries applied).
+def _replay_segment(f, covered_seq):
+    good = 0
+    last_seq = covered_seq
+    applied = 0
+    for line in f:
+        if not line.endswith(b"\n"):
+            break
+        try:
+            seq, op, *args = json.loads(line)
+        except ValueError:
+            break
+        good += len(line)
+        if seq <= covered_seq:
+            continue
+        _REPLAY[op](*args)
+        last_seq = seq
+        applied += 1
+    return good, last_seq, applied
+
+
+# Restore the checkpoint (if any) and apply later entries.
+# Returns (last sequence number, number of entries applied, last segment).
+def _recover(path):
+    covered_seq = 0
+    checkpoint = path + ".checkpoint"
+    if os.path.exists(checkpoint):
+        with open(checkpoint, "rb") as f:
+            if f.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+                raise ValueError(f"{checkpoint} is not a journal checkpoint")
+            (covered_seq,) = _SEQ.unpack(f.read(_SEQ.size))
+            snapshot.load(f)
+
+    last_seq = covered_seq
+    applied = 0
+    numbers = _segments(path)
+    for number in numbers:
+        segment = _segment_path(path, number)
+        with open(segment, "rb") as f:
+            good, last_seq, count = _replay_segment(f, last_seq)
+            applied += count
+        if good < os.path.getsize(segment):
+            if number != numbers[-1]:
+                raise ValueError(f"{segment} is corrupt before the end of the journal")
+            os.truncate(segment, good)
+
+    if applied:
+        catalog_cache.clear()
+    return last_seq, applied, numbers[-1] if numbers else 0
+
+
+# Shared mode: apply the whole shared segment. Appenders hold its flock while
+# writing, so under the flock a line without its newline is a crash's torn
+# write and is cut off. Returns (entries applied, bytes applied).
+def _recover_shared(path):
+    with open(_segment_path(path, 1), "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        f.seek(0)
+        good, _, applied = _replay_segment(f, -1)
+        os.ftruncate(f.fileno(), good)
+    if applied:
+        catalog_cache.clear()
+    return applied, good
+
+
+# Module-level journal used by storage.py; None when journaling is off
+_journal = None
+
+
+def start(path, commit_delay=0.0005, compact_bytes=64 * 2**20, shared=False):
+    global _journal
+    if shared:
+        applied, offset = _recover_shared(path)
+        _journal = Journal(path, commit_delay, compact_bytes, last_seq=-1, segment=1,
+                           shared=True, read_offset=offset)
+        return applied
+    last_seq, applied, segment = _recover(path)
+    _journal = Journal(path, commit_delay, compact_bytes, last_seq, segment + 1)
+    return applied
+
+
+# Shared mode: pick up the other workers' changes
+def catch_up():
+    if _journal is not None and _journal.shared:
+        _journal.catch_up()
+
+
+def stop():
+    global _journal
+    if _journal is not None:
+        _journal.close()
+        _journal = None
+
+
+def enabled():
+    return _journal is not None
+
+
+def _record(op, *args):
+    seq = _journal.append(op, *args)
+    if has_request_context():
+        g.journal_seq = seq
+    else:
+        _journal.wait(seq)
+
+
+# Called once a request is done with its locks, before its response is sent
+def wait_for_request():
+    seq = g.pop("journal_seq", None)
+    if seq is not None and _journal is not None:
+        _journal.wait(seq)
+
+
+# Hooks mirroring storage.py; each logs the row's state after the change
+def save_student(student_id):
+    if _journal is not None:
+        row = {key: None if key == "borrowed_books" else value for key, value in students[student_id].items()}
+        _record("student", student_id, row)
+
+
+def delete_student(student_id):
+    if _journal is not None:
+        _record("-student", student_id)
+
+
+def save_book(book_id):
+    if _journal is not None:
+        _record("book", book_id, books[book_id].as_dict())
+
+
+def delete_book(book_id):
+    if _journal is not None:
+        _record("-book", book_id)
+
+
+def save_librarian(librarian_id):
+    if _journal is not None:
+        _record("librarian", librarian_id, librarians[librarian_id])
+
+
+def delete_librarian(librarian_id):
+    if _journal is not None:
+        _record("-librarian", librarian_id)
+
+
+def save_loan(student_id, record):
+    if _journal is not None:
+        _record("loan", student_id, record.serial, record.as_dict(), record.paid)
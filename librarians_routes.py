@@ -1,24 +1,47 @@
 from flask import Blueprint, request, jsonify
 from db import librarians
-from flask_jwt_extended import jwt_required, get_jwt
-from login_routes import get_current_user
+from login_routes import get_current_user, auth_required
+import storage
+import locks
+import pagination
 librarians_routes_bp = Blueprint("librarians_routes_bp", __name__)
 
+
+def _librarian_entry(lid):
+    info = librarians.get(lid)
+    if info is None:
+        return None
+    return {
+        "librarian_id": lid,
+        "librarian_name": info.get("librarian_name"),
+        "role": info.get("role", "staff")
+    }
+
+
 @librarians_routes_bp.route("/librarians", methods=["GET", "POST", "DELETE"])
-@jwt_required()
+@auth_required()
 def manage_librarians():
     role, username = get_current_user()
 
     # List all librarians 
     if request.method == "GET":
-        result = [
-            {
-                "librarian_id": lid,
-                "librarian_name": info.get("librarian_name"),
-                "role": info.get("role", "staff")
-            }
-            for lid, info in librarians.items()
-        ]
+        if pagination.requested():
+            error = pagination.invalid()
+            if error:
+                return jsonify({"error": error}), 400
+
+            page, next_cursor = pagination.page(librarians.keys())
+            if pagination.wants_ndjson():
+                return pagination.ndjson(page, _librarian_entry, next_cursor)
+
+            return jsonify({
+                "requested_by": username,
+                "role": role,
+                "librarians": [entry for entry in map(_librarian_entry, page) if entry],
+                "next_cursor": next_cursor
+            }), 200
+
+        result = [_librarian_entry(lid) for lid in librarians]
         return jsonify({
             "requested_by": username,
             "role": role,
@@ -37,13 +60,15 @@ def manage_librarians():
         if not librarian_id or not librarian_name:
             return jsonify({"error": "librarian_id and librarian_name are required"}), 400
 
-        if librarian_id in librarians:
-            return jsonify({"error": "Librarian ID already exists"}), 400
+        with locks.librarian(librarian_id):
+            if librarian_id in librarians:
+                return jsonify({"error": "Librarian ID already exists"}), 400
 
-        librarians[librarian_id] = {
-            "librarian_name": librarian_name,
-            "role": "staff"  # default role
-        }
+            librarians[librarian_id] = {
+                "librarian_name": librarian_name,
+                "role": "staff"  # default role
+            }
+            storage.save_librarian(librarian_id)
         return jsonify({
             "message": f"Librarian {librarian_name} added successfully",
             "requested_by": username,
@@ -61,10 +86,12 @@ def manage_librarians():
         if not librarian_id:
             return jsonify({"error": "librarian_id is required"}), 400
 
-        if librarian_id not in librarians:
-            return jsonify({"error": "Librarian not found"}), 404
+        with locks.librarian(librarian_id):
+            if librarian_id not in librarians:
+                return jsonify({"error": "Librarian not found"}), 404
 
-        removed = librarians.pop(librarian_id)
+            removed = librarians.pop(librarian_id)
+            storage.delete_librarian(librarian_id)
         return jsonify({
             "message": f"Librarian {removed['librarian_name']} removed successfully",
             "requested_by": username
@@ -0,0 +1,128 @@
+import threading
+from operator import attrgetter
+from db import students
+from records import Status
+
+try:
+    import numpy
+except ImportError:   # optional: fine_policy.py checks loans one by one without it
+    numpy = None
+
+# Every loan as numpy columns, one row per loan, for fine_policy.recompute:
+#   codes     policy code (BORROWED, MISSING, RETURNED, RETURNED_MISSING)
+#   due       due date ordinal
+#   fines     current fine
+#   payments  Loan.paid, -1 where not known
+# plus the record and its student per row. The columns are built from
+# students on first use and then kept up to date by loan_index.track (every
+# change to a loan's status, fine or payments goes through it); a loan_index
+# rebuild or import drops them until they are next needed. Rows of forgotten
+# loans stay, coded RETURNED with no record, so the arrays only grow.
+
+BORROWED, MISSING, RETURNED, RETURNED_MISSING = range(4)
+_CODES = {Status.BORROWED: BORROWED, Status.MISSING: MISSING, Status.RETURNED: RETURNED}
+
+_lock = threading.Lock()
+_built = False
+_rows = {}        # id(record) -> row
+_records = []     # row -> record, None once forgotten
+_owners = []      # row -> student_id
+_codes = _due = _fines = _payments = None
+
+
+def code(record):
+    return _CODES[record.state] + record.went_missing
+
+
+def _set(row, record):
+    _codes[row] = code(record)
+    _due[row] = record.due_on
+    _fines[row] = record.fine
+    _payments[row] = -1 if record.paid is None else record.paid
+
+
+def _grow(size):
+    global _codes, _due, _fines, _payments
+    capacity = max(size, 2 * len(_codes))
+    _codes, _due, _fines, _payments = (
+        numpy.concatenate([column, numpy.zeros(capacity - len(column), column.dtype)])
+        for column in (_codes, _due, _fines, _payments)
+    )
+
+
+# Call after a loan is created or its status, fine or payments changed
+def track(student_id, record):
+    if not _built:
+        return
+    with _lock:
+        row = _rows.get(id(record))
+        if row is None:
+            row = _rows[id(record)] = len(_records)
+            if row >= len(_codes):
+                _grow(row + 1)
+            _records.append(record)
+            _owners.append(student_id)
+        else:
+            _owners[row] = student_id
+        _set(row, record)
+
+
+def forget(record):
+    if not _built:
+        return
+    with _lock:
+        row = _rows.pop(id(record), None)
+        if row is not None:
+            _records[row] = None
+            _codes[row] = RETURNED
+
+
+def _reset():
+    global _built, _codes, _due, _fines, _payments
+    _built = False
+    _rows.clear()
+    _records.clear()
+    _owners.clear()
+    _codes = _due = _fines = _payments = None
+
+
+def clear():
+    with _lock:
+        _reset()
+
+
+# Statuses are compared by identity on an object array: hashing an enum
+# member runs Python code. _built is set first, so loans changed while the
+# columns are built wait for the lock and are tracked on top.
+def _build():
+    global _built, _codes, _due, _fines, _payments
+    _built = True
+    try:
+        for sid, info in list(students.items()):
+            count = len(_records)
+            _records.extend(info.history)
+            _records.extend(info.active.values())
+            _owners.extend([sid] * (len(_records) - count))
+        count = len(_records)
+        states = numpy.fromiter(map(attrgetter("state"), _records), object, count)
+        went_missing = numpy.fromiter(map(attrgetter("went_missing"), _records), numpy.int8, count)
+        _codes = numpy.where(states == Status.BORROWED, BORROWED,
+                             numpy.where(states == Status.MISSING, MISSING, RETURNED + went_missing)).astype(numpy.int8)
+        _due = numpy.fromiter(map(attrgetter("due_on"), _records), numpy.int64, count)
+        _fines = numpy.fromiter(map(attrgetter("fine"), _records), numpy.int64, count)
+        _payments = numpy.fromiter((-1 if paid is None else paid for paid in map(attrgetter("paid"), _records)),
+                                   numpy.int64, count)
+        _rows.update((id(record), row) for row, record in enumerate(_records))
+    except BaseException:
+        _reset()
+        raise
+
+
+# (records, owners, codes, due, fines, payments), copies taken under the lock
+def columns():
+    with _lock:
+        if not _built:
+            _build()
+        count = len(_records)
+        return (list(_records), list(_owners), _codes[:count].copy(), _due[:count].copy(),
+                _fines[:count].copy(), _payments[:count].copy())
@@ -0,0 +1,123 @@
+from db import students
+import loan_columns
+import versions
+
+# Loan index: loan records grouped by status, so listings only touch the
+# loans they return instead of every student's loans.
+#   Borrowed -> every Borrowed loan
+#   Missing  -> every Missing loan
+#   Returned -> only Returned loans that still carry a fine
+# Entries point at the same record dicts stored in students, keyed by id(record).
+
+STATUSES = ("Borrowed", "Missing", "Returned")
+
+_by_status = {status: {} for status in STATUSES}
+_filed_under = {}   # id(record) -> status bucket it currently sits in
+
+
+def _bucket_for(record):
+    status = record.status
+    if status == "Returned" and record.fine <= 0:
+        return None
+    if status not in _by_status:
+        return None
+    return status
+
+
+# Call after a loan record is created or its status/fine changed
+def track(student_id, record):
+    key = id(record)
+    old = _filed_under.pop(key, None)
+    if old is not None:
+        _by_status[old].pop(key, None)
+
+    new = _bucket_for(record)
+    if new is not None:
+        _by_status[new][key] = (student_id, record)
+        _filed_under[key] = new
+    loan_columns.track(student_id, record)
+    versions.track(student_id, record)
+
+
+def forget(record):
+    old = _filed_under.pop(id(record), None)
+    if old is not None:
+        _by_status[old].pop(id(record), None)
+    loan_columns.forget(record)
+    versions.forget(record)
+
+
+# (student_id, record) pairs for one status
+def loans(status):
+    return list(_by_status[status].values())
+
+
+def count(status):
+    return len(_by_status[status])
+
+
+# (student_id, record) pairs with a pending fine (Missing, Returned, or
+# Borrowed loans charged daily fines by fine_policy.py)
+def loans_with_fines():
+    return [
+        (sid, record)
+        for status in ("Missing", "Returned", "Borrowed")
+        for sid, record in _by_status[status].values()
+        if record.get("fine", 0) > 0
+    ]
+
+
+def _expected():
+    expected = {status: {} for status in STATUSES}
+    for sid, info in students.items():
+        for record in info.loans():
+            bucket = _bucket_for(record)
+            if bucket is not None:
+                expected[bucket][id(record)] = (sid, record)
+    return expected
+
+
+def rebuild():
+    loan_columns.clear()
+    _filed_under.clear()
+    for status, entries in _expected().items():
+        _by_status[status].clear()
+        _by_status[status].update(entries)
+        for key in entries:
+            _filed_under[key] = status
+
+
+# Index contents for snapshot.py; records are the same objects as in students
+def export_state():
+    return {status: list(entries.values()) for status, entries in _by_status.items()}
+
+
+def import_state(state):
+    loan_columns.clear()
+    _filed_under.clear()
+    for status in STATUSES:
+        _by_status[status].clear()
+        for sid, record in state.get(status, []):
+            _by_status[status][id(record)] = (sid, record)
+            _filed_under[id(record)] = status
+
+
+# Rebuild the index from students and diff it against the live one.
+# Returns a list of problems; an empty list means the index is consistent.
+def check_consistency():
+    problems = []
+    expected = _expected()
+    for status in STATUSES:
+        live = _by_status[status]
+        for key, (sid, record) in expected[status].items():
+            if key not in live:
+                problems.append(f"{status}: missing {sid}/{record['book_id']}")
+            elif live[key][0] != sid:
+                problems.append(f"{status}: {record['book_id']} filed under {live[key][0]}, expected {sid}")
+        for key, (sid, record) in live.items():
+            if key not in expected[status]:
+                problems.append(f"{status}: unexpected {sid}/{record['book_id']}")
+    return problems
+
+
+rebuild()
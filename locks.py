@@ -0,0 +1,107 @@
+import errno
+import fcntl
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+# Striped locks for the db structures.
+# Writers lock the students, books and librarians they change; each ID maps
+# onto one of STRIPES locks per kind. Every caller takes its stripes in one
+# global order (student stripes first, then book stripes, then librarian
+# stripes, each ascending), so operations touching several entities cannot
+# deadlock. Readers take no locks: single dict lookups are atomic, and
+# listings may see a change that is in progress.
+#
+# After share(path), each stripe is also a one-byte fcntl lock in that file,
+# so the stripes exclude writers in every worker process on the host.
+# IDs map to stripes with crc32, which (unlike hash()) agrees between processes.
+
+STRIPES = 64
+
+_student_stripes = [threading.Lock() for _ in range(STRIPES)]
+_book_stripes = [threading.Lock() for _ in range(STRIPES)]
+_librarian_stripes = [threading.Lock() for _ in range(STRIPES)]
+_stripes = _student_stripes + _book_stripes + _librarian_stripes
+
+_shared_fd = None     # the lock file, once share() was called
+_on_acquire = None    # called with the stripes held, e.g. journal.catch_up
+
+
+def _stripe(key):
+    return zlib.crc32(str(key).encode()) % STRIPES
+
+
+def _ordered(student_ids, book_ids, librarian_ids=()):
+    return (
+        sorted({_stripe(sid) for sid in student_ids})
+        + sorted({STRIPES + _stripe(bid) for bid in book_ids})
+        + sorted({2 * STRIPES + _stripe(lid) for lid in librarian_ids})
+    )
+
+
+# Cross-process part of stripe n. The kernel tracks fcntl locks per process,
+# so it can report a deadlock that the threads of two processes cannot
+# actually reach in our ordering; back off and retry then.
+def _lock_shared(n):
+    while True:
+        try:
+            fcntl.lockf(_shared_fd, fcntl.LOCK_EX, 1, n)
+            return
+        except OSError as exc:
+            if exc.errno != errno.EDEADLK:
+                raise
+            time.sleep(0.0001)
+
+
+@contextmanager
+def _holding(ordered):
+    acquired = []
+    try:
+        for n in ordered:
+            _stripes[n].acquire()
+            acquired.append(n)
+            if _shared_fd is not None:
+                _lock_shared(n)
+        if _on_acquire is not None:
+            _on_acquire()
+        yield
+    finally:
+        for n in reversed(acquired):
+            if _shared_fd is not None:
+                fcntl.lockf(_shared_fd, fcntl.LOCK_UN, 1, n)
+            _stripes[n].release()
+
+
+# Make the stripes cross-process through the lock file at path. on_acquire
+# runs each time a set of stripes has been taken.
+def share(path, on_acquire=None):
+    global _shared_fd, _on_acquire
+    _shared_fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    _on_acquire = on_acquire
+
+
+def hold(student_ids=(), book_ids=(), librarian_ids=()):
+    return _holding(_ordered(student_ids, book_ids, librarian_ids))
+
+
+# Every stripe, for operations that need the whole state to hold still
+def hold_all():
+    return _holding(range(len(_stripes)))
+
+
+def student(student_id):
+    return hold(student_ids=(student_id,))
+
+
+def book(book_id):
+    return hold(book_ids=(book_id,))
+
+
+def librarian(librarian_id):
+    return hold(librarian_ids=(librarian_id,))
+
+
+def loan(student_id, book_id):
+    return hold(student_ids=(student_id,), book_ids=(book_id,))
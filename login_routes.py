@@ -1,6 +1,9 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt
+from functools import wraps
+from flask import Blueprint, request, jsonify, g, current_app
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, verify_jwt_in_request
 from db import students, users
+import auth_cache
+import ratelimit
 
 login_bp = Blueprint("login_bp",__name__)
 
@@ -28,6 +31,56 @@ def login():
 
     return jsonify({"msg": "User not found"}), 404
  
-def get_current_user(): # Extract role and username from JWT
+# Drop-in for jwt_required() that can skip re-verifying tokens already seen.
+# With the token cache enabled (AUTH_TOKEN_CACHE_SIZE > 0) a token verified
+# once is trusted until its exp; otherwise every request is fully verified.
+def auth_required(optional=False):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            if request.method != "OPTIONS":
+                _authenticate(optional)
+                limited = ratelimit.check_subject(g.current_user[1])
+                if limited is not None:
+                    return limited
+            return current_app.ensure_sync(fn)(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
+def _bearer_token():
+    parts = request.headers.get("Authorization", "").split()
+    if len(parts) == 2 and parts[0] == "Bearer":
+        return parts[1]
+    return None
+
+
+def _authenticate(optional):
+    token = _bearer_token() if auth_cache.enabled() else None
+    if token:
+        token_digest = auth_cache.digest(token)
+        cached = auth_cache.lookup(token_digest)
+        if cached:
+            g.current_user = cached
+            return
+
+    verify_jwt_in_request(optional=optional)
+    jwt_body = get_jwt()
+    g.current_user = (jwt_body.get("role"), jwt_body.get("sub"))
+    if token and jwt_body:
+        auth_cache.store(token_digest, jwt_body)
+
+
+# Admin-only routes: the 403 to return unless the token is an admin's, else None
+def admin_denied():
+    role, _ = get_current_user()
+    if role != "admin":
+        return jsonify({"error": "Admin privilege required"}), 403
+    return None
+
+
+def get_current_user(): # Role and username of the request's token
+    if "current_user" in g:
+        return g.current_user
     jwt_body = get_jwt()
     return jwt_body.get("role"), jwt_body.get("sub")
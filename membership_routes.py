@@ -1,26 +1,56 @@
 from flask import request, jsonify, Blueprint
 from db import students
-from flask_jwt_extended import jwt_required, get_jwt
+from records import Student
+from login_routes import get_current_user, auth_required
+import storage
+import fine_ledger
+import occupancy
+import locks
+import pagination
+import fragments
+import versions
+import rollups
 
 membership_routes_bp = Blueprint("membership_routes_bp", __name__)
 
+
+def _member_entry(sid, names):
+    name = names.get(sid)
+    if name is None:
+        return None
+    return {"student_id": sid, "student_name": name}
+
+
 @membership_routes_bp.route("/members", methods=["GET", "POST", "DELETE"])
-@jwt_required()
+@auth_required()
 def members():
-    jwt_body = get_jwt()
-    current_user = jwt_body.get("sub")   # usually username or student_id
-    role = jwt_body.get("role")          # custom role claim if you add it when logging in
+    role, current_user = get_current_user()   # role claim and username or student_id
 
-    # List Members 
+    # List Members (from one versions.py view: never waits on writers)
     if request.method == "GET":
-        members_list = [
-            {"student_id": sid, "student_name": info["student_name"]}
-            for sid, info in students.items()
-        ]
-        return jsonify({
-            "total_members": len(members_list),
+        view = versions.current()
+        if pagination.requested():
+            error = pagination.invalid()
+            if error:
+                return jsonify({"error": error}), 400
+
+            page, next_cursor = pagination.page(view.student_ids())
+            if pagination.wants_ndjson():
+                names = {sid: row[1] for sid, row in view.rows(page).items()}
+                return pagination.ndjson(page, lambda sid: _member_entry(sid, names), next_cursor)
+
+            _, members_list = fragments.member_array(view, page)
+            return fragments.response({
+                "total_members": len(view.students),
+                "members": members_list,
+                "next_cursor": next_cursor
+            })
+
+        total, members_list = fragments.member_array(view)
+        return fragments.response({
+            "total_members": total,
             "members": members_list
-        }), 200
+        })
 
     #  Register Student (Admin only) 
     elif request.method == "POST":
@@ -35,15 +65,19 @@ def members():
         if not student_id or not student_name or not password:
             return jsonify({"error": "student_id, student_name, and password are required"}), 400
 
-        if student_id in students:
-            return jsonify({"error": "Student ID already exists"}), 400
+        with locks.student(student_id):
+            if student_id in students:
+                return jsonify({"error": "Student ID already exists"}), 400
 
-        students[student_id] = {
-            "student_name": student_name,
-            "borrowed_books": [],
-            "fine": 0,
-            "password": password
-        }
+            students[student_id] = Student(
+                student_name=student_name,
+                borrowed_books=[],
+                fine=0,
+                password=password
+            )
+            fragments.student_changed(student_id)
+            versions.student_changed(student_id)
+            storage.save_student(student_id)
 
         return jsonify({
             "message": f"Student {student_name} registered successfully",
@@ -64,63 +98,70 @@ def members():
 
         if not student_id:
             return jsonify({"error": "student_id is required"}), 400
-        if student_id not in students:
-            return jsonify({"error": "Student not found"}), 404
+        with locks.student(student_id):
+            if student_id not in students:
+                return jsonify({"error": "Student not found"}), 404
+
+            student = students[student_id]
+            total_fine = fine_ledger.balance(student_id)
+
+            # Admin removing student 
+            if role == "admin":
+                if total_fine > 0:
+                    return jsonify({
+                        "message": f"Admin cannot remove student {student_id} because pending fine is {total_fine}",
+                        "fine": total_fine
+                    }), 400
+
+                # NEW CHECK: ensure no active borrowed books
+                active_books = list(student.active.values())
+                if active_books:
+                    return jsonify({
+                        "message": f"Admin cannot remove student {student_id} because they still have books not returned.",
+                        "active_books": active_books
+                    }), 400
+
+                students.pop(student_id)
+                rollups.member_removed(student)
+                fine_ledger.forget_student(student_id)
+                occupancy.forget(student_id)
+                fragments.student_changed(student_id)
+                versions.student_changed(student_id)
+                storage.delete_student(student_id)
+                return jsonify({
+                    "message": f"Student {student_id} membership declined by admin (no pending fine and no active books)",
+                    "fine": 0
+                })
+
+            # Student self-removal 
+            if current_user != student_id:
+                return jsonify({"error": "You can only remove your own account"}), 403
 
-        student = students[student_id]
-        total_fine = sum(book.get("fine", 0) for book in student["borrowed_books"])
+            if not password or password != student.get("password"):
+                return jsonify({"error": "Password incorrect"}), 403
 
-        # Admin removing student 
-        if role == "admin":
-            if total_fine > 0:
+            if total_fine > 0:   #  student can only remove if fine == 0
                 return jsonify({
-                    "message": f"Admin cannot remove student {student_id} because pending fine is {total_fine}",
+                    "message": f"Cannot remove student {student_id}. Pending fine: {total_fine}. Please contact admin.",
                     "fine": total_fine
                 }), 400
 
             # NEW CHECK: ensure no active borrowed books
-            active_books = [
-                book for book in student["borrowed_books"]
-                if book.get("status") in ["Borrowed", "Missing"]
-            ]
+            active_books = list(student.active.values())
             if active_books:
                 return jsonify({
-                    "message": f"Admin cannot remove student {student_id} because they still have books not returned.",
+                    "message": f"Cannot remove student {student_id}. You still have books that must be returned.",
                     "active_books": active_books
                 }), 400
 
             students.pop(student_id)
+            rollups.member_removed(student)
+            fine_ledger.forget_student(student_id)
+            occupancy.forget(student_id)
+            fragments.student_changed(student_id)
+            versions.student_changed(student_id)
+            storage.delete_student(student_id)
             return jsonify({
-                "message": f"Student {student_id} membership declined by admin (no pending fine and no active books)",
+                "message": f"Student {student_id} membership declined successfully (no pending fine and no active books)",
                 "fine": 0
             })
-
-        # Student self-removal 
-        if current_user != student_id:
-            return jsonify({"error": "You can only remove your own account"}), 403
-
-        if not password or password != student.get("password"):
-            return jsonify({"error": "Password incorrect"}), 403
-
-        if total_fine > 0:   #  student can only remove if fine == 0
-            return jsonify({
-                "message": f"Cannot remove student {student_id}. Pending fine: {total_fine}. Please contact admin.",
-                "fine": total_fine
-            }), 400
-
-        # NEW CHECK: ensure no active borrowed books
-        active_books = [
-            book for book in student["borrowed_books"]
-            if book.get("status") in ["Borrowed", "Missing"]
-        ]
-        if active_books:
-            return jsonify({
-                "message": f"Cannot remove student {student_id}. You still have books that must be returned.",
-                "active_books": active_books
-            }), 400
-
-        students.pop(student_id)
-        return jsonify({
-            "message": f"Student {student_id} membership declined successfully (no pending fine and no active books)",
-            "fine": 0
-        })
@@ -0,0 +1,142 @@
+import bisect
+import itertools
+import threading
+import time
+from flask import request
+
+# Request metrics, rendered in the Prometheus text format for /metrics.
+#   library_request_duration_seconds  histogram per blueprint, route, method and status
+#   library_*_total                   counters bumped by circulation.py (COUNTERS)
+#   gauges                            passed in at scrape time (metrics_routes.py)
+# Recording is lock-cheap: each thread writes to one of SHARDS shards, each
+# with its own lock, so concurrent requests almost never wait on each other;
+# a scrape merges the shards. benchmarks/bench_metrics.py measures the cost:
+# about 1.2 us for a bare observe() with 1 or 8 threads, and 3.5-4 us for
+# the two request hooks together (12-13 us before the label cache below),
+# i.e. ~1% of a ~300 us request. Its whole-request on/off comparison is
+# noisier than that on one CPU (+1 us to +15 us across runs of 100000
+# requests, occasionally far more), so the hooks line is the figure to use.
+# Numbers are per process; in shared-state mode (serve.py) each worker
+# reports its own.
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SHARDS = 16
+
+COUNTERS = {
+    "library_borrows_total": "Books issued to students.",
+    "library_returns_total": "Books returned.",
+    "library_missing_marks_total": "Loans marked missing, by staff or the overdue sweeper.",
+    "library_fine_payments_total": "Fine payments received.",
+    "library_fines_paid_total": "Amount of fines paid.",
+    "library_fines_recomputed_total": "Loans whose fine a fine policy recompute changed.",
+    "library_rate_limited_requests_total": "Requests refused with 429 by a per-client rate limit.",
+    "library_shed_requests_total": "Requests refused with 429 while the server was saturated.",
+}
+
+_enabled = True
+_shards = [(threading.Lock(), {}, {}) for _ in range(SHARDS)]   # (lock, histograms, counters)
+_next_shard = itertools.count()
+_local = threading.local()      # .shard, and .start of the request being timed
+_labels = {}                    # id(url_rule) -> (blueprint, route) labels
+
+
+def configure(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def enabled():
+    return _enabled
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        _local.shard = _shards[next(_next_shard) % SHARDS]
+        return _local.shard
+
+
+# Histogram entries are [count per bucket..., count above the last bucket, sum]
+def observe(key, seconds):
+    lock, histograms, _ = _shard()
+    with lock:
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        entry[bisect.bisect_left(BUCKETS, seconds)] += 1
+        entry[-1] += seconds
+
+
+def inc(name, amount=1):
+    if not _enabled:
+        return
+    lock, _, counters = _shard()
+    with lock:
+        counters[name] = counters.get(name, 0) + amount
+
+
+# app.py hooks. The start time sits in a thread-local and the request is
+# looked up once: each access through Flask's g/request proxies costs about
+# as much as the rest of the recording.
+def start_request():
+    _local.start = time.perf_counter() if _enabled else None
+
+
+def finish_request(status):
+    start = getattr(_local, "start", None)
+    if start is None:
+        return
+    _local.start = None
+    current = request._get_current_object()
+    rule = current.url_rule
+    labels = _labels.get(id(rule))
+    if labels is None:
+        labels = _labels[id(rule)] = (current.blueprint or "", rule.rule if rule is not None else "unmatched")
+    observe((*labels, current.method, status), time.perf_counter() - start)
+
+
+def _merged():
+    histograms = {}
+    counters = dict.fromkeys(COUNTERS, 0)
+    for lock, shard_histograms, shard_counters in _shards:
+        with lock:
+            for key, entry in shard_histograms.items():
+                total = histograms.get(key)
+                histograms[key] = entry[:] if total is None else [a + b for a, b in zip(total, entry)]
+            for name, value in shard_counters.items():
+                counters[name] = counters.get(name, 0) + value
+    return histograms, counters
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Prometheus text exposition; gauges is a list of (name, help, value)
+def render(gauges=()):
+    histograms, counters = _merged()
+    lines = [
+        "# HELP library_request_duration_seconds Request latency by blueprint, route, method and status.",
+        "# TYPE library_request_duration_seconds histogram",
+    ]
+    bounds = [repr(bound) for bound in BUCKETS] + ["+Inf"]
+    for (blueprint, route, method, status), entry in sorted(histograms.items()):
+        labels = f'blueprint="{_label(blueprint)}",route="{_label(route)}",method="{method}",status="{status}"'
+        cumulative = 0
+        for bound, count in zip(bounds, entry):
+            cumulative += count
+            lines.append(f'library_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"library_request_duration_seconds_sum{{{labels}}} {entry[-1]:.6f}")
+        lines.append(f"library_request_duration_seconds_count{{{labels}}} {cumulative}")
+
+    for name, value in counters.items():
+        lines.append(f"# HELP {name} {COUNTERS.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+
+    for name, help_text, value in gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,29 @@
+from flask import Blueprint, Response
+from db import students, books, librarians
+import loan_index
+import overdue_scheduler
+import metrics
+import ratelimit
+import events
+
+metrics_routes_bp = Blueprint("metrics_routes_bp", __name__)
+
+
+def _gauges():
+    return [
+        ("library_students", "Registered students.", len(students)),
+        ("library_books", "Books in the catalog.", len(books)),
+        ("library_librarians", "Librarians.", len(librarians)),
+        ("library_loans_borrowed", "Loans currently Borrowed.", loan_index.count("Borrowed")),
+        ("library_loans_missing", "Loans currently Missing.", loan_index.count("Missing")),
+        ("library_loans_returned_with_fine", "Returned loans that still carry a fine.", loan_index.count("Returned")),
+        ("library_overdue_scheduled", "Borrowed loans waiting in the overdue scheduler.", overdue_scheduler.pending()),
+        ("library_requests_in_flight", "Requests being handled, the load shedding measure.", ratelimit.in_flight()),
+        ("library_event_subscribers", "Open /events streams and waiting polls.", events.subscribers()),
+    ]
+
+
+# Prometheus scrape endpoint (no token, like the public catalog routes)
+@metrics_routes_bp.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(_gauges()), mimetype="text/plain; version=0.0.4")
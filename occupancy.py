@@ -0,0 +1,180 @@
+import bisect
+import threading
+from datetime import datetime, timedelta
+from db import students
+
+# Who is in the library, kept as students enter and leave (POST/PUT /student)
+# instead of found by scanning every student's in_time/out_time.
+#   inside    student_id -> in_time, everyone currently inside
+#   visited   students that have an in_time at all (the GET /student listing)
+#   log       entry (+1) and exit (-1) events in hour buckets; each bucket
+#             keeps the headcount at its start and its own peak, so
+#             headcount_at(T) reads one bucket and a day's peak reads <= 24
+# Events are timestamped with the in_time/out_time written on the student, so
+# journal replay and startup rebuilds place them where they happened. Student
+# records keep only the last entry and exit, so a rebuild can recover no more
+# history than that; snapshots carry the whole log.
+
+BUCKET_SECONDS = 3600
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_lock = threading.Lock()
+_inside = {}
+_visited = {}          # dict as an insertion-ordered set
+_buckets = {}          # bucket number -> [headcount at start, peak, headcount at end, [(ts, delta, student_id), ...]]
+_keys = []             # bucket numbers, ascending
+
+
+def _timestamp(text):
+    return datetime.strptime(text, TIME_FORMAT).timestamp()
+
+
+def _log(ts, student_id, delta):
+    key = int(ts // BUCKET_SECONDS)
+    position = bisect.bisect_left(_keys, key)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        start = _buckets[_keys[position - 1]][2] if position else 0
+        bucket = _buckets[key] = [start, start, start, []]
+        _keys.insert(position, key)
+
+    events = bucket[3]
+    bucket[2] += delta
+    if not events or ts >= events[-1][0]:
+        events.append((ts, delta, student_id))
+        bucket[1] = max(bucket[1], bucket[2])
+    else:
+        # Late event (e.g. replayed from another worker): re-scan this bucket
+        bisect.insort(events, (ts, delta, student_id))
+        bucket[1] = _peak(bucket)
+    for later in _keys[position + 1:]:
+        for field in range(3):
+            _buckets[later][field] += delta
+
+
+def _peak(bucket):
+    count = peak = bucket[0]
+    for _, delta, _ in bucket[3]:
+        count += delta
+        peak = max(peak, count)
+    return peak
+
+
+# Bring the tracker in line with the student's record after an entry or exit
+def sync(student_id):
+    info = students.get(student_id)
+    in_time = info.get("in_time") if info is not None else None
+    out_time = info.get("out_time") if info is not None else None
+    inside_now = bool(in_time) and not out_time
+    with _lock:
+        if in_time:
+            _visited[student_id] = None
+        was_inside = student_id in _inside
+        if inside_now:
+            _inside[student_id] = in_time
+            if not was_inside:
+                _log(_timestamp(in_time), student_id, +1)
+        elif was_inside:
+            del _inside[student_id]
+            _log(_timestamp(out_time) if out_time else datetime.now().timestamp(), student_id, -1)
+
+
+# The student was removed; anyone still inside leaves now
+def forget(student_id):
+    with _lock:
+        _visited.pop(student_id, None)
+        if _inside.pop(student_id, None) is not None:
+            _log(datetime.now().timestamp(), student_id, -1)
+
+
+def is_inside(student_id):
+    return student_id in _inside
+
+
+def inside():
+    return dict(_inside)
+
+
+def visited():
+    return list(_visited)
+
+
+def headcount():
+    return len(_inside)
+
+
+def headcount_at(when):
+    ts = when.timestamp()
+    with _lock:
+        position = bisect.bisect_right(_keys, int(ts // BUCKET_SECONDS)) - 1
+        if position < 0:
+            return 0
+        bucket = _buckets[_keys[position]]
+        count = bucket[0]
+        for event_ts, delta, _ in bucket[3]:
+            if event_ts > ts:
+                break
+            count += delta
+        return count
+
+
+# Highest headcount during each day in [first, last] (dates)
+def daily_peaks(first, last):
+    peaks = {}
+    day = first
+    while day <= last:
+        start = datetime.combine(day, datetime.min.time())
+        first_key = int(start.timestamp() // BUCKET_SECONDS)
+        last_key = int((start + timedelta(days=1)).timestamp() // BUCKET_SECONDS) - 1
+        carried = headcount_at(start)
+        with _lock:
+            lo, hi = bisect.bisect_left(_keys, first_key), bisect.bisect_right(_keys, last_key)
+            peaks[day] = max([carried] + [_buckets[key][1] for key in _keys[lo:hi]])
+        day += timedelta(days=1)
+    return peaks
+
+
+def rebuild():
+    events = []
+    for sid, info in students.items():
+        if info.get("in_time"):
+            events.append((_timestamp(info["in_time"]), +1, sid))
+            if info.get("out_time"):
+                events.append((_timestamp(info["out_time"]), -1, sid))
+    events.sort()
+    with _lock:
+        _inside.clear()
+        _visited.clear()
+        _buckets.clear()
+        _keys.clear()
+        for ts, delta, sid in events:
+            _log(ts, sid, delta)
+        for sid, info in students.items():
+            if info.get("in_time"):
+                _visited[sid] = None
+                if not info.get("out_time"):
+                    _inside[sid] = info["in_time"]
+
+
+# Tracker contents for snapshot.py
+def export_state():
+    with _lock:
+        return {
+            "inside": dict(_inside),
+            "visited": list(_visited),
+            "buckets": {key: [start, peak, end, list(events)] for key, (start, peak, end, events) in _buckets.items()},
+        }
+
+
+def import_state(state):
+    with _lock:
+        _inside.clear()
+        _inside.update(state["inside"])
+        _visited.clear()
+        _visited.update(dict.fromkeys(state["visited"]))
+        _buckets.clear()
+        _buckets.update(state["buckets"])
+        _keys[:] = sorted(_buckets)
+
+
+rebuild()
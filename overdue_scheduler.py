@@ -0,0 +1,126 @@
+import heapq
+import threading
+from datetime import date
+import loan_index
+from records import Status
+
+# Due-date scheduler: a min-heap of Borrowed loans keyed on the day they
+# become overdue, so finding expired loans only pops what has expired.
+# Returned/missing loans are cancelled lazily: their heap entry stays until
+# popped (or until a compaction), but is no longer in _live.
+
+OVERDUE_DAYS = 15   # a loan is overdue once it has been out more than this
+
+_heap = []          # [expires_on (date ordinal), seq, student_id, record]
+_live = {}          # id(record) -> its heap entry
+_seq = 0
+_lock = threading.Lock()
+
+
+def _expires_on(record):
+    return record.issued_on + OVERDUE_DAYS + 1
+
+
+def schedule(student_id, record):
+    global _seq
+    expires_on = _expires_on(record)
+    with _lock:
+        _seq += 1
+        entry = [expires_on, _seq, student_id, record]
+        _live[id(record)] = entry
+        heapq.heappush(_heap, entry)
+
+
+def cancel(record):
+    with _lock:
+        _live.pop(id(record), None)
+        # Drop stale entries once they outnumber live ones
+        if len(_heap) > 64 and len(_heap) > 2 * len(_live):
+            _heap[:] = list(_live.values())
+            heapq.heapify(_heap)
+
+
+# Pop every loan that is overdue as of `today`, returns (student_id, record) pairs
+def pop_expired(today=None):
+    today = (today or date.today()).toordinal()
+    expired = []
+    with _lock:
+        while _heap and _heap[0][0] <= today:
+            entry = heapq.heappop(_heap)
+            record = entry[3]
+            if _live.get(id(record)) is not entry:
+                continue
+            del _live[id(record)]
+            if record.state is Status.BORROWED:
+                expired.append((entry[2], record))
+    return expired
+
+
+# Number of Borrowed loans waiting to go overdue
+def pending():
+    return len(_live)
+
+
+def next_due():
+    with _lock:
+        while _heap and _live.get(id(_heap[0][3])) is not _heap[0]:
+            heapq.heappop(_heap)
+        return date.fromordinal(_heap[0][0]) if _heap else None
+
+
+def rebuild():
+    global _seq
+    with _lock:
+        _heap.clear()
+        _live.clear()
+        for sid, record in loan_index.loans("Borrowed"):
+            _seq += 1
+            entry = [_expires_on(record), _seq, sid, record]
+            _live[id(record)] = entry
+            _heap.append(entry)
+        heapq.heapify(_heap)
+
+
+# Live heap entries for snapshot.py; records are the same objects as in students
+def export_state():
+    with _lock:
+        return list(_live.values())
+
+
+def import_state(entries):
+    global _seq
+    with _lock:
+        _heap[:] = [list(entry) for entry in entries]
+        heapq.heapify(_heap)
+        _live.clear()
+        for entry in _heap:
+            _live[id(entry[3])] = entry
+        _seq = max((entry[1] for entry in _heap), default=0)
+
+
+# Background sweeper
+_sweeper = None
+_stop = threading.Event()
+
+
+def start_sweeper(on_expired, interval=3600):
+    global _sweeper
+    if _sweeper is not None and _sweeper.is_alive():
+        return _sweeper
+
+    def run():
+        while not _stop.wait(interval):
+            for sid, record in pop_expired():
+                on_expired(sid, record)
+
+    _stop.clear()
+    _sweeper = threading.Thread(target=run, name="overdue-sweeper", daemon=True)
+    _sweeper.start()
+    return _sweeper
+
+
+def stop_sweeper():
+    _stop.set()
+
+
+rebuild()
@@ -0,0 +1,59 @@
+import heapq
+from flask import request, current_app, Response, stream_with_context
+
+# Opt-in paging and NDJSON streaming for the large listing endpoints.
+#   ?limit=N          at most N records, ordered by ID
+#   ?cursor=<ID>      start after this ID (the previous page's next_cursor)
+#   ?format=ndjson    stream one JSON record per line instead of one document
+# Without any of these the endpoints answer exactly as before.
+
+
+# True when the request asked for paging or streaming
+def requested():
+    return "limit" in request.args or "cursor" in request.args or wants_ndjson()
+
+
+def wants_ndjson():
+    return request.args.get("format") == "ndjson"
+
+
+# Error message for a bad limit, or None
+def invalid():
+    limit = request.args.get("limit")
+    if limit is not None and (not limit.isdigit() or int(limit) <= 0):
+        return "limit must be a positive integer"
+    return None
+
+
+# IDs for the requested page in ID order, plus the cursor for the next page.
+# With a limit only the smallest limit+1 IDs are kept (O(n log limit), O(limit) memory).
+def page(keys):
+    limit = request.args.get("limit")
+    cursor = request.args.get("cursor")
+
+    candidates = keys if cursor is None else (key for key in keys if key > cursor)
+    if limit is None:
+        return sorted(candidates), None
+
+    limit = int(limit)
+    smallest = heapq.nsmallest(limit + 1, candidates)
+    if len(smallest) > limit:
+        return smallest[:limit], smallest[limit - 1]
+    return smallest, None
+
+
+# Records rendered one at a time while the response is written; render(key)
+# may return None for records that disappeared mid-stream.
+def ndjson(keys, render, next_cursor=None):
+    dumps = current_app.json.dumps
+
+    def generate():
+        for key in keys:
+            record = render(key)
+            if record is not None:
+                yield dumps(record) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
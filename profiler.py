@@ -0,0 +1,158 @@
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from flask import request
+
+# On-demand sampling profiler for live requests (admin switch in
+# profiler_routes.py).
+# While it runs, a fraction of requests (optionally only one route) register
+# their thread at the start and drop it at teardown; a sampler thread wakes
+# every interval and records the current stack of each registered thread.
+# Stacks are counted in memory and download either as collapsed stacks
+# (one "root;...;leaf count" line each, for flamegraph.pl or speedscope) or
+# as a pstats file built from the samples. Each stack starts with a
+# "<METHOD> <route>" frame so the flamegraph splits by route.
+# While stopped, the request hooks cost one global check. Each worker process
+# profiles only its own requests.
+
+MAX_STACKS = 20000     # distinct stacks kept; later new ones only count as dropped
+
+_settings = None       # {"rate", "route", "interval"} while running
+_active = {}           # thread id -> root frame of the request it is serving
+_stacks = {}           # (frame, ...) root first -> [samples, seconds]
+_counts = {"requests": 0, "samples": 0, "dropped": 0}
+_lock = threading.Lock()
+_sampler = None
+_stop = None
+
+
+def status():
+    with _lock:
+        return {
+            "running": _settings is not None,
+            "settings": _settings,
+            "stacks": len(_stacks),
+            **_counts,
+        }
+
+
+# Start a fresh profile: sample `rate` of requests (only `route`, a URL rule
+# like "/students_fines", when given) every `interval` seconds
+def start(rate=1.0, route=None, interval=0.005):
+    global _settings, _sampler, _stop
+    stop()
+    with _lock:
+        _stacks.clear()
+        _counts.update(requests=0, samples=0, dropped=0)
+        _settings = {"rate": rate, "route": route, "interval": interval}
+    _stop = threading.Event()
+    _sampler = threading.Thread(target=_run, args=(interval, _stop), name="profiler-sampler", daemon=True)
+    _sampler.start()
+
+
+# Stop sampling; the collected stacks stay available for download
+def stop():
+    global _settings, _sampler
+    _settings = None
+    if _sampler is not None:
+        _stop.set()
+        _sampler.join()
+        _sampler = None
+    _active.clear()
+
+
+# app.py hooks
+def start_request():
+    current = _settings
+    if current is None:
+        return
+    rule = request.url_rule
+    route = rule.rule if rule is not None else None
+    if current["route"] is not None and route != current["route"]:
+        return
+    if current["rate"] < 1 and random.random() >= current["rate"]:
+        return
+    _active[threading.get_ident()] = ("~", 0, f"{request.method} {route or 'unmatched'}")
+    with _lock:
+        _counts["requests"] += 1
+
+
+def finish_request():
+    if _active:
+        _active.pop(threading.get_ident(), None)
+
+
+def _stack(root, frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, code.co_qualname))
+        frame = frame.f_back
+    stack.append(root)
+    stack.reverse()
+    return tuple(stack)
+
+
+# A sample stands for the time since the previous wakeup, which can be longer
+# than interval when request threads hold the GIL
+def _run(interval, stopped):
+    last = time.perf_counter()
+    while not stopped.wait(interval):
+        now = time.perf_counter()
+        elapsed, last = now - last, now
+        if not _active:
+            continue
+        frames = sys._current_frames()
+        with _lock:
+            for ident, root in list(_active.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = _stack(root, frame)
+                _counts["samples"] += 1
+                entry = _stacks.get(stack)
+                if entry is None:
+                    if len(_stacks) >= MAX_STACKS:
+                        _counts["dropped"] += 1
+                        continue
+                    entry = _stacks[stack] = [0, 0.0]
+                entry[0] += 1
+                entry[1] += elapsed
+
+
+def _frame_label(frame):
+    filename, line, name = frame
+    if filename == "~":
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed():
+    with _lock:
+        stacks = list(_stacks.items())
+    lines = [";".join(map(_frame_label, stack)) + f" {count}" for stack, (count, _) in stacks]
+    return "\n".join(sorted(lines)) + "\n"
+
+
+# A pstats file (pstats.Stats / snakeviz) from the samples: a function's
+# own time is the sampled time where it was the leaf, its cumulative time the
+# sampled time of the stacks it appears in; call counts are sample counts.
+def pstats_data():
+    with _lock:
+        stacks = [(stack, count, seconds) for stack, (count, seconds) in _stacks.items()]
+    stats = {}
+    for stack, count, seconds in stacks:
+        for func in set(stack):
+            entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+            entry[0] += count
+            entry[1] += count
+            entry[3] += seconds
+        stats[stack[-1]][2] += seconds
+        for caller, callee in set(zip(stack, stack[1:])):
+            edge = stats[callee][4].get(caller, (0, 0, 0.0, 0.0))
+            own = seconds if callee == stack[-1] else 0.0
+            stats[callee][4][caller] = (edge[0] + count, edge[1] + count, edge[2] + own, edge[3] + seconds)
+    return marshal.dumps({func: tuple(entry) for func, entry in stats.items()})
@@ -0,0 +1,59 @@
+from flask import Blueprint, request, jsonify, Response, current_app
+from login_routes import auth_required, admin_denied
+import profiler
+
+profiler_routes_bp = Blueprint("profiler_routes_bp", __name__)
+
+
+# Profiler switch (Admin only)
+#   GET    /profiler   status and sample counts
+#   POST   /profiler   start a fresh profile: {"rate": 0.1, "route": "/students_fines", "interval_ms": 5}
+#   DELETE /profiler   stop sampling, keeping the results
+@profiler_routes_bp.route("/profiler", methods=["GET", "POST", "DELETE"])
+@auth_required()
+def profiler_switch():
+    denied = admin_denied()
+    if denied:
+        return denied
+
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        rate = data.get("rate", 1.0)
+        route = data.get("route")
+        interval_ms = data.get("interval_ms", 5)
+
+        if not isinstance(rate, (int, float)) or not 0 < rate <= 1:
+            return jsonify({"error": "rate must be a number in (0, 1]"}), 400
+        if not isinstance(interval_ms, (int, float)) or interval_ms < 1:
+            return jsonify({"error": "interval_ms must be at least 1"}), 400
+        if route is not None and route not in {rule.rule for rule in current_app.url_map.iter_rules()}:
+            return jsonify({"error": f"Unknown route {route}"}), 400
+
+        profiler.start(rate, route, interval_ms / 1000)
+        return jsonify({"message": "Profiler started", **profiler.status()}), 200
+
+    if request.method == "DELETE":
+        profiler.stop()
+        return jsonify({"message": "Profiler stopped", **profiler.status()}), 200
+
+    return jsonify(profiler.status()), 200
+
+
+# Download the collected samples (Admin only)
+#   ?format=collapsed  folded stacks for flamegraph.pl / speedscope (default)
+#   ?format=pstats     a pstats file for pstats.Stats / snakeviz
+@profiler_routes_bp.get("/profiler/download")
+@auth_required()
+def profiler_download():
+    denied = admin_denied()
+    if denied:
+        return denied
+
+    fmt = request.args.get("format", "collapsed")
+    if fmt == "collapsed":
+        return Response(profiler.collapsed(), mimetype="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=profile.collapsed"})
+    if fmt == "pstats":
+        return Response(profiler.pstats_data(), mimetype="application/octet-stream",
+                        headers={"Content-Disposition": "attachment; filename=profile.pstats"})
+    return jsonify({"error": "format must be collapsed or pstats"}), 400
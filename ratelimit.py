@@ -0,0 +1,159 @@
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import request
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+import metrics
+
+# Admission control for the public and login endpoints.
+# Each limited route has a token bucket per client: `rate` requests per
+# second on average, bursts of up to `burst`. Clients are told apart by IP
+# (REMOTE_ADDR; wrap the app in werkzeug's ProxyFix when behind a proxy) or,
+# with "key": "subject", by the verified JWT subject, falling back to the IP
+# for requests without a token. Subject limits are checked by auth_required
+# after the token is verified, so they only apply to routes that use it.
+# Load shedding: once shed_concurrency requests are in flight, limited
+# routes are refused outright so staff routes keep their capacity.
+#
+# Refusals are 429 with Retry-After, made by a WSGI wrapper (admit) before
+# Flask sees the request: requests to other routes pass through after a
+# set lookup on the first path segment, and a refusal costs a few
+# microseconds instead of a whole request. benchmarks/bench_ratelimit.py
+# measures staff-route latency during a flood.
+# Buckets are per process; with serve.py workers each worker has its own.
+
+MAX_CLIENTS = 100000   # buckets kept; the least recently used are dropped (a dropped bucket is full again)
+
+_rules = {}            # url rule -> {"rate", "burst", "key", "methods"}
+_prefixes = set()      # first path segments of the limited rules
+_map = Map()           # the limited rules alone, to match paths against
+_shed_concurrency = None
+_buckets = OrderedDict()   # (url rule, client) -> [tokens, last refill]
+_lock = threading.Lock()
+_in_flight = 0
+
+
+# rules: {url rule: {"rate": per second, "burst": n, "key": "ip" | "subject", "methods": [...]}}
+def configure(rules, shed_concurrency=None):
+    global _map, _shed_concurrency
+    with _lock:
+        _rules.clear()
+        for rule, limit in (rules or {}).items():
+            _rules[rule] = {
+                "rate": float(limit["rate"]),
+                "burst": float(limit.get("burst", limit["rate"])),
+                "key": limit.get("key", "ip"),
+                "methods": set(limit["methods"]) if limit.get("methods") else None,
+            }
+        _prefixes.clear()
+        _prefixes.update(_first_segment(rule) for rule in _rules)
+        _map = Map([Rule(rule, endpoint=rule, methods=limit["methods"]) for rule, limit in _rules.items()])
+        _buckets.clear()
+        _shed_concurrency = shed_concurrency
+
+
+def _first_segment(path):
+    return (path + "/").split("/", 2)[1]
+
+
+# Take one token from client's bucket for rule; seconds to wait when empty, else None
+def take(rule, limit, client):
+    now = time.monotonic()
+    with _lock:
+        key = (rule, client)
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = [limit["burst"], now]
+            if len(_buckets) > MAX_CLIENTS:
+                _buckets.popitem(last=False)
+        else:
+            _buckets.move_to_end(key)
+            bucket[0] = min(limit["burst"], bucket[0] + (now - bucket[1]) * limit["rate"])
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return None
+        return (1 - bucket[0]) / limit["rate"]
+
+
+def _body(message):
+    return json.dumps({"error": message}).encode() + b"\n"
+
+
+LIMITED = _body("Too many requests, retry later")
+BUSY = _body("Server busy, retry later")
+
+
+def _retry_after(seconds):
+    return str(max(1, math.ceil(seconds)))
+
+
+def _refuse(start_response, body, seconds):
+    start_response("429 Too Many Requests", [
+        ("Content-Type", "application/json"),
+        ("Content-Length", str(len(body))),
+        ("Retry-After", _retry_after(seconds)),
+    ])
+    return [body]
+
+
+# The limited rule a request is for, or None
+def _match(environ):
+    path = environ.get("PATH_INFO") or "/"
+    if _first_segment(path) not in _prefixes:
+        return None
+    try:
+        rule, _ = _map.bind("localhost").match(path, environ.get("REQUEST_METHOD", "GET"))
+    except HTTPException:
+        return None
+    return rule
+
+
+# WSGI wrapper for app.wsgi_app: counts requests in flight and refuses
+# limited routes when shedding or when the client's bucket is empty
+def admit(wsgi_app):
+    def admitted(environ, start_response):
+        global _in_flight
+        rule = _match(environ) if _prefixes else None
+        if rule is not None:
+            if _shed_concurrency is not None and _in_flight >= _shed_concurrency:
+                metrics.inc("library_shed_requests_total")
+                return _refuse(start_response, BUSY, 1)
+            limit = _rules[rule]
+            if limit["key"] == "ip":
+                seconds = take(rule, limit, ("ip", environ.get("REMOTE_ADDR")))
+                if seconds is not None:
+                    metrics.inc("library_rate_limited_requests_total")
+                    return _refuse(start_response, LIMITED, seconds)
+        with _lock:
+            _in_flight += 1
+        try:
+            return wsgi_app(environ, start_response)
+        finally:
+            with _lock:
+                _in_flight -= 1
+    return admitted
+
+
+# Called by auth_required once the token (if any) is verified; the 429 to
+# return for "key": "subject" routes, else None
+def check_subject(subject):
+    rule = request.url_rule
+    limit = _rules.get(rule.rule) if rule is not None and _rules else None
+    if limit is None or limit["key"] != "subject":
+        return None
+    if limit["methods"] is not None and request.method not in limit["methods"]:
+        return None
+    client = ("subject", subject) if subject else ("ip", request.remote_addr)
+    seconds = take(rule.rule, limit, client)
+    if seconds is None:
+        return None
+    metrics.inc("library_rate_limited_requests_total")
+    return LIMITED, 429, {"Content-Type": "application/json", "Retry-After": _retry_after(seconds)}
+
+
+def in_flight():
+    return _in_flight
@@ -0,0 +1,361 @@
+import sys
+from datetime import date
+from enum import Enum
+from operator import attrgetter
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:   # optional: only the "orjson" provider needs it
+    orjson = None
+
+# Compact record types for the values in db.students, db.books and each
+# student's loans.
+# Fields live in __slots__ instead of a per-record dict. Loans keep their
+# status as a Status member, their dates as day ordinals and their book as a
+# reference to the Book record, so a loan costs a few pointers. Every record
+# still answers the old dict-style access (record["status"], .get, "in")
+# with the old values, and JSONProvider renders it as the old dict, so
+# responses keep their shape.
+
+
+class Status(Enum):
+    BORROWED = "Borrowed"
+    MISSING = "Missing"
+    RETURNED = "Returned"
+
+
+_STATUSES = {status.value: status for status in Status}
+_STATUS_TEXT = {status: status.value for status in Status}   # faster than .value
+
+
+# A date as its day ordinal. Loans issued on the same day share one Day
+# (and one "%Y-%m-%d" string); being an int subclass, pickle stores each
+# shared Day once instead of once per loan.
+class Day(int):
+    __slots__ = ()
+
+
+_days = {}
+_day_texts = {}
+_text_days = {}
+
+
+def day(ordinal):
+    shared = _days.get(ordinal)
+    if shared is None:
+        shared = _days.setdefault(ordinal, Day(ordinal))
+    return shared
+
+
+def day_from_text(text):
+    ordinal = _text_days.get(text)
+    if ordinal is None:
+        ordinal = _text_days[text] = day(date.fromisoformat(text).toordinal())
+    return ordinal
+
+
+def day_text(ordinal):
+    text = _day_texts.get(ordinal)
+    if text is None:
+        text = _day_texts.setdefault(ordinal, date.fromordinal(ordinal).isoformat())
+    return text
+
+
+class Record:
+    __slots__ = ()
+    KEYS = ()           # keys of the dict form, in order
+    _KEYSET = frozenset()
+
+    def __init_subclass__(cls):
+        cls._KEYSET = frozenset(cls.KEYS)
+
+    def __getitem__(self, key):
+        if key not in self._KEYSET:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self._KEYSET:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._KEYSET and hasattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [key for key in self.KEYS if hasattr(self, key)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def as_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
+# Fields that were never set are absent from the dict form, like missing keys.
+# A student's loans are split in two:
+#   active  - {book_id: loan} for Borrowed and Missing loans, at most one per book
+#             (the borrow routes refuse a second loan of a book ID)
+#   history - append-only list of returned loans, in the order they came back
+# Fines still owed on returned loans are reached through fine_ledger.
+# borrowed_books rebuilds the full list in issue order for listings.
+class Student(Record):
+    KEYS = ("student_name", "in_time", "out_time", "borrowed_books", "password", "role", "fine")
+    __slots__ = ("student_name", "in_time", "out_time", "password", "role", "fine", "active", "history")
+
+    def __init__(self, **fields):
+        self.active = {}
+        self.history = []
+        for key, value in fields.items():
+            self[key] = value
+
+    @property
+    def borrowed_books(self):
+        return sorted(self.loans(), key=attrgetter("serial"))
+
+    @borrowed_books.setter
+    def borrowed_books(self, loans):
+        self.active = {}
+        self.history = []
+        for loan in loans or ():
+            self.add_loan(loan)
+
+    def loan_count(self):
+        return len(self.history) + len(self.active)
+
+    # Every loan, history first, in no particular order
+    def loans(self):
+        yield from self.history
+        yield from self.active.values()
+
+    def add_loan(self, loan):
+        loan.serial = self.loan_count()
+        if loan.state is Status.RETURNED:
+            self.history.append(loan)
+        else:
+            self.active[loan.book_id] = loan
+
+    # Move a loan that was just returned out of the active map
+    def close_loan(self, loan):
+        del self.active[loan.book_id]
+        self.history.append(loan)
+
+    # The loan with this serial (its position in borrowed_books)
+    def loan(self, serial):
+        for loan in self.active.values():
+            if loan.serial == serial:
+                return loan
+        for loan in reversed(self.history):
+            if loan.serial == serial:
+                return loan
+        return None
+
+
+class Book(Record):
+    KEYS = ("book_name", "available")
+    __slots__ = ("book_id",) + KEYS
+
+    def __init__(self, book_id, book_name, available="Yes"):
+        self.book_id = book_id
+        self.book_name = book_name
+        self.available = available
+
+    def __reduce_ex__(self, protocol):
+        return Book, (self.book_id, self.book_name, self.available)
+
+
+class Loan(Record):
+    KEYS = ("book_id", "book_name", "issued_by", "date_of_issuing", "date_of_returning",
+            "fine", "status", "was_missing")
+    __slots__ = ("book", "issued_by", "issued_on", "due_on", "fine", "state", "_was_missing", "serial", "paid")
+
+    # issued_on and due_on are Day values from day(). paid is what has been
+    # paid towards the loan's fines (fine_policy.py), None when not known. It
+    # is not part of the dict form (SQLite and the journal store it beside it),
+    # so loans built from that start at None.
+    def __init__(self, book, issued_by, issued_on, due_on, fine=0, state=Status.BORROWED, was_missing=False,
+                 paid=0):
+        self.book = book
+        self.issued_by = sys.intern(issued_by) if isinstance(issued_by, str) else issued_by
+        self.issued_on = issued_on
+        self.due_on = due_on
+        self.fine = fine
+        self.state = state
+        self._was_missing = was_missing
+        self.serial = None   # set by Student.add_loan
+        self.paid = paid
+
+    # Build from the dict form, referencing the book in `books` when it is the same title
+    @classmethod
+    def from_dict(cls, fields, books):
+        return cls.from_values(books, *(fields.get(key) for key in cls.KEYS))
+
+    # Same, from the dict form's values in KEYS order
+    @classmethod
+    def from_values(cls, books, book_id, book_name, issued_by, date_of_issuing, date_of_returning,
+                    fine, status, was_missing):
+        book = books.get(book_id)
+        if book is None or book.book_name != book_name:
+            book = Book(book_id, book_name, "No")
+        return cls(book, issued_by, day_from_text(date_of_issuing), day_from_text(date_of_returning),
+                   fine or 0, _STATUSES[status], bool(was_missing), None)
+
+    # Overwrite every field from the dict form (journal replay)
+    def assign(self, fields, books):
+        other = Loan.from_dict(fields, books)
+        for name in self.__slots__:
+            if name != "serial":
+                setattr(self, name, getattr(other, name))
+
+    # Same result as Record.as_dict, spelled out: listings render every loan
+    def as_dict(self):
+        return self.dict_with(self.fine, self.state, self._was_missing)
+
+    # The dict form with the fields that change given (versions.py marks)
+    def dict_with(self, fine, state, went_missing):
+        book = self.book
+        fields = {
+            "book_id": book.book_id,
+            "book_name": book.book_name,
+            "issued_by": self.issued_by,
+            "date_of_issuing": day_text(self.issued_on),
+            "date_of_returning": day_text(self.due_on),
+            "fine": fine,
+            "status": _STATUS_TEXT[state],
+        }
+        if went_missing:
+            fields["was_missing"] = True
+        return fields
+
+    # Pickled as its slot values: much faster than the generic slots state
+    def __reduce_ex__(self, protocol):
+        return _restore_loan, (self.book, self.issued_by, self.issued_on, self.due_on,
+                               self.fine, self.state, self._was_missing, self.serial, self.paid)
+
+    @property
+    def book_id(self):
+        return self.book.book_id
+
+    @property
+    def book_name(self):
+        return self.book.book_name
+
+    @property
+    def date_of_issuing(self):
+        return day_text(self.issued_on)
+
+    @property
+    def date_of_returning(self):
+        return day_text(self.due_on)
+
+    @property
+    def status(self):
+        return _STATUS_TEXT[self.state]
+
+    @status.setter
+    def status(self, value):
+        self.state = _STATUSES[value]
+
+    # Only present (and True) on loans that were returned after going missing
+    @property
+    def was_missing(self):
+        if not self._was_missing:
+            raise AttributeError("was_missing")
+        return True
+
+    @was_missing.setter
+    def was_missing(self, value):
+        self._was_missing = bool(value)
+
+    # Same flag as a plain bool, for code that reads it on every loan
+    @property
+    def went_missing(self):
+        return self._was_missing
+
+
+# Unpickling: the values are already interned and shared
+# (snapshots written before loans tracked payments have no paid)
+def _restore_loan(book, issued_by, issued_on, due_on, fine, state, was_missing, serial, paid=None):
+    loan = object.__new__(Loan)
+    loan.book = book
+    loan.issued_by = issued_by
+    loan.issued_on = issued_on
+    loan.due_on = due_on
+    loan.fine = fine
+    loan.state = state
+    loan._was_missing = was_missing
+    loan.serial = serial
+    loan.paid = paid
+    return loan
+
+
+
+# app.json providers: both render records as their dict form, sort keys
+# like Flask's default and write compact output outside debug mode.
+#   JSONProvider    the standard library json module (Flask's default)
+#   OrjsonProvider  orjson, several times faster; needs the orjson package
+# encode(obj) gives the compact UTF-8 body without the trailing newline, for
+# building responses from pre-encoded pieces (fragments.py).
+class JSONProvider(DefaultJSONProvider):
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o.as_dict()
+        return DefaultJSONProvider.default(o)
+
+    def encode(self, obj):
+        return self.dumps(obj, separators=(",", ":")).encode()
+
+    # Pretty-printed responses (debug mode or compact = False)
+    def pretty(self):
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+
+class OrjsonProvider(JSONProvider):
+    # Dates go through default() so they render as HTTP dates, like Flask's
+    OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+               | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def __init__(self, app):
+        if orjson is None:
+            raise RuntimeError("the orjson JSON provider needs the orjson package")
+        super().__init__(app)
+
+    def _options(self, indent=None):
+        options = self.OPTIONS if self.sort_keys else self.OPTIONS & ~orjson.OPT_SORT_KEYS
+        return options | orjson.OPT_INDENT_2 if indent else options
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get("indent"))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def encode(self, obj):
+        return orjson.dumps(obj, default=self.default, option=self._options())
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._options(self.pretty()) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+# Providers by app.config["JSON_PROVIDER"] name
+PROVIDERS = {"json": JSONProvider, "orjson": OrjsonProvider}
+DEFAULT_PROVIDER = "orjson" if orjson is not None else "json"
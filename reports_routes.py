@@ -0,0 +1,130 @@
+from datetime import date, timedelta
+from flask import Blueprint, request, jsonify
+from db import books, librarians
+from login_routes import get_current_user, auth_required, admin_denied
+from records import day_text
+import rollups
+import locks
+
+reports_routes_bp = Blueprint("reports_routes_bp", __name__)
+
+DEFAULT_DAYS = 30
+
+
+def _staff_only():
+    role, _ = get_current_user()
+    if role not in ["staff", "admin"]:
+        return jsonify({"error": "Only staff and admin can view reports"}), 403
+    return None
+
+
+def _limit():
+    limit = request.args.get("limit", "10")
+    return int(limit) if limit.isdigit() and int(limit) > 0 else None
+
+
+# ?from=YYYY-MM-DD&to=YYYY-MM-DD as day ordinals, default the last DEFAULT_DAYS days
+def _date_range():
+    today = date.today()
+    first = request.args.get("from", (today - timedelta(days=DEFAULT_DAYS - 1)).isoformat())
+    last = request.args.get("to", today.isoformat())
+    try:
+        first, last = date.fromisoformat(first).toordinal(), date.fromisoformat(last).toordinal()
+    except ValueError:
+        return None
+    return (first, last) if first <= last else None
+
+
+# Most-borrowed books
+@reports_routes_bp.get("/reports/top_books")
+@auth_required()
+def top_books():
+    denied = _staff_only()
+    if denied:
+        return denied
+    limit = _limit()
+    if limit is None:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
+    return jsonify({
+        "top_books": [
+            {"book_id": book_id, "book_name": books[book_id]["book_name"] if book_id in books else None,
+             "times_borrowed": count}
+            for book_id, count in rollups.top_books(limit)
+        ]
+    }), 200
+
+
+# Loans issued per librarian
+@reports_routes_bp.get("/reports/librarians")
+@auth_required()
+def librarian_issues():
+    denied = _staff_only()
+    if denied:
+        return denied
+    limit = _limit()
+    if limit is None:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+
+    return jsonify({
+        "librarians": [
+            {"librarian_id": lid, "librarian_name": librarians.get(lid, {}).get("librarian_name"),
+             "loans_issued": count}
+            for lid, count in rollups.top_librarians(limit)
+        ]
+    }), 200
+
+
+# Issues, returns, missing marks and fines paid per day
+@reports_routes_bp.get("/reports/daily")
+@auth_required()
+def daily_counts():
+    denied = _staff_only()
+    if denied:
+        return denied
+    span = _date_range()
+    if span is None:
+        return jsonify({"error": "from and to must be YYYY-MM-DD dates, from <= to"}), 400
+
+    return jsonify({
+        "days": [{"date": day_text(n), **counts} for n, counts in rollups.daily(*span).items()],
+        "totals": rollups.totals()
+    }), 200
+
+
+# Fine revenue per day
+@reports_routes_bp.get("/reports/fines")
+@auth_required()
+def fine_revenue():
+    denied = _staff_only()
+    if denied:
+        return denied
+    span = _date_range()
+    if span is None:
+        return jsonify({"error": "from and to must be YYYY-MM-DD dates, from <= to"}), 400
+
+    revenue = [{"date": day_text(n), "amount": counts["fines_paid"]}
+               for n, counts in rollups.daily(*span).items() if counts["fines_paid"]]
+    return jsonify({
+        "revenue": revenue,
+        "period_total": sum(entry["amount"] for entry in revenue),
+        "all_time_total": rollups.totals()["fines_paid"]
+    }), 200
+
+
+# Recompute the rollups from the loans and report where they disagreed (Admin only)
+@reports_routes_bp.post("/reports/rebuild")
+@auth_required()
+def rebuild_reports():
+    denied = admin_denied()
+    if denied:
+        return denied
+
+    with locks.hold_all():
+        problems = rollups.rebuild()
+    return jsonify({
+        "message": "Reports rebuilt",
+        "consistent": not problems,
+        "problems": problems,
+        "totals": rollups.totals()
+    }), 200
@@ -0,0 +1,254 @@
+import threading
+from datetime import date
+from db import students
+from records import Status
+
+# Circulation rollups for /reports, updated as circulation.py applies each
+# change instead of recomputed from every student's loans:
+#   book_borrows       book_id -> times issued, kept in count order
+#   librarian_issues   issued_by -> loans issued, kept in count order
+#   daily              day ordinal -> [issued, returned, missing, fines paid]
+#   totals             the same four, all time
+# Rankings only ever count up, so they are LFU-style bucket lists: an issue
+# moves one key to the next bucket and top(n) walks down from the highest
+# count, both independent of the number of books and loans.
+#
+# rebuild() recomputes what the loans themselves record: issues per book,
+# librarian and issue day, and total returns and missing marks. A removed
+# member's loans go with them, so member_removed() first moves their counts
+# into a retired tally that rebuild() starts from (kept in snapshots; a
+# SQLite load has no deleted loans to count and starts it empty). Loans keep no
+# return or payment dates, so the daily returned/missing/fines series and the
+# fines total only come from live updates (and snapshots, which include them).
+
+ISSUED, RETURNED, MISSING, FINES_PAID = range(4)
+FIELDS = ("issued", "returned", "missing", "fines_paid")
+
+
+class Ranking:
+    def __init__(self, counts=()):
+        self._counts = {}      # key -> count
+        self._buckets = {0: {}}   # count -> keys with that count (dict as ordered set)
+        self._lower = {0: None}   # count -> next lower count present
+        self._higher = {0: None}  # count -> next higher count present
+        self._max = 0
+        # Bulk load: link the distinct counts in order once
+        for key, count in counts:
+            self._counts[key] = count
+            self._buckets.setdefault(count, {})[key] = None
+        ordered = sorted(self._buckets)
+        for lower, higher in zip(ordered, ordered[1:]):
+            self._higher[lower] = higher
+            self._lower[higher] = lower
+        self._higher[ordered[-1]] = None
+        self._max = ordered[-1]
+
+    def add(self, key):
+        count = self._counts.get(key, 0)
+        new = count + 1
+        if new not in self._buckets:
+            # new sits right above count, which is present (0 always is)
+            above = self._higher[count]
+            self._buckets[new] = {}
+            self._lower[new] = count
+            self._higher[new] = above
+            self._higher[count] = new
+            if above is not None:
+                self._lower[above] = new
+            else:
+                self._max = new
+        self._buckets[new][key] = None
+        self._counts[key] = new
+        if count:
+            bucket = self._buckets[count]
+            del bucket[key]
+            if not bucket:
+                self._unlink(count)
+
+    def _unlink(self, count):
+        lower, higher = self._lower.pop(count), self._higher.pop(count)
+        del self._buckets[count]
+        self._higher[lower] = higher
+        if higher is not None:
+            self._lower[higher] = lower
+        else:
+            self._max = lower
+
+    def count(self, key):
+        return self._counts.get(key, 0)
+
+    # [(key, count)] for the n highest counts; ties in the order they were reached
+    def top(self, n):
+        result = []
+        count = self._max
+        while count and len(result) < n:
+            for key in self._buckets[count]:
+                result.append((key, count))
+                if len(result) == n:
+                    break
+            count = self._lower[count]
+        return result
+
+    def counts(self):
+        return dict(self._counts)
+
+    def __len__(self):
+        return len(self._counts)
+
+
+# What the loans determine, as _computed() returns it (a copy of base if given)
+def _counts(base=None):
+    base = base or {}
+    return {"books": dict(base.get("books", {})), "librarians": dict(base.get("librarians", {})),
+            "issued_daily": dict(base.get("issued_daily", {})),
+            "returned": base.get("returned", 0), "missing": base.get("missing", 0)}
+
+
+_lock = threading.Lock()
+_book_borrows = Ranking()
+_librarian_issues = Ranking()
+_daily = {}
+_totals = [0, 0, 0, 0]
+_retired = _counts()   # counts of the loans of removed members
+
+
+def _bump(field, amount=1, on=None):
+    row = _daily.get(on)
+    if row is None:
+        row = _daily[on] = [0, 0, 0, 0]
+    row[field] += amount
+    _totals[field] += amount
+
+
+# Hooks called by circulation.py (and journal replay) with the loan's locks held
+def loan_issued(record):
+    with _lock:
+        _book_borrows.add(record.book_id)
+        _librarian_issues.add(record.issued_by)
+        _bump(ISSUED, on=int(record.issued_on))
+
+
+def loan_returned(record, on=None):
+    with _lock:
+        _bump(RETURNED, on=on or date.today().toordinal())
+
+
+def loan_missing(record, on=None):
+    with _lock:
+        _bump(MISSING, on=on or date.today().toordinal())
+
+
+def fine_paid(amount, on=None):
+    if amount:
+        with _lock:
+            _bump(FINES_PAID, amount, on=on or date.today().toordinal())
+
+
+# Called by membership_routes.py (and journal replay) as a member is removed
+def member_removed(info):
+    with _lock:
+        _count(info.loans(), _retired)
+
+
+# Reads
+def top_books(n):
+    with _lock:
+        return _book_borrows.top(n)
+
+
+def top_librarians(n):
+    with _lock:
+        return _librarian_issues.top(n)
+
+
+def totals():
+    return dict(zip(FIELDS, _totals))
+
+
+# {day ordinal: {field: value}} for the days in [first, last] that had activity
+def daily(first, last):
+    with _lock:
+        if last - first < len(_daily):   # walk the range, else filter the days we have
+            days = [(n, _daily[n]) for n in range(first, last + 1) if n in _daily]
+        else:
+            days = sorted((n, row) for n, row in _daily.items() if first <= n <= last)
+        return {n: dict(zip(FIELDS, row)) for n, row in days}
+
+
+# Add what the loans determine to counts (a _counts() dict)
+def _count(loans, counts):
+    books, librarians, issued_daily = counts["books"], counts["librarians"], counts["issued_daily"]
+    for record in loans:
+        books[record.book_id] = books.get(record.book_id, 0) + 1
+        librarians[record.issued_by] = librarians.get(record.issued_by, 0) + 1
+        issued_daily[int(record.issued_on)] = issued_daily.get(int(record.issued_on), 0) + 1
+        if record.state is Status.RETURNED:
+            counts["returned"] += 1
+        if record.state is Status.MISSING or record.get("was_missing"):
+            counts["missing"] += 1
+
+
+# Everything the loans themselves determine: the retired tally plus the
+# loans of current members
+def _computed():
+    with _lock:
+        counts = _counts(_retired)
+    for info in students.values():
+        _count(info.loans(), counts)
+    return counts
+
+
+# Rebuild from the loans. Returns the differences from the incremental rollups
+# (an empty list when they agreed); the series rebuild() cannot recompute are kept.
+def rebuild():
+    global _book_borrows, _librarian_issues
+    computed = _computed()
+    with _lock:
+        problems = []
+        for name, live in (("books", _book_borrows.counts()), ("librarians", _librarian_issues.counts())):
+            for key in sorted(set(live) | set(computed[name]), key=str):
+                if live.get(key, 0) != computed[name].get(key, 0):
+                    problems.append(f"{name}: {key} counted {live.get(key, 0)}, loans say {computed[name].get(key, 0)}")
+        issued_live = {n: row[ISSUED] for n, row in _daily.items() if row[ISSUED]}
+        if issued_live != computed["issued_daily"]:
+            problems.append("daily issued counts differ from the loans' issue dates")
+        for field, name in ((RETURNED, "returned"), (MISSING, "missing")):
+            if _totals[field] != computed[name]:
+                problems.append(f"total {name} {_totals[field]}, loans say {computed[name]}")
+
+        _book_borrows = Ranking(computed["books"].items())
+        _librarian_issues = Ranking(computed["librarians"].items())
+        for row in _daily.values():
+            row[ISSUED] = 0
+        for n, count in computed["issued_daily"].items():
+            _daily.setdefault(n, [0, 0, 0, 0])[ISSUED] = count
+        _totals[ISSUED] = sum(computed["issued_daily"].values())
+        _totals[RETURNED] = computed["returned"]
+        _totals[MISSING] = computed["missing"]
+        return problems
+
+
+# Rollup contents for snapshot.py
+def export_state():
+    with _lock:
+        return {
+            "book_borrows": _book_borrows.counts(),
+            "librarian_issues": _librarian_issues.counts(),
+            "daily": {n: list(row) for n, row in _daily.items()},
+            "totals": list(_totals),
+            "retired": _counts(_retired),
+        }
+
+
+def import_state(state):
+    global _book_borrows, _librarian_issues, _retired
+    with _lock:
+        _book_borrows = Ranking(state["book_borrows"].items())
+        _librarian_issues = Ranking(state["librarian_issues"].items())
+        _daily.clear()
+        _daily.update({n: list(row) for n, row in state["daily"].items()})
+        _totals[:] = state["totals"]
+        _retired = _counts(state.get("retired"))   # older snapshots have none
+
+
+rebuild()
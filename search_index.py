@@ -0,0 +1,169 @@
+import bisect
+import heapq
+import re
+import threading
+from db import books
+
+# Inverted index over book_name for /books/search.
+# Each lower-cased word of a title maps to the set of book_ids containing it;
+# a sorted list of all words answers prefix (autocomplete) lookups with bisect.
+# manage_books and circulation update it incrementally. New words are queued
+# and words whose last book went away are left in the list; both are settled
+# in one pass by the next prefix lookup, so a bulk import does not shift the
+# list once per new word.
+
+MAX_PREFIX_EXPANSION = 64   # words a single prefix may expand to
+
+_postings = {}      # word -> {book_id}
+_words = []         # sorted list of the words in _postings, plus removed ones until _settle()
+_added = []         # new words not in _words yet
+_removed = False    # True when _words holds words no longer in _postings
+_titles = {}        # book_id -> words of its title
+_available = set()  # book_ids currently available
+_lock = threading.Lock()
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+def add(book_id, book_name, available=True):
+    words = tuple(dict.fromkeys(tokenize(book_name)))
+    with _lock:
+        _remove(book_id)
+        _titles[book_id] = words
+        for word in words:
+            postings = _postings.get(word)
+            if postings is None:
+                postings = _postings[word] = set()
+                if not _listed(word):
+                    _added.append(word)
+            postings.add(book_id)
+        if available:
+            _available.add(book_id)
+
+
+def remove(book_id):
+    with _lock:
+        _remove(book_id)
+
+
+def _remove(book_id):
+    global _removed
+    for word in _titles.pop(book_id, ()):
+        postings = _postings[word]
+        postings.discard(book_id)
+        if not postings:
+            del _postings[word]
+            _removed = True
+    _available.discard(book_id)
+
+
+def _listed(word):
+    index = bisect.bisect_left(_words, word)
+    return index < len(_words) and _words[index] == word
+
+
+# Bring _words up to date with _postings; call with _lock held. The new list
+# replaces the old one whole, so lookups without the lock never see it half done.
+def _settle():
+    global _words, _removed
+    words = [word for word in _words if word in _postings] if _removed else list(_words)
+    words.extend(word for word in dict.fromkeys(_added) if word in _postings)
+    words.sort()   # a sorted run and the new words: only those are really sorted
+    _words = words
+    _added.clear()
+    _removed = False
+
+
+def set_available(book_id, available):
+    if available:
+        _available.add(book_id)
+    else:
+        _available.discard(book_id)
+
+
+def _expand(prefix):
+    if _added or _removed:
+        with _lock:
+            if _added or _removed:
+                _settle()
+    words = _words
+    start = bisect.bisect_left(words, prefix)
+    matches = []
+    for word in words[start:start + MAX_PREFIX_EXPANSION]:
+        if not word.startswith(prefix):
+            break
+        matches.append(word)
+    return matches
+
+
+# Books whose titles contain every query word; the last word also matches as
+# a prefix when prefix=True. Ranked by exact word matches, then shorter title,
+# then book_id. Returns [(book_id, exact_matches)].
+def search(query, limit=20, available_only=False, prefix=True):
+    words = list(dict.fromkeys(tokenize(query)))
+    if not words:
+        return []
+
+    exact_hits = {}
+    candidates = None
+    for n, word in enumerate(words):
+        exact = _postings.get(word, set())
+        matched = exact
+        if prefix and n == len(words) - 1:
+            matched = set().union(exact, *(_postings[w] for w in _expand(word) if w in _postings))
+        candidates = set(matched) if candidates is None else candidates & matched
+        if not candidates:
+            return []
+        for book_id in exact & candidates:
+            exact_hits[book_id] = exact_hits.get(book_id, 0) + 1
+
+    if available_only:
+        candidates &= _available
+
+    return heapq.nsmallest(
+        limit,
+        ((book_id, exact_hits.get(book_id, 0)) for book_id in candidates),
+        key=lambda hit: (-hit[1], len(_titles.get(hit[0], ())), hit[0]),
+    )
+
+
+# Index contents for snapshot.py
+def export_state():
+    with _lock:
+        if _added or _removed:
+            _settle()
+        return {"postings": _postings, "words": _words, "titles": _titles, "available": _available}
+
+
+def import_state(state):
+    global _words, _removed
+    with _lock:
+        _added.clear()
+        _removed = False
+        _postings.clear()
+        _postings.update(state["postings"])
+        _words = list(state["words"])
+        _titles.clear()
+        _titles.update(state["titles"])
+        _available.clear()
+        _available.update(state["available"])
+
+
+def rebuild():
+    global _words, _removed
+    with _lock:
+        _added.clear()
+        _removed = False
+        _postings.clear()
+        _words = []
+        _titles.clear()
+        _available.clear()
+    for book_id, info in list(books.items()):
+        add(book_id, info["book_name"], info["available"] == "Yes")
+
+
+rebuild()
@@ -0,0 +1,76 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+
+# Prefork server: one listening socket, N worker processes accepting on it,
+# each a threaded werkzeug server running app.py. With more than one worker
+# the workers run in shared-state mode (app.py SHARED_STATE_DIR), so a borrow
+# in one worker is seen by all of them.
+#   python serve.py --workers 4 --port 5000 --shared-dir /var/lib/library
+# Any prefork server works the same way as long as each worker imports app.py
+# itself after the fork (e.g. gunicorn without --preload) and LIBRARY_SHARED
+# is set.
+
+
+def serve(sock):
+    from werkzeug.serving import make_server
+    from app import app   # imported after the fork: each worker opens its own files
+    server = make_server(*sock.getsockname()[:2], app, threaded=True, fd=sock.fileno())
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--shared-dir", default=os.environ.get("LIBRARY_SHARED"),
+                        help="directory for the shared log and lock file (needed with --workers > 1)")
+    args = parser.parse_args()
+    if args.workers > 1 and not args.shared_dir:
+        parser.error("--shared-dir is needed with more than one worker")
+    if args.shared_dir:
+        os.environ["LIBRARY_SHARED"] = args.shared_dir
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve(sock)
+            finally:
+                os._exit(0)
+        children.append(pid)
+    print(f"serving on http://{args.host}:{sock.getsockname()[1]} with {args.workers} worker(s)", flush=True)
+
+    def stop(*_):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import gc
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from db import students, books, librarians, users
+import loan_index
+import fine_ledger
+import overdue_scheduler
+import search_index
+import catalog_cache
+import locks
+import rollups
+import occupancy
+import versions
+
+# Binary snapshots of the whole in-memory state for fast restarts.
+# One pickle holds the db dicts together with the derived indexes. Index
+# entries reference the same loan records as students, and pickle keeps that
+# sharing, so restoring skips re-parsing dates and re-tokenizing titles.
+# Snapshots are trusted local files: never restore one from an untrusted source.
+#
+# save() pauses writers only while it forks: under locks.hold_all() it
+# collects the index exports and forks. The child pickles its copy-on-write
+# image of the state and writes the file, while the parent releases the locks
+# and carries on. Pickling 1M loans takes seconds, and dumps() would hold
+# every writer for all of it. While the child runs, the pages it touches are
+# copied, so memory use can briefly approach twice the state.
+
+MAGIC = b"LIBSNAP1"
+
+log = logging.getLogger(__name__)
+
+# Writer pid -> the exports its child is pickling. Freeing them touches every
+# record, which copies the records' pages while the child still shares them,
+# so they are only let go once it is done.
+_exports = {}
+
+
+def _state():
+    return {
+        "students": students,
+        "books": books,
+        "librarians": librarians,
+        "users": users,
+        "loan_index": loan_index.export_state(),
+        "fine_ledger": fine_ledger.export_state(),
+        "overdue_scheduler": overdue_scheduler.export_state(),
+        "search_index": search_index.export_state(),
+        "rollups": rollups.export_state(),
+        "occupancy": occupancy.export_state(),
+    }
+
+
+# Serialize under every stripe lock so no write is half-applied; writers
+# wait for the whole pickling (see save() for the way around that)
+def dumps():
+    with locks.hold_all():
+        return dumps_locked()
+
+
+# For callers that already hold locks.hold_all()
+def dumps_locked():
+    return _pickle(_state())
+
+
+def _pickle(state):
+    # Pickling allocates a tuple per record, which would otherwise trigger GC passes
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return MAGIC + pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+# Fork a child that writes header plus a snapshot of the state as it is now
+# to path. Call with locks.hold_all() held; the exports take the modules'
+# own locks here, so the child needs none. Returns the child's pid for wait().
+def fork_writer(path, header=b""):
+    state = _state()
+    # Until the child is done, collections leave the existing objects alone:
+    # each one touched would be a page copied for the parent
+    gc.freeze()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.nice(19)   # leave the CPU to the server
+            write_atomic(path, header + _pickle(state))
+            status = 0
+        except BaseException:
+            log.exception("snapshot writer for %s failed", path)
+        finally:
+            os._exit(status)
+    _exports[pid] = state
+    return pid
+
+
+def wait(pid, path):
+    try:
+        _, status = os.waitpid(pid, 0)
+    finally:
+        gc.unfreeze()
+        _exports.pop(pid, None)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise OSError(f"snapshot writer for {path} failed")
+
+
+# Write to a temporary file next to path, fsync, then rename over path
+def write_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def save(path):
+    with locks.hold_all():
+        pid = fork_writer(path)
+    wait(pid, path)
+    return os.path.getsize(path)
+
+
+# The state is captured before returning; pickling and the disk write run in the background
+def save_in_background(path):
+    with locks.hold_all():
+        pid = fork_writer(path)
+    thread = threading.Thread(target=wait, args=(pid, path), name="snapshot-writer", daemon=True)
+    thread.start()
+    return thread
+
+
+def restore(path):
+    with open(path, "rb") as f:
+        load(f)
+
+
+# Restore from an open binary file positioned at the start of a snapshot
+def load(f):
+    # Millions of new containers would otherwise trigger repeated full GC passes
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{getattr(f, 'name', 'input')} is not a library snapshot")
+        state = pickle.load(f)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    with locks.hold_all():
+        for live, name in ((students, "students"), (books, "books"),
+                           (librarians, "librarians"), (users, "users")):
+            live.clear()
+            live.update(state[name])
+        loan_index.import_state(state["loan_index"])
+        fine_ledger.import_state(state["fine_ledger"])
+        overdue_scheduler.import_state(state["overdue_scheduler"])
+        search_index.import_state(state["search_index"])
+        if "rollups" in state:
+            rollups.import_state(state["rollups"])
+        else:   # snapshot from before rollups
+            rollups.rebuild()
+        if "occupancy" in state:
+            occupancy.import_state(state["occupancy"])
+        else:
+            occupancy.rebuild()
+        catalog_cache.clear()
+        versions.rebuild()
+
+
+# Periodic background snapshots
+_stop = threading.Event()
+
+
+def start_periodic(path, interval):
+    def run():
+        while not _stop.wait(interval):
+            try:
+                save(path)
+            except OSError:
+                log.exception("snapshot to %s failed", path)
+
+    _stop.clear()
+    thread = threading.Thread(target=run, name="snapshot-periodic", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_periodic():
+    _stop.set()
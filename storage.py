@@ -0,0 +1,365 @@
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from db import students, books, librarians, users
+from records import Student, Book, Loan
+import journal
+import versions
+
+# Storage engine behind db.py.
+# The dicts in db.py stay the working set every blueprint reads from; after a
+# blueprint changes them it calls the matching save/delete function here so the
+# active backend can persist the change.
+#   MemoryStorage - nothing to persist, the dicts are the store (default)
+#   SQLiteStorage - write-through to an SQLite file, loaded back on startup
+# With the memory backend, journal.py can additionally log every change.
+
+
+class MemoryStorage:
+    name = "memory"
+
+    def load(self):
+        pass
+
+    def close(self):
+        pass
+
+    # Group several saves into one unit of work
+    def transaction(self):
+        return nullcontext()
+
+    def save_student(self, student_id):
+        pass
+
+    def delete_student(self, student_id):
+        pass
+
+    def save_book(self, book_id):
+        pass
+
+    def delete_book(self, book_id):
+        pass
+
+    def save_librarian(self, librarian_id):
+        pass
+
+    def delete_librarian(self, librarian_id):
+        pass
+
+    def add_loan(self, student_id, record):
+        pass
+
+    def save_loan(self, student_id, record):
+        pass
+
+
+# Migrations, applied in order and tracked with PRAGMA user_version
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS students (
+        student_id   TEXT PRIMARY KEY,
+        student_name TEXT NOT NULL,
+        password     TEXT NOT NULL,
+        role         TEXT,
+        in_time      TEXT,
+        out_time     TEXT,
+        fine         INTEGER
+    );
+    CREATE TABLE IF NOT EXISTS books (
+        book_id   TEXT PRIMARY KEY,
+        book_name TEXT NOT NULL,
+        available TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS librarians (
+        librarian_id   TEXT PRIMARY KEY,
+        librarian_name TEXT NOT NULL,
+        role           TEXT
+    );
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT NOT NULL,
+        role     TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS loans (
+        loan_id           INTEGER PRIMARY KEY,
+        student_id        TEXT NOT NULL,
+        book_id           TEXT NOT NULL,
+        book_name         TEXT NOT NULL,
+        issued_by         TEXT,
+        date_of_issuing   TEXT NOT NULL,
+        date_of_returning TEXT NOT NULL,
+        fine              INTEGER NOT NULL DEFAULT 0,
+        status            TEXT NOT NULL,
+        was_missing       INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS loans_student_id ON loans (student_id);
+    CREATE INDEX IF NOT EXISTS loans_book_id ON loans (book_id);
+    CREATE INDEX IF NOT EXISTS loans_status ON loans (status);
+    """,
+    """
+    ALTER TABLE loans ADD COLUMN paid INTEGER;
+    """,
+]
+
+# Statements are kept as constants so sqlite3's per-connection statement
+# cache compiles each one once and reuses it.
+UPSERT_STUDENT = """
+    INSERT OR REPLACE INTO students (student_id, student_name, password, role, in_time, out_time, fine)
+    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+DELETE_STUDENT = "DELETE FROM students WHERE student_id = ?"
+DELETE_STUDENT_LOANS = "DELETE FROM loans WHERE student_id = ?"
+UPSERT_BOOK = "INSERT OR REPLACE INTO books (book_id, book_name, available) VALUES (?, ?, ?)"
+DELETE_BOOK = "DELETE FROM books WHERE book_id = ?"
+UPSERT_LIBRARIAN = "INSERT OR REPLACE INTO librarians (librarian_id, librarian_name, role) VALUES (?, ?, ?)"
+DELETE_LIBRARIAN = "DELETE FROM librarians WHERE librarian_id = ?"
+UPSERT_USER = "INSERT OR REPLACE INTO users (username, password, role) VALUES (?, ?, ?)"
+INSERT_LOAN = """
+    INSERT INTO loans (student_id, book_id, book_name, issued_by, date_of_issuing,
+                       date_of_returning, fine, status, was_missing, paid)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+UPDATE_LOAN = "UPDATE loans SET fine = ?, status = ?, was_missing = ?, paid = ? WHERE loan_id = ?"
+
+
+def _student_row(student_id, info):
+    return (student_id, info["student_name"], info["password"], info.get("role"),
+            info.get("in_time"), info.get("out_time"), info.get("fine"))
+
+
+def _loan_row(student_id, record):
+    return (student_id, record["book_id"], record["book_name"], record.get("issued_by"),
+            record["date_of_issuing"], record["date_of_returning"], record.get("fine", 0),
+            record["status"], 1 if record.get("was_missing") else None, record.paid)
+
+
+class SQLiteStorage(MemoryStorage):
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._loan_ids = {}     # id(record) -> loans.loan_id
+        self.migrate()
+
+    # One connection per thread, created on first use and reused after that
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=64,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=OFF")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    # One transaction per outermost call; nested calls join it
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            yield conn
+            return
+        self._local.depth = 1
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._local.depth = 0
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def migrate(self):
+        conn = self.connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in enumerate(SCHEMA, start=1):
+            if number > version:
+                with conn:
+                    conn.executescript(script)
+                    conn.execute(f"PRAGMA user_version = {number}")
+
+        # A fresh database starts from the preloaded data in db.py
+        if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+            self.import_current()
+
+    # Write everything currently in the db dicts into the database
+    def import_current(self):
+        with self.transaction() as conn:
+            conn.executemany(UPSERT_STUDENT, [_student_row(sid, info) for sid, info in students.items()])
+            conn.executemany(UPSERT_BOOK, [(bid, info["book_name"], info["available"])
+                                           for bid, info in books.items()])
+            conn.executemany(UPSERT_LIBRARIAN, [(lid, info["librarian_name"], info.get("role"))
+                                                for lid, info in librarians.items()])
+            conn.executemany(UPSERT_USER, [(name, info["password"], info["role"])
+                                           for name, info in users.items()])
+            for sid, info in students.items():
+                for record in info["borrowed_books"]:
+                    cursor = conn.execute(INSERT_LOAN, _loan_row(sid, record))
+                    self._loan_ids[id(record)] = cursor.lastrowid
+
+    # Replace the contents of the db dicts with what is stored
+    def load(self):
+        conn = self.connection()
+        loaded_students = {}
+        for sid, name, password, role, in_time, out_time, fine in conn.execute(
+                "SELECT student_id, student_name, password, role, in_time, out_time, fine FROM students"):
+            info = Student(student_name=name, in_time=in_time, out_time=out_time,
+                           borrowed_books=[], password=password)
+            if role is not None:
+                info["role"] = role
+            if fine is not None:
+                info["fine"] = fine
+            loaded_students[sid] = info
+
+        # Books first, so loans can reference them
+        loaded_books = {}
+        for bid, name, available in conn.execute("SELECT book_id, book_name, available FROM books"):
+            loaded_books[bid] = Book(bid, name, available)
+
+        self._loan_ids.clear()
+        for row in conn.execute(
+                "SELECT loan_id, student_id, book_id, book_name, issued_by, date_of_issuing,"
+                " date_of_returning, fine, status, was_missing, paid FROM loans ORDER BY loan_id"):
+            loan_id, sid, *fields, was_missing, paid = row
+            if sid not in loaded_students:
+                continue
+            record = Loan.from_values(loaded_books, *fields, was_missing)
+            record.paid = paid
+            loaded_students[sid].add_loan(record)
+            self._loan_ids[id(record)] = loan_id
+
+        students.clear()
+        students.update(loaded_students)
+
+        books.clear()
+        books.update(loaded_books)
+
+        librarians.clear()
+        for lid, name, role in conn.execute("SELECT librarian_id, librarian_name, role FROM librarians"):
+            librarians[lid] = {"librarian_name": name}
+            if role is not None:
+                librarians[lid]["role"] = role
+
+        users.clear()
+        for name, password, role in conn.execute("SELECT username, password, role FROM users"):
+            users[name] = {"password": password, "role": role}
+
+    def save_student(self, student_id):
+        with self.transaction() as conn:
+            conn.execute(UPSERT_STUDENT, _student_row(student_id, students[student_id]))
+
+    def delete_student(self, student_id):
+        with self.transaction() as conn:
+            conn.execute(DELETE_STUDENT, (student_id,))
+            conn.execute(DELETE_STUDENT_LOANS, (student_id,))
+
+    def save_book(self, book_id):
+        info = books[book_id]
+        with self.transaction() as conn:
+            conn.execute(UPSERT_BOOK, (book_id, info["book_name"], info["available"]))
+
+    def delete_book(self, book_id):
+        with self.transaction() as conn:
+            conn.execute(DELETE_BOOK, (book_id,))
+
+    def save_librarian(self, librarian_id):
+        info = librarians[librarian_id]
+        with self.transaction() as conn:
+            conn.execute(UPSERT_LIBRARIAN, (librarian_id, info["librarian_name"], info.get("role")))
+
+    def delete_librarian(self, librarian_id):
+        with self.transaction() as conn:
+            conn.execute(DELETE_LIBRARIAN, (librarian_id,))
+
+    # A new loan also changes its book's availability, both go in one transaction
+    def add_loan(self, student_id, record):
+        book = books[record["book_id"]]
+        with self.transaction() as conn:
+            cursor = conn.execute(INSERT_LOAN, _loan_row(student_id, record))
+            conn.execute(UPSERT_BOOK, (record["book_id"], book["book_name"], book["available"]))
+        self._loan_ids[id(record)] = cursor.lastrowid
+
+    def save_loan(self, student_id, record):
+        loan_id = self._loan_ids.get(id(record))
+        if loan_id is None:
+            return self.add_loan(student_id, record)
+        with self.transaction() as conn:
+            conn.execute(UPDATE_LOAN, (record.get("fine", 0), record["status"],
+                                       1 if record.get("was_missing") else None, record.paid, loan_id))
+            book = books.get(record["book_id"])
+            if book is not None:
+                conn.execute(UPSERT_BOOK, (record["book_id"], book["book_name"], book["available"]))
+
+
+backend = MemoryStorage()
+
+
+# "memory" or "sqlite:///path/to/library.db"
+def configure(url):
+    global backend
+    backend.close()
+    if url.startswith("sqlite:///"):
+        backend = SQLiteStorage(url[len("sqlite:///"):])
+    elif url == "memory":
+        backend = MemoryStorage()
+    else:
+        raise ValueError(f"Unknown storage url: {url}")
+    backend.load()
+    return backend
+
+
+# with storage.transaction(): ... persists a batch of changes together, and
+# publishes them to readers as one version (versions.py)
+@contextmanager
+def transaction():
+    with versions.batch(), backend.transaction() as conn:
+        yield conn
+
+
+def save_student(student_id):
+    backend.save_student(student_id)
+    journal.save_student(student_id)
+
+
+def delete_student(student_id):
+    backend.delete_student(student_id)
+    journal.delete_student(student_id)
+
+
+def save_book(book_id):
+    backend.save_book(book_id)
+    journal.save_book(book_id)
+
+
+def delete_book(book_id):
+    backend.delete_book(book_id)
+    journal.delete_book(book_id)
+
+
+def save_librarian(librarian_id):
+    backend.save_librarian(librarian_id)
+    journal.save_librarian(librarian_id)
+
+
+def delete_librarian(librarian_id):
+    backend.delete_librarian(librarian_id)
+    journal.delete_librarian(librarian_id)
+
+
+def add_loan(student_id, record):
+    backend.add_loan(student_id, record)
+    journal.save_loan(student_id, record)
+
+
+def save_loan(student_id, record):
+    backend.save_loan(student_id, record)
+    journal.save_loan(student_id, record)
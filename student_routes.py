@@ -1,13 +1,15 @@
 from flask import request, jsonify, Blueprint
-from datetime import datetime
+from datetime import date, datetime
 from db import students
-from flask_jwt_extended import jwt_required, get_jwt
-from login_routes import get_current_user
+from login_routes import get_current_user, auth_required
+import storage
+import locks
+import occupancy
 
 student_routes_bp = Blueprint("student_routes_bp", __name__)
 
 @student_routes_bp.route("/student", methods=["GET", "POST", "PUT"])
-@jwt_required(optional=True)   # allow JWT for all, required for GET
+@auth_required(optional=True)   # allow JWT for all, required for GET
 def student_actions():
     # Student Entry
     if request.method == "POST":  
@@ -19,8 +21,11 @@ def student_actions():
         if student_id not in students:
             return {"message": "Student not found"}, 404
 
-        students[student_id]["in_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        students[student_id]["out_time"] = None  
+        with locks.student(student_id):
+            students[student_id]["in_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            students[student_id]["out_time"] = None  
+            storage.save_student(student_id)
+            occupancy.sync(student_id)
         return {
             "student_id": student_id,
             "student_name": students[student_id]["student_name"],
@@ -39,7 +44,10 @@ def student_actions():
         if not students[student_id].get("in_time"):
             return {"message": "Student has not entered yet"}, 400
 
-        students[student_id]["out_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with locks.student(student_id):
+            students[student_id]["out_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            storage.save_student(student_id)
+            occupancy.sync(student_id)
         return {
             "student_id": student_id,
             "out_time": students[student_id]["out_time"]
@@ -47,23 +55,87 @@ def student_actions():
     
     # View Library Entries (staff/admin only)
     elif request.method == "GET":
-        jwt_body = get_jwt()
-        role = jwt_body.get("role")
+        role, username = get_current_user()
 
         # Only staff and admin allowed
         if role not in ["staff", "admin"]:
             return jsonify({"error": "Only staff and admin can view entered students"}), 403
 
+        # Only the students occupancy.py has seen enter, not every member
         entered_students = {
             sid: {
                 "student_name": info["student_name"],
                 "in_time": info.get("in_time"),
                 "out_time": info.get("out_time")
             }
-            for sid, info in students.items() if info.get("in_time")
+            for sid, info in ((sid, students.get(sid)) for sid in occupancy.visited()) if info is not None
         }
 
         if not entered_students:
             return jsonify({"message": "No students have entered the library yet"}), 200
 
         return jsonify({"entered_students": entered_students}), 200
+
+
+def _staff_only():
+    role, _ = get_current_user()
+    if role not in ["staff", "admin"]:
+        return jsonify({"error": "Only staff and admin can view occupancy"}), 403
+    return None
+
+
+# Who is inside right now (staff/admin only)
+@student_routes_bp.get("/occupancy")
+@auth_required()
+def current_occupancy():
+    denied = _staff_only()
+    if denied:
+        return denied
+
+    inside = occupancy.inside()
+    return jsonify({
+        "headcount": len(inside),
+        "inside": {
+            sid: {"student_name": students[sid]["student_name"], "in_time": in_time}
+            for sid, in_time in inside.items() if sid in students
+        }
+    }), 200
+
+
+# Headcount at a moment: ?at=YYYY-MM-DD HH:MM:SS (staff/admin only)
+@student_routes_bp.get("/occupancy/headcount")
+@auth_required()
+def headcount_at():
+    denied = _staff_only()
+    if denied:
+        return denied
+
+    at = request.args.get("at")
+    if not at:
+        return jsonify({"at": datetime.now().strftime(occupancy.TIME_FORMAT), "headcount": occupancy.headcount()}), 200
+    try:
+        when = datetime.strptime(at, occupancy.TIME_FORMAT)
+    except ValueError:
+        return jsonify({"error": "at must look like YYYY-MM-DD HH:MM:SS"}), 400
+    return jsonify({"at": at, "headcount": occupancy.headcount_at(when)}), 200
+
+
+# Peak headcount per day: ?from=YYYY-MM-DD&to=YYYY-MM-DD, default today (staff/admin only)
+@student_routes_bp.get("/occupancy/peaks")
+@auth_required()
+def occupancy_peaks():
+    denied = _staff_only()
+    if denied:
+        return denied
+
+    today = date.today().isoformat()
+    try:
+        first = date.fromisoformat(request.args.get("from", today))
+        last = date.fromisoformat(request.args.get("to", today))
+    except ValueError:
+        return jsonify({"error": "from and to must be YYYY-MM-DD dates"}), 400
+    if first > last or (last - first).days >= 366:
+        return jsonify({"error": "from must be before to, at most 366 days apart"}), 400
+
+    peaks = occupancy.daily_peaks(first, last)
+    return jsonify({"peaks": [{"date": day.isoformat(), "peak": peak} for day, peak in peaks.items()]}), 200
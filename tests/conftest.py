@@ -0,0 +1,60 @@
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LIBRARY_RATE_LIMITS", "off")   # tests hit the routes faster than any client would
+
+from app import app as flask_app
+
+# The db dicts are module-level and shared by every test, so each test makes
+# its own students and books under fresh IDs instead of resetting them.
+
+_ids = itertools.count(1)
+
+
+@pytest.fixture
+def client():
+    return flask_app.test_client()
+
+
+def _headers(client, username, password):
+    response = client.post("/login", json={"username": username, "password": password})
+    return {"Authorization": "Bearer " + response.get_json()["access_token"]}
+
+
+@pytest.fixture
+def staff(client):
+    return _headers(client, "staff", "staff@123")
+
+
+@pytest.fixture
+def admin(client):
+    return _headers(client, "admin", "admin@123")
+
+
+# Registers a student and lets them into the library; returns the student ID
+@pytest.fixture
+def new_student(client, admin):
+    def make():
+        sid = f"T{next(_ids):05d}"
+        response = client.post("/members", json={"student_id": sid, "student_name": f"Test {sid}",
+                                                 "password": "pw"}, headers=admin)
+        assert response.status_code == 201
+        assert client.post("/student", json={"student_id": sid}).status_code == 200
+        return sid
+    return make
+
+
+# Adds an available book; returns the book ID
+@pytest.fixture
+def new_book(client, admin):
+    def make():
+        book_id = f"TB{next(_ids):05d}"
+        response = client.post("/books", json={"book_id": book_id, "book_name": f"Test Book {book_id}"},
+                               headers=admin)
+        assert response.status_code == 201
+        return book_id
+    return make
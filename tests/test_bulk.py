@@ -0,0 +1,36 @@
+import json
+
+from db import books
+
+# Bulk catalog import: bad rows are reported one by one, bad bodies get a 400.
+
+
+def import_books(client, admin, body, content_type="application/x-ndjson"):
+    return client.post("/books/import", data=body, headers={**admin, "Content-Type": content_type})
+
+
+def test_import_reports_bad_rows(client, admin):
+    rows = [
+        {"book_id": "IMP001", "book_name": "Imported One"},
+        {"book_id": 101, "book_name": "Numeric ID"},
+        {"book_id": "IMP002", "book_name": ["not", "text"]},
+        {"book_id": "IMP001", "book_name": "Duplicate"},
+    ]
+    body = "\n".join(json.dumps(row) for row in rows) + "\n[1, 2]\n{broken\n"
+    response = import_books(client, admin, body)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result["added"], result["failed"]) == (1, 5)
+    assert [entry["status"] for entry in result["results"]] == [201, 400, 400, 400, 400, 400]
+    assert books["IMP001"]["book_name"] == "Imported One"
+    assert "IMP002" not in books
+
+    response = import_books(client, admin, "book_id,book_name\nIMP001,Again\nIMP003,Imported Three\n", "text/csv")
+    assert [entry["status"] for entry in response.get_json()["results"]] == [400, 201]
+
+
+def test_import_rejects_bad_encoding(client, admin):
+    response = import_books(client, admin, b'{"book_id": "IMP900", "book_name": "Caf\xe9"}\n')
+    assert response.status_code == 400
+    assert "IMP900" not in books
+
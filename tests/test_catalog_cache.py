@@ -0,0 +1,32 @@
+import catalog_cache
+
+# Public catalog cache: deleted books and unknown IDs leave nothing behind,
+# and the cache stays within MAX_RESPONSES.
+
+
+def test_deleted_book_is_dropped(client, admin, new_book):
+    book_id = new_book()
+    assert client.get(f"/book_enquiry/{book_id}").status_code == 200
+    assert ("book_enquiry", book_id) in catalog_cache._responses
+
+    client.delete("/books", json={"book_id": book_id}, headers=admin)
+    assert ("book_enquiry", book_id) not in catalog_cache._responses
+    assert book_id not in catalog_cache._book_keys
+    assert client.get(f"/book_enquiry/{book_id}").status_code == 404
+
+
+def test_unknown_ids_are_not_cached(client):
+    before = len(catalog_cache._responses)
+    for n in range(50):
+        assert client.get(f"/book_enquiry/NOSUCH{n}").status_code == 404
+    assert len(catalog_cache._responses) == before
+
+
+def test_cache_is_bounded(client, new_book, monkeypatch):
+    book_ids = [new_book() for _ in range(5)]
+    monkeypatch.setattr(catalog_cache, "MAX_RESPONSES", 3)
+    catalog_cache.clear()
+    for book_id in book_ids:
+        client.get(f"/book_enquiry/{book_id}")
+    assert list(catalog_cache._responses) == [("book_enquiry", book_id) for book_id in book_ids[2:]]
+    assert set(catalog_cache._book_keys) == set(book_ids[2:])
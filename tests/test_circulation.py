@@ -0,0 +1,140 @@
+from db import students, books
+import fine_ledger
+import loan_index
+import rollups
+
+# Borrow, return, missing and fine payments through the routes, with the
+# derived structures checked against the records after each change.
+
+
+def consistency_problems():
+    return loan_index.check_consistency() + fine_ledger.audit() + rollups.rebuild()
+
+
+def borrow(client, headers, sid, book_id):
+    return client.post("/borrow_book", json={"student_id": sid, "book_id": book_id, "librarian_id": "L001"},
+                       headers=headers)
+
+
+def test_borrow_and_return(client, staff, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+
+    response = borrow(client, staff, sid, book_id)
+    assert response.status_code == 200
+    assert response.get_json()["borrowed_book"]["status"] == "Borrowed"
+    assert books[book_id]["available"] == "No"
+    assert (sid, students[sid].active[book_id]) in loan_index.loans("Borrowed")
+    assert consistency_problems() == []
+
+    response = client.put("/return_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+    assert response.status_code == 200
+    assert books[book_id]["available"] == "Yes"
+    assert book_id not in students[sid].active
+    assert all(record["book_id"] != book_id for _, record in loan_index.loans("Borrowed"))
+    assert consistency_problems() == []
+
+    response = client.put("/return_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+    assert response.status_code == 400
+
+
+def test_borrow_refused(client, staff, new_student, new_book):
+    sid, other = new_student(), new_student()
+    book_ids = [new_book() for _ in range(4)]
+
+    assert borrow(client, staff, sid, book_ids[0]).status_code == 200
+    assert borrow(client, staff, other, book_ids[0]).status_code == 400   # already lent
+    assert borrow(client, staff, sid, book_ids[1]).status_code == 200
+    assert borrow(client, staff, sid, book_ids[2]).status_code == 200
+    assert borrow(client, staff, sid, book_ids[3]).status_code == 403   # limit of 3
+    assert books[book_ids[3]]["available"] == "Yes"
+    assert consistency_problems() == []
+
+
+def test_missing_return_and_pay_fine(client, staff, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    borrow(client, staff, sid, book_id)
+
+    response = client.put("/missing_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+    assert response.status_code == 200
+    assert response.get_json()["updated_book"]["fine"] == 500
+    assert fine_ledger.balance(sid) == 500
+    assert consistency_problems() == []
+
+    response = client.put("/return_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+    assert response.status_code == 200
+    assert response.get_json()["remaining_fine"] == 250
+    assert books[book_id]["available"] == "Yes"
+    assert fine_ledger.balance(sid) == 250
+    assert consistency_problems() == []
+
+    response = client.put(f"/pay_fine/{sid}", json={"amount": 300}, headers=staff)
+    assert response.status_code == 400
+    response = client.put(f"/pay_fine/{sid}", json={"amount": 100}, headers=staff)
+    assert response.status_code == 200
+    assert response.get_json()["remaining_fine"] == 150
+    assert fine_ledger.balance(sid) == 150
+    assert consistency_problems() == []
+
+    response = client.get("/students_fines", headers=staff)
+    fines = response.get_json()["students_with_fines"][sid]["fines"]
+    assert [(entry["book_id"], entry["fine"], entry["was_missing"]) for entry in fines] == [(book_id, 150, True)]
+
+    client.put(f"/pay_fine/{sid}", json={"amount": 150}, headers=staff)
+    assert fine_ledger.balance(sid) == 0
+    assert all(record["book_id"] != book_id for _, record in loan_index.loans_with_fines())
+    assert consistency_problems() == []
+
+
+# A record changed behind the index's and ledger's back is reported
+def test_checks_find_untracked_changes(client, staff, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    borrow(client, staff, sid, book_id)
+    record = students[sid].active[book_id]
+
+    record["status"] = "Missing"
+    record["fine"] = 500
+    try:
+        assert loan_index.check_consistency()
+        assert fine_ledger.audit()
+    finally:
+        record["status"] = "Borrowed"
+        record["fine"] = 0
+    assert loan_index.check_consistency() == []
+    assert fine_ledger.audit() == []
+
+
+# A book deleted while on loan and added again cannot be lent twice to the
+# student still holding the old loan
+def test_no_second_active_loan_for_a_book_id(client, staff, admin, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    borrow(client, staff, sid, book_id)
+    client.delete("/books", json={"book_id": book_id}, headers=admin)
+    client.post("/books", json={"book_id": book_id, "book_name": "Re-added"}, headers=admin)
+
+    response = borrow(client, staff, sid, book_id)
+    assert response.status_code == 400
+    response = client.post("/borrow_books", json={"librarian_id": "L001",
+                                                  "items": [{"student_id": sid, "book_id": book_id}]},
+                           headers=staff)
+    assert response.get_json()["results"][0]["status"] == 400
+
+    assert students[sid].loan_count() == 1
+    assert [record["book_id"] for record in students[sid]["borrowed_books"]] == [book_id]
+    assert consistency_problems() == []
+
+
+# A removed member's loans still count in the rollups, and rebuild() agrees
+def test_rollups_keep_removed_members(client, staff, admin, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    borrow(client, staff, sid, book_id)
+    client.put("/return_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+    assert rollups.rebuild() == []
+    totals, issues = rollups.totals(), dict(rollups.top_books(10**6))[book_id]
+
+    response = client.delete("/members", json={"student_id": sid}, headers=admin)
+    assert response.status_code == 200
+    assert sid not in students
+    assert rollups.rebuild() == []
+    assert rollups.totals() == totals
+    assert dict(rollups.top_books(10**6))[book_id] == issues == 1
+    assert consistency_problems() == []
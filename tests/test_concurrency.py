@@ -0,0 +1,84 @@
+import random
+import threading
+
+from app import app
+from db import students, books
+import fine_ledger
+import loan_index
+
+# Borrows, returns and missing marks from many threads at once: no book may
+# be lent twice, and the derived structures must still match the records.
+
+THREADS = 8
+
+
+def run_threads(target, count=THREADS):
+    start = threading.Barrier(count)
+    errors = []
+
+    def run(n):
+        try:
+            start.wait()
+            target(n, app.test_client())
+        except Exception as exc:   # surfaced by the assert below
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def holders(book_ids):
+    lent = {book_id: [] for book_id in book_ids}
+    for sid, info in list(students.items()):
+        for book_id in lent.keys() & info.active.keys():
+            lent[book_id].append(sid)
+    return lent
+
+
+def test_one_book_is_lent_once(staff, new_student, new_book):
+    book_id = new_book()
+    student_ids = [new_student() for _ in range(THREADS)]
+    statuses = []
+
+    def borrow(n, client):
+        body = {"student_id": student_ids[n], "book_id": book_id, "librarian_id": "L001"}
+        statuses.append(client.post("/borrow_book", json=body, headers=staff).status_code)
+
+    run_threads(borrow)
+    assert sorted(statuses) == [200] + [400] * (THREADS - 1)
+    assert len(holders([book_id])[book_id]) == 1
+    assert books[book_id]["available"] == "No"
+
+
+def test_mixed_circulation_keeps_invariants(staff, new_student, new_book):
+    book_ids = [new_book() for _ in range(6)]
+    student_ids = [new_student() for _ in range(6)]
+    server_errors = []
+
+    def circulate(n, client):
+        rng = random.Random(n)
+        for _ in range(150):
+            body = {"student_id": rng.choice(student_ids), "book_id": rng.choice(book_ids)}
+            roll = rng.random()
+            if roll < 0.5:
+                response = client.post("/borrow_book", json={**body, "librarian_id": "L001"}, headers=staff)
+            elif roll < 0.9:
+                response = client.put("/return_book", json=body, headers=staff)
+            else:
+                response = client.put("/missing_book", json=body, headers=staff)
+            if response.status_code >= 500:
+                server_errors.append(response.status_code)
+
+    run_threads(circulate)
+    assert server_errors == []
+    for book_id, sids in holders(book_ids).items():
+        assert len(sids) <= 1, f"{book_id} lent to {sids}"
+        assert books[book_id]["available"] == ("No" if sids else "Yes")
+    for sid in student_ids:
+        assert len(students[sid].active) <= 3
+    assert loan_index.check_consistency() == []
+    assert fine_ledger.audit() == []
@@ -0,0 +1,88 @@
+from datetime import date, timedelta
+
+import pytest
+
+from db import students
+import fine_ledger
+import fine_policy
+import loan_columns
+
+# Fine policy recompute: the numpy and loop paths pick the same loans, the
+# new fines follow the policy and keep what was paid, and the ledger agrees.
+# Recompute covers every loan, so each test puts the default policy back.
+
+POLICY = {"daily_fine": 10, "grace_days": 2, "max_fine": 300}
+
+
+@pytest.fixture
+def restore_policy():
+    yield
+    fine_policy.configure({})
+    fine_policy.recompute()
+
+
+# Students with one loan each: overdue, missing, missing with 200 paid and
+# missing then returned. Returns {name: (student_id, record)}.
+@pytest.fixture
+def loans(client, staff, new_student, new_book):
+    made = {}
+    for name in ("borrowed", "missing", "missing_paid", "returned_missing"):
+        sid, book_id = new_student(), new_book()
+        client.post("/borrow_book", json={"student_id": sid, "book_id": book_id, "librarian_id": "L001"},
+                    headers=staff)
+        if name != "borrowed":
+            client.put("/missing_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+        if name == "missing_paid":
+            client.put(f"/pay_fine/{sid}", json={"amount": 200}, headers=staff)
+        if name == "returned_missing":
+            client.put("/return_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+        made[name] = (sid, students[sid].loan(0))
+    return made
+
+
+def fines(loans):
+    return {name: record.fine for name, (_, record) in loans.items()}
+
+
+def assert_ledger_balances(loans):
+    for sid, record in loans.values():
+        assert fine_ledger.balance(sid) == record.fine
+    assert fine_ledger.audit() == []
+
+
+def test_numpy_and_loop_pick_the_same_loans(loans, restore_policy):
+    pytest.importorskip("numpy")
+    fine_policy.configure(POLICY)
+    due = loans["borrowed"][1].due_on
+    for today in (int(due), int(due) + 2, int(due) + 5, int(due) + 100):
+        records, _, *columns = loan_columns.columns()
+        from_numpy = {id(records[index]) for index in fine_policy._changed_numpy(*columns, today)}
+        records, _ = fine_policy._loans()
+        from_loop = {id(records[index]) for index in fine_policy._changed_loop(records, today)}
+        assert from_numpy == from_loop
+        assert id(loans["missing"][1]) in from_numpy
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_recompute_applies_and_reverts(loans, restore_policy, monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(fine_policy, "numpy", None)
+    before = {"borrowed": 0, "missing": 500, "missing_paid": 300, "returned_missing": 250}
+    assert fines(loans) == before
+    today = date.fromordinal(int(loans["borrowed"][1].due_on)) + timedelta(days=5)
+
+    fine_policy.configure(POLICY)
+    fine_policy.recompute(today)
+    # 5 days late less 2 days' grace at 10 a day; 500 capped at 300, less
+    # the 200 paid; 250 is under the cap
+    assert fines(loans) == {"borrowed": 30, "missing": 300, "missing_paid": 100, "returned_missing": 250}
+    assert loans["missing_paid"][1].paid == 200
+    assert_ledger_balances(loans)
+
+    fine_policy.configure({})
+    fine_policy.recompute(today)
+    assert fines(loans) == before
+    assert loans["missing_paid"][1].paid == 200
+    assert_ledger_balances(loans)
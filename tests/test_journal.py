@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import journal
+
+# Group commit: a failed write in the flusher reaches every waiting request,
+# and restarts replay the log onto the right state.
+
+
+def test_flusher_failure_reaches_waiters(tmp_path, monkeypatch):
+    log = journal.Journal(str(tmp_path / "journal"), commit_delay=0.001)
+    seq = log.append("book", "B101", {"book_name": "Python Basics", "available": "Yes"})
+    log.wait(seq)
+
+    def failing_sync():
+        raise OSError("disk full")
+
+    monkeypatch.setattr(log, "_sync", failing_sync)
+    seq = log.append("book", "B102", {"book_name": "Flask Web Dev", "available": "Yes"})
+    with pytest.raises(OSError):
+        log.wait(seq)
+    log._flusher.join(timeout=5)
+    assert not log._flusher.is_alive()
+
+    # Entries appended after the flusher stopped fail too instead of hanging
+    seq = log.append("book", "B103", {"book_name": "Data Science 101", "available": "Yes"})
+    with pytest.raises(OSError):
+        log.wait(seq)
+
+
+PRELUDE = """
+from app import app
+from db import students, books
+import journal, loan_index, snapshot
+client = app.test_client()
+token = client.post("/login", json={"username": "staff", "password": "staff@123"}).get_json()["access_token"]
+headers = {"Authorization": "Bearer " + token}
+def borrow(book_id):
+    body = {"student_id": "S001", "book_id": book_id, "librarian_id": "L001"}
+    assert client.post("/borrow_book", json=body, headers=headers).status_code == 200
+def give_back(book_id):
+    body = {"student_id": "S001", "book_id": book_id}
+    assert client.put("/return_book", json=body, headers=headers).status_code == 200
+"""
+
+
+def run_app(code, env, root):
+    result = subprocess.run([sys.executable, "-c", PRELUDE + code], cwd=root, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+# A restart with both a snapshot and a journal configured (the periodic
+# snapshot writes one on its own)
+def test_restart_with_snapshot_and_journal(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "LIBRARY_SNAPSHOT": str(tmp_path / "state.snap"),
+           "LIBRARY_JOURNAL": str(tmp_path / "journal"), "LIBRARY_RATE_LIMITS": "off"}
+    run_app("""
+client.post("/student", json={"student_id": "S001"})
+borrow("B101")
+give_back("B101")
+snapshot.save(app.config["SNAPSHOT_PATH"])
+journal.stop()
+""", env, root)
+    run_app("""
+assert students["S001"].loan_count() == 1 and books["B101"]["available"] == "Yes"
+assert loan_index.check_consistency() == []
+""", env, root)
+
+
+# Entries before the checkpoint come from it, later ones from the new segment
+def test_compaction_checkpoint_restores(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = str(tmp_path / "journal")
+    env = {**os.environ, "LIBRARY_JOURNAL": path, "LIBRARY_RATE_LIMITS": "off"}
+    run_app("""
+client.post("/student", json={"student_id": "S001"})
+borrow("B101")
+journal._journal.compact()
+borrow("B102")
+journal.stop()
+""", env, root)
+    assert os.path.exists(path + ".checkpoint")
+    assert journal._segments(path) == [2]
+    run_app("""
+assert sorted(students["S001"].active) == ["B101", "B102"]
+assert books["B101"]["available"] == books["B102"]["available"] == "No"
+assert loan_index.check_consistency() == []
+""", env, root)
@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+from db import students, books
+import circulation
+import fine_ledger
+import loan_index
+import overdue_scheduler
+
+# Overdue sweep: a loan goes missing on day OVERDUE_DAYS + 1 after issue, and
+# loans returned meanwhile are left alone.
+
+
+def borrow(client, headers, sid, book_id):
+    client.post("/borrow_book", json={"student_id": sid, "book_id": book_id, "librarian_id": "L001"},
+                headers=headers)
+    return students[sid].active[book_id]
+
+
+def swept(today):
+    return [record for _, record in circulation.sweep_overdue(today)]
+
+
+def test_day_15_is_not_overdue_day_16_is(client, staff, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    record = borrow(client, staff, sid, book_id)
+    issued = date.today()
+
+    assert record not in swept(issued + timedelta(days=overdue_scheduler.OVERDUE_DAYS))
+    assert record["status"] == "Borrowed"
+
+    assert record in swept(issued + timedelta(days=overdue_scheduler.OVERDUE_DAYS + 1))
+    assert record["status"] == "Missing"
+    assert record["fine"] == 500
+    assert books[book_id]["available"] == "No"
+    assert fine_ledger.balance(sid) == 500
+    assert loan_index.check_consistency() == []
+
+    # Popped once: a later sweep does not fine it again
+    assert record not in swept(issued + timedelta(days=30))
+    assert fine_ledger.balance(sid) == 500
+
+
+def test_returned_loans_are_not_swept(client, staff, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    record = borrow(client, staff, sid, book_id)
+    client.put("/return_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+
+    assert record not in swept(date.today() + timedelta(days=30))
+    assert record["status"] == "Returned"
+    assert record["fine"] == 0
+
+
+# A loan popped from the heap but returned before the sweep got its locks
+def test_expire_rechecks_under_the_locks(client, staff, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    record = borrow(client, staff, sid, book_id)
+    client.put("/return_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+
+    assert circulation.expire_loan(sid, record) is None
+    assert record["status"] == "Returned"
+    assert books[book_id]["available"] == "Yes"
+    assert fine_ledger.balance(sid) == 0
@@ -0,0 +1,40 @@
+import pytest
+
+from db import students, books
+import fine_ledger
+import loan_index
+import snapshot
+
+# Snapshots are written by a forked child; restoring one brings back the
+# state as it was when save() was called.
+
+
+def test_save_and_restore(client, staff, new_student, new_book, tmp_path):
+    sid, book_id = new_student(), new_book()
+    path = str(tmp_path / "state.snap")
+    size = snapshot.save(path)
+    assert size > len(snapshot.MAGIC)
+
+    client.post("/borrow_book", json={"student_id": sid, "book_id": book_id, "librarian_id": "L001"},
+                headers=staff)
+    assert book_id in students[sid].active
+
+    snapshot.restore(path)
+    assert students[sid].active == {}
+    assert books[book_id]["available"] == "Yes"
+    assert loan_index.check_consistency() == []
+    assert fine_ledger.audit() == []
+
+
+def test_background_save(new_student, tmp_path):
+    new_student()
+    path = str(tmp_path / "state.snap")
+    snapshot.save_in_background(path).join()
+    with open(path, "rb") as f:
+        assert f.read(len(snapshot.MAGIC)) == snapshot.MAGIC
+    assert snapshot._exports == {}
+
+
+def test_failed_write_raises(tmp_path):
+    with pytest.raises(OSError):
+        snapshot.save(str(tmp_path / "missing" / "state.snap"))
@@ -0,0 +1,75 @@
+from db import students
+from records import Status
+import circulation
+import storage
+import versions
+
+# Versioned views for the staff listings: a view never changes once handed
+# out, current() shows every completed write, and a transaction's changes
+# show up together.
+
+
+def borrow(client, headers, sid, book_id):
+    client.post("/borrow_book", json={"student_id": sid, "book_id": book_id, "librarian_id": "L001"},
+                headers=headers)
+    return students[sid].active[book_id]
+
+
+def marks(view, sid):
+    return view.rows([sid])[sid][3]
+
+
+def in_bucket(view, status, record):
+    return any(loan is record for _, _, loan, _ in view.loans(status))
+
+
+def test_view_is_unchanged_by_later_writes(client, staff, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    before = versions.current()
+    row = before.rows([sid])[sid]
+
+    record = borrow(client, staff, sid, book_id)
+    assert before.rows([sid])[sid] is row
+    assert row[2] == () and row[3] == ()
+    assert not in_bucket(before, "Borrowed", record)
+
+    borrowed = versions.current()
+    assert borrowed.version > before.version
+    client.put("/return_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+    assert marks(borrowed, sid) == ((0, Status.BORROWED, False),)
+    assert in_bucket(borrowed, "Borrowed", record)
+
+
+def test_current_reflects_committed_writes(client, staff, new_student, new_book):
+    sid, book_id = new_student(), new_book()
+    record = borrow(client, staff, sid, book_id)
+    view = versions.current()
+    assert view.rows([sid])[sid][2] == (record,)
+    assert marks(view, sid) == ((0, Status.BORROWED, False),)
+    assert in_bucket(view, "Borrowed", record)
+
+    client.put("/missing_book", json={"student_id": sid, "book_id": book_id}, headers=staff)
+    view = versions.current()
+    assert marks(view, sid) == ((500, Status.MISSING, False),)
+    assert in_bucket(view, "Missing", record) and not in_bucket(view, "Borrowed", record)
+    assert (sid, students[sid].student_name, record, (500, Status.MISSING, False)) in view.loans_with_fines()
+
+
+def test_transaction_changes_appear_together(client, staff, new_student, new_book):
+    loans = []
+    for _ in range(3):
+        sid = new_student()
+        loans.append((sid, borrow(client, staff, sid, new_book())))
+    before = versions.current()
+
+    with storage.transaction():
+        for sid, record in loans:
+            circulation.mark_missing(sid, record)
+            # Queued for the end of the transaction: current() still has none of them
+            view = versions.current()
+            assert all(marks(view, owner) == ((0, Status.BORROWED, False),) for owner, _ in loans)
+    after = versions.current()
+    for sid, record in loans:
+        assert marks(before, sid) == ((0, Status.BORROWED, False),)
+        assert marks(after, sid) == ((500, Status.MISSING, False),)
+        assert in_bucket(after, "Missing", record)
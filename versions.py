@@ -0,0 +1,501 @@
+import threading
+from contextlib import contextmanager
+from itertools import chain, groupby
+from db import students
+from records import Status
+import loan_index
+
+# Versioned, immutable views of the db state for the staff-wide listings
+# (students_books, students_fines, issued_books, missed_books, /members).
+# current() hands out the latest View: a plain reference read, no locks, and
+# the view never changes afterwards, so a listing sees one point in time no
+# matter what writers do while it renders or streams.
+#
+# Writers only queue their changes (loan_index.track and forget,
+# student_changed), taking the values that change along, which costs them
+# an append. The next current() call, or the writer that queues the
+# FLUSH-th change, applies the queue and publishes it as one new version, so
+# a listing always sees every change that completed before it started. The
+# tables are persistent: a new version copies only the paths to what
+# changed and shares everything else with the previous one. Changes made
+# inside storage.transaction() (bulk routes, fine payments, fine recomputes)
+# are queued together when the outermost transaction ends, so no version
+# has only some of them. A version lives as long as something holds it: once
+# the last reader drops it, whatever it does not share with newer versions
+# is freed by reference counting.
+#
+# A view holds
+#   students   Table of (student_id, student_name, loans, marks) in students
+#              order; loans in serial order (borrowed_books order), marks the
+#              matching (fine, state, went_missing) of each loan
+#   by_status  loan_index's buckets as Tables of (student_id, student_name,
+#              loan, mark), in loan_index order
+#   roster     changes whenever a student is added, removed or renamed
+# Loans are the live records: their book, issue and due dates never change,
+# the fields that do are read from the mark.
+
+WIDTH = 32          # children per Vector node; loan lists up to this long stay tuples
+_BITS = 5
+STATUSES = ("Borrowed", "Missing", "Returned")   # loan_index.STATUSES (it imports this module)
+FINE_ORDER = ("Missing", "Returned", "Borrowed")  # loan_index.loans_with_fines order
+
+
+# Persistent vector: a trie of tuples, WIDTH wide. set() and append() copy
+# one path from the root (O(log n)) and share the rest.
+class Vector:
+    __slots__ = ("size", "shift", "root")
+
+    def __init__(self, size=0, shift=0, root=()):
+        self.size = size
+        self.shift = shift
+        self.root = root
+
+    @classmethod
+    def of(cls, items):
+        nodes = tuple(tuple(items[start:start + WIDTH]) for start in range(0, len(items), WIDTH))
+        if len(nodes) <= 1:
+            return cls(len(items), 0, nodes[0] if nodes else ())
+        shift = _BITS
+        while len(nodes) > WIDTH:
+            nodes = tuple(nodes[start:start + WIDTH] for start in range(0, len(nodes), WIDTH))
+            shift += _BITS
+        return cls(len(items), shift, nodes)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        node = self.root
+        shift = self.shift
+        while shift:
+            node = node[(index >> shift) & (WIDTH - 1)]
+            shift -= _BITS
+        return node[index & (WIDTH - 1)]
+
+    def __iter__(self):
+        leaves = (self.root,)
+        for _ in range(self.shift // _BITS):
+            leaves = chain.from_iterable(leaves)
+        return chain.from_iterable(leaves)
+
+    def set(self, index, value):
+        return Vector(self.size, self.shift, _set(self.root, self.shift, index, value))
+
+    # set() for many {index: value} at once: each node on their paths is copied once
+    def updated(self, changes):
+        if not changes:
+            return self
+        return Vector(self.size, self.shift, _update(self.root, self.shift, sorted(changes.items())))
+
+    def append(self, value):
+        return self.extended((value,))
+
+    # append() for many values: the last leaf is filled in one copy, then new ones
+    def extended(self, values):
+        vector = self
+        start = 0
+        while start < len(values):
+            room = WIDTH - vector.size % WIDTH if vector.size % WIDTH else WIDTH
+            leaf = tuple(values[start:start + room])
+            start += len(leaf)
+            if vector.size == WIDTH << vector.shift:   # full: one level more
+                vector = Vector(vector.size + len(leaf), vector.shift + _BITS,
+                                (vector.root, _path(vector.shift, leaf)))
+            else:
+                vector = Vector(vector.size + len(leaf), vector.shift,
+                                _append(vector.root, vector.shift, vector.size, leaf))
+        return vector
+
+
+def _set(node, shift, index, value):
+    slot = (index >> shift) & (WIDTH - 1)
+    child = value if shift == 0 else _set(node[slot], shift - _BITS, index, value)
+    return node[:slot] + (child,) + node[slot + 1:]
+
+
+def _update(node, shift, changes):
+    copy = list(node)
+    if shift == 0:
+        for index, value in changes:
+            copy[index & (WIDTH - 1)] = value
+    else:
+        for slot, group in groupby(changes, lambda change: (change[0] >> shift) & (WIDTH - 1)):
+            copy[slot] = _update(node[slot], shift - _BITS, list(group))
+    return tuple(copy)
+
+
+# values: a tuple that fits in the leaf holding index
+def _append(node, shift, index, values):
+    if shift == 0:
+        return node + values
+    slot = (index >> shift) & (WIDTH - 1)
+    if slot < len(node):
+        return node[:slot] + (_append(node[slot], shift - _BITS, index, values),)
+    return node + (_path(shift - _BITS, values),)
+
+
+def _path(shift, leaf):
+    return leaf if shift == 0 else (_path(shift - _BITS, leaf),)
+
+
+# A student's loans and marks: tuples while short (most students), Vectors after
+def _plus(items, value):
+    if isinstance(items, tuple):
+        if len(items) < WIDTH:
+            return items + (value,)
+        items = Vector.of(items)
+    return items.append(value)
+
+
+def _with(items, index, value):
+    if isinstance(items, tuple):
+        return items[:index] + (value,) + items[index + 1:]
+    return items.set(index, value)
+
+
+def _sequence(items):
+    return tuple(items) if len(items) <= WIDTH else Vector.of(list(items))
+
+
+# Insertion-ordered rows with holes (None) where rows were removed. Writers
+# keep key -> position outside the table; the holes are squeezed out once
+# they outnumber the rows.
+class Table:
+    __slots__ = ("rows", "count")
+
+    def __init__(self, rows=Vector(), count=0):
+        self.rows = rows
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return filter(None, self.rows)
+
+
+class View:
+    __slots__ = ("version", "students", "by_status", "roster", "__weakref__")
+
+    def __init__(self, version, students, by_status, roster):
+        self.version = version
+        self.students = students
+        self.by_status = by_status
+        self.roster = roster
+
+    def student_ids(self):
+        return (row[0] for row in self.students)
+
+    # {student_id: row} for the given IDs (one pass over the table)
+    def rows(self, student_ids):
+        wanted = set(student_ids)
+        return {row[0]: row for row in self.students if row[0] in wanted}
+
+    # (student_id, student_name, loan, mark) for one loan_index status
+    def loans(self, status):
+        return self.by_status[status]
+
+    # Same, for every loan with a pending fine, in loan_index.loans_with_fines order
+    def loans_with_fines(self):
+        return [entry for status in FINE_ORDER
+                for entry in self.by_status[status] if entry[3][0] > 0]
+
+    # IDs of the students with a pending fine, in table order
+    def fined_student_ids(self):
+        return (row[0] for row in self.students if any(mark[0] > 0 for mark in row[3]))
+
+
+# (loan, mark) pairs with a pending fine in one student's row, grouped by
+# status like loans_with_fines
+def row_fines(row):
+    fined = [(loan, mark) for loan, mark in zip(row[2], row[3]) if mark[0] > 0]
+    return sorted(fined, key=lambda pair: FINE_ORDER.index(pair[1][1].value))
+
+
+# A student's borrowed_books from a view row, in their dict form
+def loan_dicts(loans, marks):
+    return [loan.dict_with(*mark) for loan, mark in zip(loans, marks)]
+
+
+_lock = threading.Lock()           # held while applying changes and publishing
+_pending_lock = threading.Lock()   # held while queueing a change
+_local = threading.local()         # .pending: changes of the thread's open transaction
+_pending = []                      # changes not in a published view yet
+_current = View(0, Table(), {status: Table() for status in STATUSES}, 0)
+FLUSH = 1024                       # queued changes a writer publishes itself
+
+# Writer state behind the latest view, only touched with _lock held
+_student_rows = {}     # student_id -> position in students
+_positions = {status: {} for status in STATUSES}   # id(loan) -> position in by_status[status]
+_filed_under = {}      # id(loan) -> status bucket
+_marks = {}            # shared mark tuples
+MARKS = 100000         # distinct marks kept for sharing
+
+
+# The latest view, with every change queued so far published first
+def current():
+    if _pending:
+        with _lock:
+            _publish()
+    return _current
+
+
+# Keyed by the state's id: hashing an enum member runs Python code
+def _mark(record):
+    key = (record.fine, id(record.state), record.went_missing)
+    mark = _marks.get(key)
+    if mark is None:
+        if len(_marks) >= MARKS:
+            _marks.clear()
+        mark = _marks[key] = (record.fine, record.state, record.went_missing)
+    return mark
+
+
+def _bucket(mark):
+    fine, state, _ = mark
+    if state is Status.RETURNED and fine <= 0:
+        return None
+    return state.value
+
+
+def _student_key(row):
+    return row[0]
+
+
+def _loan_key(row):
+    return id(row[2])
+
+
+# One publish's changes to a Table, turned into the next Table by done().
+# Rows are addressed by key through the writer's key -> position map, which
+# the edit keeps up to date.
+class _Edit:
+    def __init__(self, table, positions, key):
+        self.table = table
+        self.positions = positions
+        self.key = key
+        self.size = len(table.rows)
+        self.count = table.count
+        self.changed = {}    # position -> row, None where removed
+        self.added = []      # rows appended
+
+    def _row(self, position):
+        if position >= self.size:
+            return self.added[position - self.size]
+        if position in self.changed:
+            return self.changed[position]
+        return self.table.rows[position]
+
+    def _put(self, position, row):
+        if position >= self.size:
+            self.added[position - self.size] = row
+        else:
+            self.changed[position] = row
+
+    def get(self, key):
+        position = self.positions.get(key)
+        return None if position is None else self._row(position)
+
+    def append(self, key, row):
+        self.positions[key] = self.size + len(self.added)
+        self.added.append(row)
+        self.count += 1
+
+    def replace(self, key, row):
+        self._put(self.positions[key], row)
+
+    def remove(self, key):
+        position = self.positions.pop(key, None)
+        if position is not None:
+            self._put(position, None)
+            self.count -= 1
+
+    # The holes are squeezed out once they outnumber the rows
+    def done(self):
+        if not self.changed and not self.added:
+            return self.table
+        rows = self.table.rows.updated(self.changed).extended(self.added)
+        if len(rows) - self.count > max(self.count, WIDTH):
+            live = [row for row in rows if row is not None]
+            self.positions.clear()
+            self.positions.update((self.key(row), position) for position, row in enumerate(live))
+            rows = Vector.of(live)
+        return Table(rows, self.count)
+
+
+def _file(by_status, sid, name, record, mark):
+    key = id(record)
+    old = _filed_under.pop(key, None)
+    if old is not None:
+        by_status[old].remove(key)
+    new = _bucket(mark)
+    if new is not None:
+        by_status[new].append(key, (sid, name, record, mark))
+        _filed_under[key] = new
+
+
+def _unfile(by_status, record):
+    old = _filed_under.pop(id(record), None)
+    if old is not None:
+        by_status[old].remove(id(record))
+
+
+# Applying queued changes; each returns True when the roster changed
+def _apply_track(table, by_status, sid, record, mark):
+    row = table.get(sid)
+    added = False
+    if row is None:
+        # A student put in students without student_changed: take it as it is now
+        info = students.get(sid)
+        if info is None:
+            return False
+        loans = info.borrowed_books
+        _apply_student(table, by_status, sid, info.student_name, loans, [_mark(loan) for loan in loans])
+        row, added = table.get(sid), True
+    _, name, loans, marks = row
+    serial = record.serial
+    if serial == len(loans):
+        loans, marks = _plus(loans, record), _plus(marks, mark)
+    elif serial < len(loans) and loans[serial] is record:
+        marks = _with(marks, serial, mark)
+    else:
+        return added
+    table.replace(sid, (sid, name, loans, marks))
+    _file(by_status, sid, name, record, mark)
+    return added
+
+
+def _apply_forget(table, by_status, record):
+    _unfile(by_status, record)
+    return False
+
+
+# name is None once the student was removed
+def _apply_student(table, by_status, sid, name, loans, marks):
+    row = table.get(sid)
+    if name is None:
+        if row is None:
+            return False
+        for record in row[2]:
+            _unfile(by_status, record)
+        table.remove(sid)
+        return True
+    if row is None:
+        table.append(sid, (sid, name, _sequence(loans), _sequence(marks)))
+        for record, mark in zip(loans, marks):
+            _file(by_status, sid, name, record, mark)
+        return True
+    if row[1] == name:
+        return False
+    table.replace(sid, (sid, name, row[2], row[3]))
+    # Renamed: the loan rows carry the name too, they keep their places
+    for record, mark in zip(row[2], row[3]):
+        status = _filed_under.get(id(record))
+        if status is not None:
+            by_status[status].replace(id(record), (sid, name, record, mark))
+    return True
+
+
+_APPLY = {"track": _apply_track, "forget": _apply_forget, "student": _apply_student}
+
+
+# Apply the queued changes and publish them as the next view. Call with _lock held.
+def _publish():
+    global _current, _pending
+    with _pending_lock:
+        changes, _pending = _pending, []
+    if not changes:
+        return
+    view = _current
+    table = _Edit(view.students, _student_rows, _student_key)
+    by_status = {status: _Edit(view.by_status[status], _positions[status], _loan_key) for status in STATUSES}
+    roster = False
+    for op, *args in changes:
+        roster = _APPLY[op](table, by_status, *args) or roster
+    _current = View(view.version + 1, table.done(), {status: edit.done() for status, edit in by_status.items()},
+                    view.roster + 1 if roster else view.roster)
+
+
+# Queue changes; past FLUSH queued, the writer publishes them unless
+# someone else is publishing already
+def _queue(changes):
+    with _pending_lock:
+        _pending.extend(changes)
+        full = len(_pending) >= FLUSH
+    if full and _lock.acquire(blocking=False):
+        try:
+            _publish()
+        finally:
+            _lock.release()
+
+
+def _change(change):
+    pending = getattr(_local, "pending", None)
+    if pending is not None:
+        pending.append(change)
+    else:
+        _queue((change,))
+
+
+# Queue the changes made inside together, so no view has only some of them
+# (nested calls join the outer one)
+@contextmanager
+def batch():
+    if getattr(_local, "pending", None) is not None:
+        yield
+        return
+    pending = _local.pending = []
+    try:
+        yield
+    finally:
+        _local.pending = None
+        if pending:
+            _queue(pending)
+
+
+# Hooks: loan_index.track / forget call these; student_changed after a
+# student was added, removed or renamed. Writers call them with the locks
+# for what changed still held, so the values taken here are consistent.
+def track(student_id, record):
+    _change(("track", student_id, record, _mark(record)))
+
+
+def forget(record):
+    _change(("forget", record))
+
+
+def student_changed(student_id):
+    info = students.get(student_id)
+    if info is None:
+        _change(("student", student_id, None, (), ()))
+    else:
+        loans = info.borrowed_books
+        _change(("student", student_id, info.student_name, loans, [_mark(record) for record in loans]))
+
+
+# Build a fresh version from students and loan_index, after the db dicts were
+# replaced (circulation.rebuild_indexes, snapshot.load); queued changes are
+# already part of them
+def rebuild():
+    global _current, _pending
+    with _lock:
+        with _pending_lock:
+            _pending = []
+        for positions in (_student_rows, _filed_under, *_positions.values()):
+            positions.clear()
+        names = {}
+        rows = []
+        for sid, info in list(students.items()):
+            loans = info.borrowed_books
+            names[sid] = info.student_name
+            _student_rows[sid] = len(rows)
+            rows.append((sid, info.student_name, _sequence(loans), _sequence(list(map(_mark, loans)))))
+        by_status = {}
+        for status in STATUSES:
+            entries = [(sid, names[sid], record, _mark(record)) for sid, record in loan_index.loans(status)
+                       if sid in names]
+            for position, (_, _, record, _) in enumerate(entries):
+                _positions[status][id(record)] = position
+                _filed_under[id(record)] = status
+            by_status[status] = Table(Vector.of(entries), len(entries))
+        _current = View(_current.version + 1, Table(Vector.of(rows), len(rows)), by_status, _current.roster + 1)